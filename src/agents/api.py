@@ -25,32 +25,17 @@ class StreamingAPI:
             Dict: 最终的会话总结
         """
         session = None
+        # 关闭这个生成器（前端断开）时 finally 会关闭 stream_process，运行随之取消
+        stream = self.agent.stream_process(question)
         
         try:
-            for message in self.agent.stream_process(question):
-                # 构建流式响应格式
-                stream_response = {
-                    "type": "stream",
-                    "data": {
-                        "message_id": message.id,
-                        "message_type": message.type.value,
-                        "content": message.content,
-                        "metadata": message.metadata,
-                        "timestamp": message.timestamp.isoformat()
-                    }
-                }
-                yield json.dumps(stream_response, ensure_ascii=False)
-            
-            # 获取完整会话信息
-            if hasattr(self.agent.stream_process(question), '__iter__'):
-                # 重新处理以获取最终会话
-                for _ in self.agent.stream_process(question):
-                    pass
-                
-                # 获取最新会话
-                sessions = self.agent.storage.storage.list_sessions()
-                if sessions:
-                    session = self.agent.storage.storage.get_session(sessions[-1])
+            while True:
+                message = next(stream)
+                yield json.dumps(self.stream_payload(message), ensure_ascii=False)
+        
+        except StopIteration as done:
+            # stream_process 的返回值就是存储中的完整会话，不需要再处理一遍
+            session = done.value
         
         except Exception as e:
             error_response = {
@@ -62,12 +47,29 @@ class StreamingAPI:
             }
             yield json.dumps(error_response, ensure_ascii=False)
         
+        finally:
+            stream.close()
+        
         # 返回最终总结
         if session:
             return self._build_final_response(session)
         else:
             return {"error": "Session not found"}
     
+    @staticmethod
+    def stream_payload(message: StreamMessage) -> Dict[str, Any]:
+        """构建流式响应格式"""
+        return {
+            "type": "stream",
+            "data": {
+                "message_id": message.id,
+                "message_type": message.type.value,
+                "content": message.content,
+                "metadata": message.metadata,
+                "timestamp": message.timestamp.isoformat()
+            }
+        }
+    
     def _build_final_response(self, session) -> Dict[str, Any]:
         """构建最终响应格式"""
         # 按类型分组消息
@@ -0,0 +1,98 @@
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+# estimate_tokens 是 src/langgraph/agents/token_count.py 的原样拷贝：脚本目录之间不能互相导入
+
+# CJK 字符基本上一个字就是一个 token，英文单词大约 4 个字符一个 token
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text locally, without calling a tokenizer service."""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    tokens = cjk
+    for word in _WORD_PATTERN.findall(text):
+        tokens += max(1, (len(word) + 3) // 4)
+    return tokens
+
+
+class Cancelled(Exception):
+    """运行被取消（客户端断开、生成器被关闭或任务被取消）"""
+
+
+class CancellationToken:
+    """一次运行的协作式取消标记
+
+    可以在任意线程调用 cancel()；运行方在节点边界和每个 LLM 流式分块处
+    检查它。同时记录本次运行已经生成的 token 数，用于统计取消节省了多少。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.output_tokens = 0
+        self.aborted_llm_call = False
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled(self.reason)
+
+
+@dataclass
+class CancellationMetrics:
+    """取消统计
+
+    节省量是估算值：以已完成运行的平均 token 数和耗时为“本来还要花费”的
+    总量，减去被取消的运行在取消前已经花掉的部分。
+    """
+    completed_runs: int = 0
+    cancelled_runs: int = 0
+    aborted_llm_calls: int = 0
+    _completed_tokens: int = 0
+    _completed_seconds: float = 0.0
+    _cancelled_tokens: int = 0
+    _cancelled_seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record_completed(self, tokens: int, seconds: float) -> None:
+        with self._lock:
+            self.completed_runs += 1
+            self._completed_tokens += tokens
+            self._completed_seconds += seconds
+
+    def record_cancelled(self, tokens: int, seconds: float, aborted_llm_call: bool) -> None:
+        with self._lock:
+            self.cancelled_runs += 1
+            self.aborted_llm_calls += int(aborted_llm_call)
+            self._cancelled_tokens += tokens
+            self._cancelled_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            tokens_saved = seconds_saved = 0.0
+            if self.completed_runs:
+                tokens_saved = self._completed_tokens / self.completed_runs * self.cancelled_runs - self._cancelled_tokens
+                seconds_saved = (self._completed_seconds / self.completed_runs * self.cancelled_runs
+                                 - self._cancelled_seconds)
+            return {
+                "completed_runs": self.completed_runs,
+                "cancelled_runs": self.cancelled_runs,
+                "aborted_llm_calls": self.aborted_llm_calls,
+                "tokens_before_cancel": self._cancelled_tokens,
+                "estimated_tokens_saved": max(round(tokens_saved), 0),
+                "estimated_seconds_saved": max(round(seconds_saved, 2), 0.0),
+            }
@@ -1,11 +1,22 @@
 import os
 import json
+import functools
+import threading
 from typing import Optional, List
 from datetime import datetime
 
 from .models import ConversationSession, StreamMessage
 
 
+def _locked(method):
+    """同一个存储实例的文件读写串行执行（多个工作线程共享一个存储时不会丢更新或读到半行）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class SimpleFileStorage:
     """简单的文件存储系统，用于模拟数据库"""
     
@@ -13,6 +24,7 @@ class SimpleFileStorage:
         self.storage_dir = storage_dir
         self.sessions_file = os.path.join(storage_dir, "sessions.txt")
         self.messages_file = os.path.join(storage_dir, "messages.txt")
+        self._lock = threading.RLock()
         self._ensure_storage_dir()
         self._init_files()
     
@@ -35,6 +47,7 @@ class SimpleFileStorage:
                 f.write("# message_id|session_id|type|content|metadata|timestamp\n")
                 f.write("# Format: UUID|UUID|VARCHAR(20)|TEXT|JSON|TIMESTAMP\n\n")
     
+    @_locked
     def save_session(self, session: ConversationSession) -> None:
         """保存会话到文件"""
         session_line = f"{session.session_id}|{session.user_question}|{session.status}|{session.created_at.isoformat()}|{session.updated_at.isoformat()}\n"
@@ -60,14 +73,18 @@ class SimpleFileStorage:
         with open(self.sessions_file, 'w', encoding='utf-8') as f:
             f.writelines(existing_sessions)
     
+    @_locked
     def save_message(self, message: StreamMessage, session_id: str) -> None:
         """保存消息到文件"""
         metadata_json = json.dumps(message.metadata, ensure_ascii=False)
-        message_line = f"{message.id}|{session_id}|{message.type.value}|{message.content}|{metadata_json}|{message.timestamp.isoformat()}\n"
+        # content 以 JSON 字符串保存，其中的换行和 | 不会破坏行格式
+        content_json = json.dumps(message.content, ensure_ascii=False)
+        message_line = f"{message.id}|{session_id}|{message.type.value}|{content_json}|{metadata_json}|{message.timestamp.isoformat()}\n"
         
         with open(self.messages_file, 'a', encoding='utf-8') as f:
             f.write(message_line)
     
+    @_locked
     def get_session(self, session_id: str) -> Optional[ConversationSession]:
         """从文件读取会话"""
         if not os.path.exists(self.sessions_file):
@@ -80,12 +97,13 @@ class SimpleFileStorage:
                 
                 parts = line.strip().split('|')
                 if len(parts) >= 5 and parts[0] == session_id:
+                    # 问题里可能包含 |，状态和两个时间戳从行尾取
                     session = ConversationSession(
                         session_id=parts[0],
-                        user_question=parts[1],
-                        status=parts[2],
-                        created_at=datetime.fromisoformat(parts[3]),
-                        updated_at=datetime.fromisoformat(parts[4])
+                        user_question='|'.join(parts[1:-3]),
+                        status=parts[-3],
+                        created_at=datetime.fromisoformat(parts[-2]),
+                        updated_at=datetime.fromisoformat(parts[-1])
                     )
                     
                     # 加载消息
@@ -94,6 +112,7 @@ class SimpleFileStorage:
         
         return None
     
+    @_locked
     def get_messages_by_session(self, session_id: str) -> List[StreamMessage]:
         """获取会话的所有消息"""
         messages = []
@@ -106,25 +125,46 @@ class SimpleFileStorage:
                 if line.startswith('#') or not line.strip():
                     continue
                 
-                parts = line.strip().split('|', 5)  # 限制分割次数，因为content可能包含|
-                if len(parts) >= 6 and parts[1] == session_id:
-                    try:
-                        metadata = json.loads(parts[4]) if parts[4] else {}
-                    except json.JSONDecodeError:
-                        metadata = {}
-                    
-                    from .models import MessageType
-                    message = StreamMessage(
-                        id=parts[0],
-                        type=MessageType(parts[2]),
-                        content=parts[3],
-                        metadata=metadata,
-                        timestamp=datetime.fromisoformat(parts[5])
-                    )
+                message = self._parse_message_line(line, session_id)
+                if message is not None:
                     messages.append(message)
         
         return sorted(messages, key=lambda x: x.timestamp)
     
+    @staticmethod
+    def _parse_message_line(line: str, session_id: str) -> Optional[StreamMessage]:
+        """解析一行消息记录，不属于该会话时返回 None"""
+        head = line.rstrip('\n').split('|', 3)
+        if len(head) < 4 or head[1] != session_id:
+            return None
+        rest, _, timestamp = head[3].rpartition('|')
+        content = None
+        if rest.startswith('"'):
+            try:
+                decoded, end = json.JSONDecoder().raw_decode(rest)
+            except json.JSONDecodeError:
+                decoded, end = None, 0
+            # JSON 字符串后面必须紧跟 |metadata，否则是恰好以引号开头的旧格式内容
+            if isinstance(decoded, str) and rest[end:end + 1] == '|':
+                content, metadata_json = decoded, rest[end + 1:]
+        if content is None:
+            # 旧格式：content 原样写入
+            content, _, metadata_json = rest.rpartition('|')
+        try:
+            metadata = json.loads(metadata_json) if metadata_json else {}
+        except json.JSONDecodeError:
+            metadata = {}
+        
+        from .models import MessageType
+        return StreamMessage(
+            id=head[0],
+            type=MessageType(head[2]),
+            content=content,
+            metadata=metadata,
+            timestamp=datetime.fromisoformat(timestamp)
+        )
+    
+    @_locked
     def list_sessions(self) -> List[str]:
         """列出所有会话ID"""
         session_ids = []
@@ -145,11 +185,29 @@ class SimpleFileStorage:
     
     def update_session_status(self, session_id: str, status: str) -> None:
         """更新会话状态"""
-        session = self.get_session(session_id)
-        if session:
-            session.status = status
-            session.updated_at = datetime.now()
-            self.save_session(session)
+        self.touch_session(session_id, status)
+    
+    @_locked
+    def touch_session(self, session_id: str, status: Optional[str] = None) -> None:
+        """只改写会话行的状态和更新时间，不加载会话的消息"""
+        if not os.path.exists(self.sessions_file):
+            return
+        
+        with open(self.sessions_file, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        
+        for i, line in enumerate(lines):
+            if line.startswith('#') or not line.strip():
+                continue
+            parts = line.rstrip('\n').split('|')
+            if len(parts) >= 5 and parts[0] == session_id:
+                if status is not None:
+                    parts[-3] = status
+                parts[-1] = datetime.now().isoformat()
+                lines[i] = '|'.join(parts) + '\n'
+                with open(self.sessions_file, 'w', encoding='utf-8') as f:
+                    f.writelines(lines)
+                return
 
 
 class StreamingStorage:
@@ -169,6 +227,12 @@ class StreamingStorage:
         self.storage.save_session(session)
         return session
     
+    def add_message(self, session_id: str, message: StreamMessage) -> StreamMessage:
+        """按会话ID追加消息，不需要持有会话对象"""
+        self.storage.save_message(message, session_id)
+        self.storage.touch_session(session_id)  # 更新会话时间戳
+        return message
+    
     def add_stream_message(self, session: ConversationSession, message: StreamMessage) -> StreamMessage:
         """添加流式消息"""
         session.add_message(message)
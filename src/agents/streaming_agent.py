@@ -1,15 +1,18 @@
-from typing import Annotated, Sequence, TypedDict, Generator, Dict, Any
+from typing import Annotated, Sequence, TypedDict, Generator, Dict, Any, List, Optional
 import asyncio
+import time
 from dotenv import load_dotenv
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, message_chunk_to_message
 from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from pydantic import SecretStr
 import os
 
+from .cancellation import Cancelled, CancellationMetrics, CancellationToken, estimate_tokens
 from .models import StreamMessage, MessageType, ConversationSession, ToolCall, ToolResult
 from .storage import StreamingStorage, SimpleFileStorage
 
@@ -23,9 +26,14 @@ if not OPENAI_API_KEY:
 
 
 class StreamingAgentState(TypedDict):
-    """流式Agent状态"""
+    """流式Agent状态
+
+    会话本身只保存在 storage 里，状态中只有会话ID；outbox 是当前这一步
+    新产生的消息（每步覆盖），状态大小不随会话消息数增长。
+    """
     messages: Annotated[Sequence[BaseMessage], add_messages]
-    session: ConversationSession
+    session_id: str
+    outbox: List[StreamMessage]
     current_step: str
 
 
@@ -64,9 +72,14 @@ class StreamingReActAgent:
             streaming=True  # 启用流式响应
         ).bind_tools(self.tools)
         
+        self.cancel_metrics = CancellationMetrics()
         self.graph = self._build_graph()
         self.app = self.graph.compile()
     
+    @staticmethod
+    def _cancel_token(config: RunnableConfig) -> CancellationToken:
+        return config.get("configurable", {}).get("cancel_token") or CancellationToken()
+    
     def _build_graph(self) -> StateGraph:
         """构建LangGraph状态图"""
         graph = StateGraph(StreamingAgentState)
@@ -99,32 +112,31 @@ class StreamingReActAgent:
     
     def _thinking_node(self, state: StreamingAgentState) -> StreamingAgentState:
         """思考节点 - 分析用户问题"""
-        session = state["session"]
-        
         thinking_msg = StreamMessage(
             type=MessageType.THINKING,
             content="🤔 让我分析一下你的问题...",
             metadata={"step": "initial_thinking"}
         )
         
-        self.storage.add_stream_message(session, thinking_msg)
+        self.storage.add_message(state["session_id"], thinking_msg)
         
         return {
-            "messages": state["messages"],
-            "session": session,
+            "outbox": [thinking_msg],
             "current_step": "thinking"
         }
     
-    def _reasoning_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    def _reasoning_node(self, state: StreamingAgentState, config: RunnableConfig) -> StreamingAgentState:
         """推理节点 - 调用LLM进行推理"""
-        session = state["session"]
+        session_id = state["session_id"]
+        token = self._cancel_token(config)
+        token.raise_if_cancelled()
         
         reasoning_msg = StreamMessage(
             type=MessageType.REASONING,
             content="💭 正在推理和分析...",
             metadata={"step": "reasoning"}
         )
-        self.storage.add_stream_message(session, reasoning_msg)
+        self.storage.add_message(session_id, reasoning_msg)
         
         # 构建系统提示
         system_message = SystemMessage(
@@ -142,7 +154,7 @@ class StreamingReActAgent:
         
         # 调用LLM
         call_messages = [system_message] + list(state["messages"])
-        response = self.model.invoke(call_messages)
+        response = self._stream_llm(call_messages, token)
         
         # 更新推理内容
         content = response.content if isinstance(response.content, str) else str(response.content or "")
@@ -154,18 +166,35 @@ class StreamingReActAgent:
                 "has_tool_calls": bool(getattr(response, "tool_calls", None))
             }
         )
-        self.storage.add_stream_message(session, reasoning_update)
+        self.storage.add_message(session_id, reasoning_update)
         
         return {
             "messages": [response],
-            "session": session,
+            "outbox": [reasoning_msg, reasoning_update],
             "current_step": "reasoning"
         }
     
-    def _tool_calling_node(self, state: StreamingAgentState) -> StreamingAgentState:
+    def _stream_llm(self, call_messages: List[BaseMessage], token: CancellationToken) -> AIMessage:
+        """流式调用LLM，每个分块检查取消标记；取消时关闭流，底层HTTP请求随之中断"""
+        merged = None
+        stream = self.model.stream(call_messages)
+        try:
+            for chunk in stream:
+                merged = chunk if merged is None else merged + chunk
+                if isinstance(chunk.content, str):
+                    token.output_tokens += estimate_tokens(chunk.content)
+                if token.cancelled:
+                    token.aborted_llm_call = True
+                    raise Cancelled(token.reason)
+        finally:
+            stream.close()
+        return message_chunk_to_message(merged) if merged is not None else AIMessage(content="")
+    
+    def _tool_calling_node(self, state: StreamingAgentState, config: RunnableConfig) -> StreamingAgentState:
         """工具调用节点 - 准备工具调用"""
-        session = state["session"]
+        self._cancel_token(config).raise_if_cancelled()
         last_message = state["messages"][-1]
+        outbox = []
         
         if hasattr(last_message, "tool_calls") and getattr(last_message, "tool_calls", None):
             for tool_call in getattr(last_message, "tool_calls", []):
@@ -178,17 +207,17 @@ class StreamingReActAgent:
                         "tool_id": tool_call.get("id", "")
                     }
                 )
-                self.storage.add_stream_message(session, tool_msg)
+                self.storage.add_message(state["session_id"], tool_msg)
+                outbox.append(tool_msg)
         
         return {
-            "messages": state["messages"],
-            "session": session,
+            "outbox": outbox,
             "current_step": "tool_calling"
         }
     
     def _final_answer_node(self, state: StreamingAgentState) -> StreamingAgentState:
         """最终答案节点"""
-        session = state["session"]
+        session_id = state["session_id"]
         last_message = state["messages"][-1]
         
         content = last_message.content if isinstance(last_message.content, str) else str(last_message.content or "")
@@ -198,14 +227,13 @@ class StreamingReActAgent:
             content=f"✅ 最终答案: {content}",
             metadata={"step": "completed"}
         )
-        self.storage.add_stream_message(session, final_msg)
+        self.storage.add_message(session_id, final_msg)
         
         # 更新会话状态
-        self.storage.storage.update_session_status(session.session_id, "completed")
+        self.storage.storage.update_session_status(session_id, "completed")
         
         return {
-            "messages": state["messages"],
-            "session": session,
+            "outbox": [final_msg],
             "current_step": "completed"
         }
     
@@ -216,46 +244,72 @@ class StreamingReActAgent:
             return "use_tools"
         return "final_answer"
     
-    def stream_process(self, question: str) -> Generator[StreamMessage, None, ConversationSession]:
-        """流式处理用户问题"""
+    def stream_process(self, question: str, session: Optional[ConversationSession] = None,
+                       cancel_token: Optional[CancellationToken] = None
+                       ) -> Generator[StreamMessage, None, Optional[ConversationSession]]:
+        """流式处理用户问题，逐条返回每一步 outbox 里的新消息；生成器的返回值是存储中的完整会话
+
+        调用方需要提前知道会话ID时（比如 HTTP 服务先把ID发给前端），可以传入已创建的会话。
+        关闭生成器或调用 cancel_token.cancel() 都会取消运行：进行中的LLM流在下一个分块处中断，
+        图在下一个节点边界停止，会话状态记为 cancelled。
+        """
         # 创建会话
-        session = self.storage.create_session(question)
+        if session is None:
+            session = self.storage.create_session(question)
+        token = cancel_token or CancellationToken()
+        started = time.perf_counter()
         
         # 构建初始状态
         initial_state = StreamingAgentState(
             messages=[HumanMessage(content=question)],
-            session=session,
+            session_id=session.session_id,
+            outbox=[],
             current_step="start"
         )
         
+        outcome = None  # completed / error；为 None 表示被取消
         try:
-            # 运行图并流式返回消息
-            for state in self.app.stream(initial_state, stream_mode="values"):
-                current_session = state["session"]
-                
-                # 获取最新消息并流式返回
-                if current_session.messages:
-                    latest_messages = current_session.messages[-1:]  # 只返回最新消息
-                    for msg in latest_messages:
-                        yield msg
-                
-                # 模拟实时处理延迟
-                import time
-                time.sleep(0.5)
-            
-            return session
+            # updates 模式只包含每个节点本步写入的内容，没写 outbox 的节点（如 ToolNode）不会重复返回旧消息
+            stream = self.app.stream(initial_state, {"configurable": {"cancel_token": token}}, stream_mode="updates")
+            try:
+                for update in stream:
+                    if "final_answer" in update:
+                        # 最终答案已经产生，之后关闭生成器不算取消
+                        outcome = "completed"
+                    for node_update in update.values():
+                        for msg in (node_update or {}).get("outbox", []):
+                            yield msg
+                    token.raise_if_cancelled()
+                outcome = "completed"
+            finally:
+                stream.close()
             
+        except Cancelled:
+            pass
+        
         except Exception as e:
+            outcome = "error"
             # 错误处理
             error_msg = StreamMessage(
                 type=MessageType.ERROR,
                 content=f"❌ 处理过程中发生错误: {str(e)}",
                 metadata={"error_type": type(e).__name__}
             )
-            self.storage.add_stream_message(session, error_msg)
+            self.storage.add_message(session.session_id, error_msg)
             self.storage.storage.update_session_status(session.session_id, "error")
             yield error_msg
-            return session
+        
+        finally:
+            # 正常结束以外的退出（取消、生成器被关闭）都记为 cancelled
+            elapsed = time.perf_counter() - started
+            if outcome == "completed":
+                self.cancel_metrics.record_completed(token.output_tokens, elapsed)
+            elif outcome is None:
+                token.cancel("generator closed")
+                self.storage.storage.update_session_status(session.session_id, "cancelled")
+                self.cancel_metrics.record_cancelled(token.output_tokens, elapsed, token.aborted_llm_call)
+        
+        return self.storage.storage.get_session(session.session_id)
     
     def get_session_messages(self, session_id: str) -> list:
         """获取会话的所有消息"""
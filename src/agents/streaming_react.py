@@ -10,6 +10,7 @@ from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_stream_writer
 from langgraph.prebuilt import ToolNode
 from pydantic import SecretStr
 import os
@@ -96,6 +97,11 @@ class ConversationStore:
         """获取会话"""
         return self.sessions.get(session_id)
     
+    def add_message(self, session_id: str, message: StreamMessage) -> StreamMessage:
+        """按会话ID追加消息"""
+        self.sessions[session_id].add_message(message)
+        return message
+    
     def update_session_status(self, session_id: str, status: str):
         """更新会话状态"""
         if session_id in self.sessions:
@@ -109,8 +115,9 @@ class ConversationStore:
 
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
-    session: ConversationSession
-    stream_messages: List[StreamMessage]
+    # 会话保存在 ConversationStore 里，状态中只有会话ID和本步新产生的消息
+    session_id: str
+    outbox: List[StreamMessage]
 
 
 # 工具定义
@@ -185,16 +192,21 @@ class StreamingReactAgent:
         
         return graph
     
+    def _emit(self, session_id: str, message: StreamMessage) -> StreamMessage:
+        """写入会话存储，并通过 custom 流立即发出（每条消息只发一次）"""
+        self.store.add_message(session_id, message)
+        get_stream_writer()(message)
+        return message
+    
     def _reasoning_node(self, state: AgentState) -> AgentState:
         """推理节点"""
-        session = state["session"]
+        session_id = state["session_id"]
         
         # 添加思考消息
-        thinking_msg = StreamMessage(
+        thinking_msg = self._emit(session_id, StreamMessage(
             type=MessageType.THINKING,
             content="正在分析你的问题..."
-        )
-        session.add_message(thinking_msg)
+        ))
         
         # 构建系统消息和调用LLM
         system_message = SystemMessage(
@@ -210,18 +222,17 @@ class StreamingReactAgent:
             content=content,
             metadata={"has_tool_calls": bool(getattr(response, "tool_calls", None))}
         )
-        session.add_message(reasoning_msg)
+        self._emit(session_id, reasoning_msg)
         
         return {
             "messages": [response],
-            "session": session,
-            "stream_messages": state.get("stream_messages", []) + [thinking_msg, reasoning_msg]
+            "outbox": [thinking_msg, reasoning_msg]
         }
     
     def _tool_execution_node(self, state: AgentState) -> AgentState:
         """工具执行节点"""
-        session = state["session"]
         last_message = state["messages"][-1]
+        outbox = []
         
         if hasattr(last_message, "tool_calls") and getattr(last_message, "tool_calls", None):
             for tool_call in getattr(last_message, "tool_calls", []):
@@ -234,17 +245,13 @@ class StreamingReactAgent:
                         "tool_args": tool_call["args"]
                     }
                 )
-                session.add_message(tool_call_msg)
+                outbox.append(self._emit(state["session_id"], tool_call_msg))
         
-        return {
-            "messages": state["messages"],
-            "session": session,
-            "stream_messages": state.get("stream_messages", [])
-        }
+        return {"outbox": outbox}
     
     def _final_response_node(self, state: AgentState) -> AgentState:
         """最终响应节点"""
-        session = state["session"]
+        session_id = state["session_id"]
         last_message = state["messages"][-1]
         
         # 添加最终答案消息
@@ -254,16 +261,12 @@ class StreamingReactAgent:
             content=content,
             metadata={"completed": True}
         )
-        session.add_message(final_msg)
+        self._emit(session_id, final_msg)
         
         # 更新会话状态
-        self.store.update_session_status(session.session_id, "completed")
+        self.store.update_session_status(session_id, "completed")
         
-        return {
-            "messages": state["messages"],
-            "session": session,
-            "stream_messages": state.get("stream_messages", []) + [final_msg]
-        }
+        return {"outbox": [final_msg]}
     
     def _should_use_tools(self, state: AgentState) -> str:
         """判断是否需要使用工具"""
@@ -280,19 +283,17 @@ class StreamingReactAgent:
         # 构建初始状态
         initial_state = AgentState(
             messages=[HumanMessage(content=question)],
-            session=session,
-            stream_messages=[]
+            session_id=session.session_id,
+            outbox=[]
         )
         
-        # 运行图
+        # 运行图：custom 流里是节点刚产生的消息，完整会话从存储中读取
         try:
-            final_state = None
-            for state in self.app.stream(initial_state, stream_mode="values"):
-                final_state = state
+            for message in self.app.stream(initial_state, stream_mode="custom"):
                 # 这里可以实时发送流式消息到前端
-                self._emit_stream_messages(state.get("stream_messages", []))
+                self._emit_stream_messages([message])
             
-            return final_state["session"] if final_state else session
+            return session
             
         except Exception as e:
             # 添加错误消息
@@ -301,7 +302,7 @@ class StreamingReactAgent:
                 content=f"处理过程中发生错误: {str(e)}",
                 metadata={"error_type": type(e).__name__}
             )
-            session.add_message(error_msg)
+            self.store.add_message(session.session_id, error_msg)
             self.store.update_session_status(session.session_id, "error")
             return session
     
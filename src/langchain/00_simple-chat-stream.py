@@ -1,9 +1,10 @@
 import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from pydantic import SecretStr
 
+from chat_session import StreamingChatSession
+
 # Load environment variables
 load_dotenv()
 
@@ -28,11 +29,12 @@ def simple_chat_stream():
         base_url=OPENAI_BASE_URL,
     )
     
-    # Chat history to maintain context
-    from langchain.schema import BaseMessage
-    messages: list[BaseMessage] = [
-        SystemMessage(content="You are a helpful AI assistant. Be concise and friendly.")
-    ]
+    # Chat history to maintain context, trimmed to a token budget (the system prompt is always kept)
+    session = StreamingChatSession(
+        llm,
+        system_prompt="You are a helpful AI assistant. Be concise and friendly.",
+        max_history_tokens=int(os.getenv("CHAT_HISTORY_TOKENS", "3000")),
+    )
     
     print("> Simple LangChain Chat App")
     print("Type 'quit' to exit, 'clear' to clear history\n")
@@ -52,29 +54,21 @@ def simple_chat_stream():
             print("Goodbye! =K")
             break
         elif user_input.lower() == 'clear':
-            messages = [SystemMessage(content="You are a helpful AI assistant. Be concise and friendly.")]
+            session.clear()
             print("= Chat history cleared!")
             continue
         elif not user_input:
             continue
         
-        # Add user message to history
-        messages.append(HumanMessage(content=user_input))
-        
         try:
-            # Stream AI response with LangSmith tracing
+            # Stream AI response with LangSmith tracing; the session records the reply in its history
             print("AI: ", end="", flush=True)
-            full_response = ""
             
-            for chunk in llm.stream(messages):
-                if chunk.content:
-                    print(str(chunk.content), end="", flush=True)
-                    full_response += str(chunk.content)
+            for text in session.stream(user_input):
+                print(text, end="", flush=True)
             
             print("\n")  # Add newline after streaming
-            
-            # Add AI response to history
-            messages.append(AIMessage(content=full_response))
+            print(f"⏱️ {session.last_stats}\n")
             
         except Exception as e:
             print(f"\n❌ Error: {e}\n")
@@ -1,9 +1,10 @@
 import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
 from pydantic import SecretStr
 
+from chat_session import StreamingChatSession
+
 # Load environment variables
 load_dotenv()
 
@@ -21,11 +22,12 @@ def simple_chat():
         base_url=OPENAI_BASE_URL,
     )
     
-    # Chat history to maintain context
-    from langchain.schema import BaseMessage
-    messages: list[BaseMessage] = [
-        SystemMessage(content="You are a helpful AI assistant. Be concise and friendly.")
-    ]
+    # Chat history to maintain context, trimmed to a token budget (the system prompt is always kept)
+    session = StreamingChatSession(
+        llm,
+        system_prompt="You are a helpful AI assistant. Be concise and friendly.",
+        max_history_tokens=int(os.getenv("CHAT_HISTORY_TOKENS", "3000")),
+    )
     
     print("> Simple LangChain Chat App")
     print("Type 'quit' to exit, 'clear' to clear history\n")
@@ -38,22 +40,15 @@ def simple_chat():
             print("Goodbye! =K")
             break
         elif user_input.lower() == 'clear':
-            messages = [SystemMessage(content="You are a helpful AI assistant. Be concise and friendly.")]
+            session.clear()
             print("= Chat history cleared!")
             continue
         elif not user_input:
             continue
         
-        # Add user message to history
-        messages.append(HumanMessage(content=user_input))
-        
         try:
-            # Get AI response
-            response = llm.invoke(messages)
-            ai_response = response.content
-            
-            # Add AI response to history
-            messages.append(AIMessage(content=ai_response))
+            # Get AI response (the session adds both messages to the history)
+            ai_response = session.send(user_input)
             
             # Display response
             print(f"AI: {ai_response}\n")
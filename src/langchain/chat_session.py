@@ -0,0 +1,129 @@
+import re
+import time
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+# estimate_tokens 是 src/langgraph/agents/token_count.py 的原样拷贝：脚本目录之间不能互相导入
+
+# CJK 字符基本上一个字就是一个 token，英文单词大约 4 个字符一个 token
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text locally, without calling a tokenizer service."""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    tokens = cjk
+    for word in _WORD_PATTERN.findall(text):
+        tokens += max(1, (len(word) + 3) // 4)
+    return tokens
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return estimate_tokens(str(message.content)) + 4  # 每条消息的角色和分隔符开销
+
+
+@dataclass
+class TurnStats:
+    prompt_tokens: int
+    output_tokens: int
+    ttft_ms: float
+    total_ms: float
+    dropped_messages: int = 0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        """Output tokens per second after the first token arrived."""
+        generating = (self.total_ms - self.ttft_ms) / 1000
+        return self.output_tokens / generating if generating > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (f"TTFT {self.ttft_ms:.0f} ms · {self.output_tokens} tokens in {self.total_ms / 1000:.2f}s "
+                f"({self.tokens_per_sec:.1f} tok/s) · prompt ~{self.prompt_tokens} tokens")
+
+
+class StreamingChatSession:
+    """Chat history plus a streaming/non-streaming turn API.
+
+    The system prompt is always kept; older turns are dropped once the
+    history exceeds `max_history_tokens` (estimated). Streamed chunks are
+    collected in a list and joined once per turn. After each turn
+    `last_stats` holds time-to-first-token and throughput.
+    """
+
+    def __init__(self, llm: BaseChatModel, system_prompt: str = "You are a helpful AI assistant. Be concise and friendly.",
+                 max_history_tokens: int = 3000):
+        self.llm = llm
+        self.system_prompt = system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.messages: List[BaseMessage] = []
+        self.last_stats: Optional[TurnStats] = None
+        self.clear()
+
+    def clear(self) -> None:
+        self.messages = [SystemMessage(content=self.system_prompt)]
+
+    def _trim(self) -> int:
+        """Drop the oldest turns until the history fits the budget. The system prompt and newest message stay."""
+        system, history = self.messages[0], self.messages[1:]
+        budget = self.max_history_tokens - message_tokens(system)
+        kept: List[BaseMessage] = []
+        used = 0
+        for message in reversed(history):
+            cost = message_tokens(message)
+            if kept and used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        # 不让历史以 AI 回复开头，避免孤立的回答
+        while len(kept) > 1 and isinstance(kept[0], AIMessage):
+            kept.pop(0)
+        dropped = len(history) - len(kept)
+        self.messages = [system] + kept
+        return dropped
+
+    def _prepare(self, user_input: str) -> tuple[int, int]:
+        self.messages.append(HumanMessage(content=user_input))
+        dropped = self._trim()
+        return sum(message_tokens(message) for message in self.messages), dropped
+
+    def stream(self, user_input: str) -> Iterator[str]:
+        """Send a user message and yield the reply as it is generated."""
+        prompt_tokens, dropped = self._prepare(user_input)
+        parts: List[str] = []
+        started = time.perf_counter()
+        first_token_at = None
+        for chunk in self.llm.stream(self.messages):
+            if chunk.content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                text = str(chunk.content)
+                parts.append(text)
+                yield text
+        finished = time.perf_counter()
+
+        reply = "".join(parts)
+        self.messages.append(AIMessage(content=reply))
+        self.last_stats = TurnStats(
+            prompt_tokens=prompt_tokens,
+            output_tokens=estimate_tokens(reply),
+            ttft_ms=((first_token_at or finished) - started) * 1000,
+            total_ms=(finished - started) * 1000,
+            dropped_messages=dropped,
+        )
+
+    def send(self, user_input: str) -> str:
+        """Send a user message and return the whole reply (no streaming; TTFT equals the total time)."""
+        prompt_tokens, dropped = self._prepare(user_input)
+        started = time.perf_counter()
+        reply = str(self.llm.invoke(self.messages).content)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.messages.append(AIMessage(content=reply))
+        self.last_stats = TurnStats(prompt_tokens, estimate_tokens(reply), elapsed, elapsed, dropped)
+        return reply
@@ -1,13 +1,24 @@
-from typing import Annotated, Sequence, TypedDict
+from typing import Annotated, Callable, Sequence, TypedDict
 from dotenv import load_dotenv  
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, SystemMessage
 from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
-from langgraph.graph.message import add_messages
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from langgraph.prebuilt import ToolNode
+from langgraph.types import Command, interrupt
+from langchain_core.tools import InjectedToolCallId
+from langchain_core.runnables import RunnableConfig
 from pydantic import SecretStr
 import os
+import time
+
+from checkpointing import open_checkpointer, prune_checkpoints
+from conversation_turns import TurnWorker, stream_turn
+from document_store import DocumentStore, DocumentVersion
+from message_deltas import append_messages
+from document_edits import (
+    EditError, replace_range, insert_after, delete_section, apply_unified_diff, document_view,
+)
 
 load_dotenv()
 
@@ -17,58 +28,192 @@ OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 if not OPENAI_API_KEY or not OPENAI_BASE_URL:
     raise ValueError("Please set OPENAI_API_KEY and OPENAI_BASE_URL in your environment variables.")
 
+def newest_version(current: int, new: int) -> int:
+    return max(current, new)
+
+def last_value(_, new):
+    return new
+
 class DrafterState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+    messages: Annotated[Sequence[BaseMessage], append_messages]
+    # 文档正文放在按会话隔离的 document_store 里，状态里只记录版本号，checkpoint 保持很小
+    # 同一步里有多个编辑工具调用时每个都会写这两个键，所以需要 reducer：版本号取最大的
+    document_version: Annotated[int, newest_version]
+    # 最近一次修改所在的行，用于决定 prompt 里展示文档的哪一段
+    focus_line: Annotated[int, last_value]
+
+# 每个 thread_id 一份文档：修改生成新的不可变版本，后台原子写盘，空闲文档换出内存
+document_store = DocumentStore(
+    root=os.getenv("DRAFTER_DOCUMENT_DIR", "drafter_documents"),
+    max_resident=int(os.getenv("DRAFTER_MAX_RESIDENT", "256")),
+    idle_seconds=float(os.getenv("DRAFTER_IDLE_SECONDS", "300")),
+    max_history=int(os.getenv("DRAFTER_KEEP_VERSIONS", "200")),
+    history_max_age=float(os.environ["DRAFTER_VERSION_MAX_AGE"]) if os.getenv("DRAFTER_VERSION_MAX_AGE") else None,
+)
+
+def session_id_of(config: RunnableConfig) -> str:
+    return str(config.get("configurable", {}).get("thread_id", "default"))
+
+def edit_result(config: RunnableConfig, tool_call_id: str, apply: Callable[[str], tuple], description: str) -> Command:
+    """Run an in-place edit and report only what changed, not the whole document."""
+    try:
+        # 在 store 里按顺序应用：同一步的并行工具调用各自基于上一个编辑的结果，不会互相覆盖
+        committed, line = document_store.edit(session_id_of(config), apply)
+    except EditError as e:
+        return Command(update={"messages": [ToolMessage(content=f"Edit failed: {e}", tool_call_id=tool_call_id)]})
+    return Command(update={
+        "document_version": committed.version,
+        "focus_line": line,
+        "messages": [ToolMessage(
+            content=f"{description} at line {line}. The document now has {committed.content.count(chr(10)) + 1} lines.",
+            tool_call_id=tool_call_id,
+        )],
+    })
+
+@tool
+def update(content: str, config: RunnableConfig,
+           tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Replace the whole document. Use only for new documents or complete rewrites."""
+    return edit_result(config, tool_call_id, lambda _: (content, 1), "Document has been updated successfully")
 
-document_content = ""
+@tool
+def replace_lines(start_line: int, end_line: int, text: str, config: RunnableConfig,
+                  tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Replace lines start_line..end_line (1-based, inclusive) of the document with text."""
+    return edit_result(
+        config, tool_call_id,
+        lambda document: replace_range(document, start_line, end_line, text),
+        f"Replaced lines {start_line}-{end_line}",
+    )
+
+@tool
+def insert_text_after(anchor: str, text: str, config: RunnableConfig,
+                      tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Insert text after the single line containing anchor."""
+    return edit_result(
+        config, tool_call_id,
+        lambda document: insert_after(document, anchor, text),
+        "Inserted text",
+    )
 
 @tool
-def update(content: str) -> str:
-    """Update the document content."""
-    global document_content
-    document_content = content
-    return f"Document has been updated successfully! The current content is:\n{document_content}"
+def remove_section(heading: str, config: RunnableConfig,
+                   tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Delete the section starting at the line containing heading (up to the next heading of the same level)."""
+    return edit_result(
+        config, tool_call_id,
+        lambda document: delete_section(document, heading),
+        "Deleted section",
+    )
+
+@tool
+def apply_diff(diff: str, config: RunnableConfig,
+               tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Apply a unified diff (with @@ hunk headers) to the document."""
+    return edit_result(
+        config, tool_call_id,
+        lambda document: apply_unified_diff(document, diff),
+        "Applied diff",
+    )
+
+def restored_result(tool_call_id: str, version: int, restored: DocumentVersion) -> Command:
+    return Command(update={
+        "document_version": restored.version,
+        "focus_line": 1,
+        "messages": [ToolMessage(
+            content=f"Restored the content of version {version} as version {restored.version}.",
+            tool_call_id=tool_call_id,
+        )],
+    })
+
+@tool
+def list_versions(config: RunnableConfig) -> str:
+    """List the stored versions of the document with their timestamps."""
+    entries = document_store.history(session_id_of(config)).versions()
+    if not entries:
+        return "The document has no saved versions yet."
+    return "\n".join(
+        f"version {version}: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))}"
+        for version, timestamp, _ in entries[-20:]
+    )
+
+@tool
+def restore_version(version: int, config: RunnableConfig,
+                    tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Restore an earlier version of the document (see 'list_versions')."""
+    try:
+        restored = document_store.restore(session_id_of(config), version)
+    except KeyError as e:
+        return Command(update={"messages": [ToolMessage(content=f"Restore failed: {e}", tool_call_id=tool_call_id)]})
+    return restored_result(tool_call_id, version, restored)
 
 @tool
-def save(filename: str) -> str:
+def undo(config: RunnableConfig, tool_call_id: Annotated[str, InjectedToolCallId]) -> Command:
+    """Undo the most recent change to the document. Repeated undos keep going back."""
+    undone = document_store.undo(session_id_of(config))
+    if undone is None:
+        return Command(update={"messages": [ToolMessage(content="Nothing to undo.", tool_call_id=tool_call_id)]})
+    restored, version = undone
+    return restored_result(tool_call_id, version, restored)
+
+@tool
+def save(filename: str, config: RunnableConfig) -> str:
     """Save the document content to a file."""
-    global document_content
-    if not document_content:
+    session_id = session_id_of(config)
+    if not document_store.get(session_id).content:
         return "Document is empty. Nothing to save."
     if not filename.endswith('.txt'):
         filename += '.txt'
 
-    try:
-        with open(filename, 'w') as file:
-            file.write(document_content)
-        return f"Document saved successfully to {filename}."
-    except Exception as e:
-        return f"An error occurred while saving the document: {str(e)}"
+    # 原子写入（临时文件 + rename），在后台线程完成，不阻塞对话
+    path, future = document_store.export(session_id, filename, os.getenv("DRAFTER_EXPORT_DIR", "exports"))
+    future.add_done_callback(
+        lambda f: print(f"\n⚠️ Saving {path} failed: {f.exception()}") if f.exception() else None
+    )
+    return f"Document is being saved to {path}."
     
-tools = [update, save]
+tools = [update, replace_lines, insert_text_after, remove_section, apply_diff, undo, list_versions, restore_version, save]
 
-model = ChatOpenAI(api_key=SecretStr(OPENAI_API_KEY), base_url=OPENAI_BASE_URL, model="gpt-4o-mini").bind_tools(tools=tools)
+# 编辑基于行号，一次只让模型发一个工具调用，下一次编辑能看到上一次的结果
+model = ChatOpenAI(api_key=SecretStr(OPENAI_API_KEY), base_url=OPENAI_BASE_URL, model="gpt-4o-mini").bind_tools(
+    tools=tools, parallel_tool_calls=False
+)
+
+def latest_user_text(state: DrafterState) -> str:
+    for message in reversed(state['messages']):
+        if isinstance(message, HumanMessage):
+            return str(message.content)
+    return ""
 
-def our_agent(state: DrafterState) -> DrafterState:
+def our_agent(state: DrafterState, config: RunnableConfig) -> DrafterState:
+    # 只把大纲和相关的片段放进 prompt，长文档的 token 数不再随文档长度增长
+    document_view_text = document_view(
+        document_store.get(session_id_of(config)).content,
+        query=latest_user_text(state),
+        focus_line=state.get("focus_line"),
+    )
     system_prompt = SystemMessage(content=f"""
     You are Drafter, a helpful writing assistant. You are going to help the user update and modify documents.
     
     IMPORTANT RULES:
-    - When you create or write new content (like emails, letters, documents), ALWAYS use the 'update' tool to save it to the document.
+    - When you create new content (like emails, letters, documents), use the 'update' tool to write the whole document.
     - When the user asks you to save content, use the 'save' tool with the filename they specify.
-    - If the user wants to modify existing content, use the 'update' tool with the complete updated content.
-    - Always use the update tool before showing content to the user, so they can save it later.
+    - If the user wants to modify existing content, edit it in place instead of rewriting it:
+      'replace_lines' for a line range, 'insert_text_after' to add after an anchor line,
+      'remove_section' to delete a section, or 'apply_diff' for a unified diff touching several places.
+    - Line numbers refer to the numbered view below; only use 'update' with the complete content for full rewrites.
+    - Use 'undo' to revert the last change, or 'list_versions' and 'restore_version' to go back to an earlier version.
+    - Always edit the document with the tools before showing content to the user, so they can save it later.
     
-    The current document content is: {document_content if document_content else "(empty)"}
+    The current document is:
+    {document_view_text}
     """)
     
     all_messages = [system_prompt] + list(state['messages'])
 
     response = model.invoke(all_messages)
 
-    print(f"\n🤖 AI: {response.content}")
-
-    return DrafterState(messages=list(state['messages']) + [response])
+    return DrafterState(messages=[response])
 
 def should_continue(state: DrafterState) -> str:
     messages = state['messages']
@@ -94,22 +239,23 @@ def should_continue(state: DrafterState) -> str:
     # Otherwise, wait for user input
     return "user_input"
 
+def is_goodbye(message: BaseMessage) -> bool:
+    content = message.content
+    return isinstance(message, HumanMessage) and isinstance(content, str) and content.lower() in ['bye', 'quit', 'exit']
+
 def get_user_input(state: DrafterState) -> DrafterState:
-    user_input = input("\n👤 You: ")
-    if user_input.lower() in ['quit', 'exit', 'bye']:
-        return DrafterState(messages=list(state['messages']) + [HumanMessage(content="bye")])
-    
-    user_message = HumanMessage(content=user_input)
-    return DrafterState(messages=list(state['messages']) + [user_message])
+    # 在这里暂停并把 checkpoint 写盘，不占用线程等待用户；send_turn 用 Command(resume=text) 继续
+    user_input = interrupt({"prompt": "👤 You: "})
+    return DrafterState(messages=[HumanMessage(content=user_input)])
 
-def print_messages(messages):
-    """Function I made to print the messages in a more readable format"""
-    if not messages:
-        return
-    
-    for message in messages[-3:]:
-        if isinstance(message, ToolMessage):
-            print(f"\n🛠️ TOOL RESULT: {message.content}")
+def route_start(state: DrafterState) -> str:
+    messages = state.get('messages') or []
+    if not messages or not isinstance(messages[-1], HumanMessage):
+        return "user_input"
+    return "end" if is_goodbye(messages[-1]) else "agent"
+
+def after_user_input(state: DrafterState) -> str:
+    return "end" if is_goodbye(state['messages'][-1]) else "agent"
 
 
 graph = StateGraph(DrafterState)
@@ -118,8 +264,9 @@ graph.add_node("agent", our_agent)
 graph.add_node("tools", ToolNode(tools))
 graph.add_node("user_input", get_user_input)
 
-graph.set_entry_point("user_input")  # Start with user input
-graph.add_edge("user_input", "agent")  # User input goes to agent
+# 新对话带着第一条消息直接进入 agent；之后每一轮都在 user_input 处中断等待
+graph.add_conditional_edges(START, route_start, {"agent": "agent", "user_input": "user_input", "end": END})
+graph.add_conditional_edges("user_input", after_user_input, {"agent": "agent", "end": END})
 
 graph.add_conditional_edges(
     "agent",
@@ -133,22 +280,54 @@ graph.add_conditional_edges(
 
 graph.add_edge("tools", "agent")  # After tools, go back to agent
 
-app = graph.compile()
+# 每一步都写 checkpoint，进程崩溃后用同一个 thread_id 从最新状态继续，不需要重放整个对话
+checkpointer = open_checkpointer()
+app = graph.compile(checkpointer=checkpointer)
+
+THREAD_ID = os.getenv("DRAFTER_THREAD_ID", "drafter")
+KEEP_CHECKPOINTS = int(os.getenv("DRAFTER_KEEP_CHECKPOINTS", "10"))
+
+def send_turn(thread_id: str, text: str):
+    """Send one user message to a Drafter conversation and yield the resulting events."""
+    for event in stream_turn(app, thread_id, text, lambda message: DrafterState(messages=[message])):
+        if event["type"] in ("waiting", "finished"):
+            # 一轮结束时清理旧 checkpoint，只保留最近几个
+            prune_checkpoints(checkpointer, thread_id, keep=KEEP_CHECKPOINTS)
+        yield event
+
+# 一个进程里用少量线程服务任意多个会话：等待用户输入的会话只占 checkpoint，不占线程
+worker = TurnWorker(send_turn, max_workers=int(os.getenv("DRAFTER_WORKERS", "4")))
+
+def print_event(event: dict):
+    if event["type"] == "ai" and event["content"]:
+        print(f"\n🤖 AI: {event['content']}")
+    elif event["type"] == "tool":
+        print(f"\n🛠️ TOOL RESULT: {event['content']}")
 
-def run_document_agent():
+def run_document_agent(thread_id: str = THREAD_ID):
     print("\n ===== DRAFTER =====")
     print("👋 Hi! I'm Drafter, your document writing assistant.")
     print("📝 I can help you create, update, and save documents.")
     print("💬 Type 'quit', 'exit', or 'bye' to end the conversation.\n")
-    
 
-    state = DrafterState(messages=[])
-    
-    for step in app.stream(state, stream_mode="values"):
-        if "messages" in step:
-            print_messages(step["messages"])
-    
+    snapshot = app.get_state({"configurable": {"thread_id": thread_id}})
+    if snapshot.interrupts:
+        # 上次运行没有结束，从最新的 checkpoint 继续
+        print(f"🔁 Resuming thread '{thread_id}' ({len(snapshot.values.get('messages', []))} messages).")
+
+    while True:
+        user_input = input("\n👤 You: ")
+        status = "finished"
+        for event in worker.send_turn(thread_id, user_input):
+            print_event(event)
+            status = event["type"]
+        print(f"💾 checkpoint writes: {checkpointer.drain_timings()}")
+        if status == "finished":
+            break
+
+    worker.close()
+    document_store.flush()
     print("\n ===== DRAFTER FINISHED =====")
 
 if __name__ == "__main__":
-    run_document_agent()
\ No newline at end of file
+    run_document_agent()
@@ -1,11 +1,17 @@
-from typing import TypedDict, List, Union
-from langchain_core.messages import HumanMessage, AIMessage
+from typing import Annotated, List, TypedDict
+from langchain_core.messages import BaseMessage, AIMessage
 from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.message import add_messages
 from pydantic import SecretStr
 import os
 from dotenv import load_dotenv
 
+from memory_manager import MemoryManager
+from checkpointing import open_checkpointer, prune_checkpoints
+from conversation_turns import TurnWorker, stream_turn
+from transcript import TranscriptWriter
+
 load_dotenv()
 
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
@@ -15,41 +21,87 @@ if OPENAI_BASE_URL is None or OPENAI_API_KEY is None:
     raise ValueError("Please set the OPENAI_BASE_URL and OPENAI_API_KEY environment variables.")
 
 class AgentState(TypedDict):
-    messages: List[Union[HumanMessage, AIMessage]]
+    messages: Annotated[List[BaseMessage], add_messages]
+    summary: str
+    turn_metrics: dict
 
 llm = ChatOpenAI(base_url=OPENAI_BASE_URL, api_key=SecretStr(OPENAI_API_KEY), model="gpt-4o-mini", temperature=0.7)
 
+# 最近的对话原样保留，超过阈值后把更早的对话折叠进滚动摘要，prompt 大小不再随轮数线性增长
+memory = MemoryManager(
+    llm,
+    window_tokens=int(os.getenv("MEMORY_WINDOW_TOKENS", "1500")),
+    summarize_threshold=int(os.getenv("MEMORY_SUMMARIZE_THRESHOLD", "2500")),
+)
+
 def process(state: AgentState) -> AgentState:
-    response = llm.invoke(state["messages"])
-    print(f"\nAI: {response.content}")
-    state["messages"].append(AIMessage(content=response.content))
-    return state
+    prompt = memory.build_prompt(state)
+    response = llm.invoke(prompt)
+    return AgentState(
+        messages=[AIMessage(content=response.content)],
+        turn_metrics=memory.prompt_metrics(prompt, state.get("summary", "")),
+    )
 
 
 graph = StateGraph(AgentState)
+graph.add_node("memory", memory)
 graph.add_node("process", process)
-graph.add_edge(START, "process")
+graph.add_edge(START, "memory")
+graph.add_edge("memory", "process")
 graph.add_edge("process", END)
-agent = graph.compile()
 
-conversation_history = []
+# 每一步的状态都写进本地 SQLite，进程崩溃后用同一个 thread_id 直接从最新 checkpoint 继续
+checkpointer = open_checkpointer()
+agent = graph.compile(checkpointer=checkpointer)
+
+THREAD_ID = os.getenv("MEMORY_THREAD_ID", "memory-agent")
+KEEP_CHECKPOINTS = int(os.getenv("MEMORY_KEEP_CHECKPOINTS", "10"))
+
+def send_turn(thread_id: str, text: str):
+    """Send one user message to a conversation and yield the resulting events.
+
+    Each turn runs the graph to END; the conversation itself lives in the
+    checkpointer, so nothing is held in memory between turns.
+    """
+    # 只传入新消息，历史由 checkpoint 恢复
+    for event in stream_turn(agent, thread_id, text, lambda message: AgentState(messages=[message])):
+        if event["type"] == "finished":
+            prune_checkpoints(checkpointer, thread_id, keep=KEEP_CHECKPOINTS)
+        yield event
 
-user_input = input("You: ")
+# 一个进程里用少量线程服务任意多个会话，空闲会话不占线程
+worker = TurnWorker(send_turn, max_workers=int(os.getenv("MEMORY_WORKERS", "4")))
+
+def main(thread_id: str = THREAD_ID):
+    # 每一轮对话立即追加到 logging.txt（后台线程写入，按大小滚动），进程中途退出也不会丢
+    transcript = TranscriptWriter(
+        "logging.txt",
+        max_bytes=int(os.getenv("TRANSCRIPT_MAX_BYTES", str(1 << 20))),
+        compress=os.getenv("TRANSCRIPT_GZIP", "false").lower() == "true",
+    )
+    transcript.write("Your Conversation Log:")
+
+    resumed = agent.get_state({"configurable": {"thread_id": thread_id}}).values
+    if resumed.get("messages"):
+        print(f"🔁 Resumed thread '{thread_id}' with {len(resumed['messages'])} messages in memory.")
 
-while user_input.lower() != "exit":
-    conversation_history.append(HumanMessage(content=user_input))
-    result = agent.invoke(AgentState(messages=conversation_history))
-    conversation_history = result["messages"]
     user_input = input("You: ")
 
-with open("logging.txt", "w") as file:
-    file.write("Your Conversation Log:\n")
-    
-    for message in conversation_history:
-        if isinstance(message, HumanMessage):
-            file.write(f"You: {message.content}\n")
-        elif isinstance(message, AIMessage):
-            file.write(f"AI: {message.content}\n\n")
-    file.write("End of Conversation")
-
-print("Conversation saved to logging.txt")
\ No newline at end of file
+    while user_input.lower() != "exit":
+        transcript.write_turn("You", user_input)
+        for event in worker.send_turn(thread_id, user_input):
+            if event["type"] == "ai":
+                print(f"\nAI: {event['content']}")
+                transcript.write_turn("AI", f"{event['content']}\n")
+            elif event["type"] == "finished":
+                print(f"📏 {event['values']['turn_metrics']} 💾 {checkpointer.drain_timings()}")
+        user_input = input("You: ")
+
+    transcript.write("End of Conversation")
+    transcript.close()
+    worker.close()
+
+    print("Conversation saved to logging.txt")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,26 @@
 from typing import Annotated, Sequence, TypedDict
 from dotenv import load_dotenv  
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_openai import ChatOpenAI
 from langchain_openai import OpenAIEmbeddings
 from langchain_core.tools import tool
-from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from langgraph.prebuilt import ToolNode, InjectedState
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from pydantic import SecretStr
-from langchain_chroma import Chroma
+from concurrent.futures import Future, ThreadPoolExecutor
+import hashlib
+import threading
+import uuid
 import os
 
+from message_deltas import append_messages
+from rag_context import ContextPacker, format_context, normalize_query
+from vector_index import VersionedIndex, HotReloadingRetriever
+from local_embeddings import HashingEmbeddings
+from retrieval_cache import RetrievalCache
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -31,79 +39,137 @@ llm = ChatOpenAI(
 # 向量 
 # 每一个向量之间的转换都需要向量模型的参与
 # 每一个llm 都有对应的向量模型
-embeddings = OpenAIEmbeddings(
-    api_key=SecretStr(OPENAI_API_KEY),
-    base_url=OPENAI_BASE_URL,
-    model="text-embedding-3-small",
-)
+# RAG_EMBEDDINGS=local 使用本地 CPU 的特征哈希向量，不走网络，适合离线测试和快速入库
+def make_embeddings(backend: str):
+    if backend == "local":
+        return HashingEmbeddings()
+    if backend == "openai":
+        return OpenAIEmbeddings(
+            api_key=SecretStr(OPENAI_API_KEY),
+            base_url=OPENAI_BASE_URL,
+            model="text-embedding-3-small",
+        )
+    raise ValueError(f"Unknown embeddings backend: {backend}")
+
+embeddings = make_embeddings(os.getenv("RAG_EMBEDDINGS", "openai").lower())
 
 pdf_path = "张家豪-Java开发工程师.pdf"
 
 if not os.path.exists(pdf_path):
     raise FileNotFoundError(f"PDF file not found at {pdf_path}")
 
-pdf_loader = PyPDFLoader(pdf_path)
-
-try:
-    pages = pdf_loader.load()
-except Exception as e:
-    raise RuntimeError(f"Failed to load and split PDF: {str(e)}")
-
 # 文件切割器 把pdf识别到的文件 转换为 ai可以看懂的格式
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 50
 text_splitter = RecursiveCharacterTextSplitter(
-    chunk_size=200,
-    chunk_overlap=50,
+    chunk_size=CHUNK_SIZE,
+    chunk_overlap=CHUNK_OVERLAP,
     length_function=len,
+    add_start_index=True,  # 记录切片在页内的位置，用于合并相邻的重叠切片
 )
 
-pages_split = text_splitter.split_documents(pages)
+def load_chunks() -> list:
+    """Load the PDF and split it into chunks for indexing."""
+    pdf_loader = PyPDFLoader(pdf_path)
+
+    try:
+        pages = pdf_loader.load()
+    except Exception as e:
+        raise RuntimeError(f"Failed to load and split PDF: {str(e)}")
+
+    return text_splitter.split_documents(pages)
+
+def source_fingerprint(chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> str:
+    """Identify the indexed content: PDF bytes + splitter settings + embedding model."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"{chunk_size}:{chunk_overlap}".encode())
+    digest.update(str(getattr(embeddings, "model", type(embeddings).__name__)).encode())
+    return digest.hexdigest()
 
 # 把上述文件转换为向量后存储的地方，换句话来说就是db文件 数据库
-persist_directory = "/home/kindredzhang/data/projects/ai/kindred-langgraph/src/langgraph/agents"
-if not os.path.exists(persist_directory):
-    os.makedirs(persist_directory)
+# 每次重建都写入一个新的版本目录，写完后通过原子替换 CURRENT 指针发布，
+# 正在服务的检索器会自动切换到新版本，旧版本由 gc 清理
+persist_directory = os.getenv(
+    "RAG_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "rag_index"),
+)
 
 # 数据库名
 collection_name = "rag_agent_collection"
 
 # chroma实例
+index = VersionedIndex(persist_directory, collection_name, embeddings)
+
+def reindex(background: bool = True):
+    """Rebuild the index from the PDF and publish it without interrupting queries."""
+    if background:
+        return index.build_async(load_chunks(), source_fingerprint())
+    return index.build(load_chunks(), source_fingerprint())
+
+current_manifest = index.manifest()
 try:
-    vector_store = Chroma.from_documents(
-        documents=pages_split,
-        embedding=embeddings,
-        persist_directory=persist_directory,
-        collection_name=collection_name
-    )
+    if current_manifest is None:
+        reindex(background=False)
+    elif current_manifest.get("source_fingerprint") != source_fingerprint():
+        # 旧版本继续提供服务，新版本在后台构建完成后自动切换
+        reindex(background=True)
 except Exception as e:
     raise RuntimeError(f"Failed to create vector store: {str(e)}")
 
 # 检索 当我使用检索功能的时候会查询到相似的数据 search_kwargs：返回数量
 # 比如 pdf文件拆成了30块，有十条信息和我的问题相匹配，默认返回5条
-retriever = vector_store.as_retriever(
+# 多取几条候选，交给 context_packer 去重、合并后按 token 预算挑选
+RETRIEVER_K = 8
+retriever = HotReloadingRetriever(
+    index,
     search_type="similarity",
-    search_kwargs={"k": 5} # K is the amount of chunks to return
+    search_kwargs={"k": RETRIEVER_K} # K is the amount of chunks to return
 )
 
-@tool
-def retriever_tool(query: str) -> str:
-    """Retrieve relevant information from the resume document."""
-    docs = retriever.invoke(query)
+# 同一轮对话里模型经常用几乎一样的问题反复检索，按 (归一化 query, k, 索引版本) 缓存检索结果
+# 索引发布新版本后旧的缓存自动失效
+retrieval_cache = RetrievalCache(maxsize=int(os.getenv("RAG_CACHE_SIZE", "256")))
+
+# 上下文组装：合并相邻切片 -> 去掉本轮对话已经返回过的内容 -> MMR + token 预算
+context_packer = ContextPacker(token_budget=int(os.getenv("RAG_CONTEXT_TOKENS", "600")))
+
+def shown_contexts(messages: Sequence[BaseMessage]) -> list[str]:
+    """Contents of the retriever results already shown in this conversation."""
+    return [
+        str(message.content)
+        for message in messages
+        if isinstance(message, ToolMessage) and message.name == "retriever_tool"
+    ]
+
+def retrieve_context(query: str, messages: Sequence[BaseMessage] = ()) -> str:
+    """Retrieve, deduplicate and pack the resume passages relevant to query."""
+    docs = retrieval_cache.get_or_compute(
+        query, RETRIEVER_K, retriever.current_version(), lambda: retriever.invoke(query)
+    )
 
     if not docs:
         return "I found no relevant information in the resume document."
-    
-    results = []
-    for i, doc in enumerate(docs):
-        results.append(f"Document {i+1}:\n{doc.page_content}")
-    
-    return "\n\n".join(results)
+
+    chunks = context_packer.pack(docs, seen_texts=shown_contexts(messages))
+    if not chunks:
+        return "The relevant passages were already provided earlier in this conversation; please reuse them."
+
+    return format_context(chunks)
+
+@tool
+def retriever_tool(query: str, state: Annotated[dict, InjectedState]) -> str:
+    """Retrieve relevant information from the resume document."""
+    return retrieve_context(query, state.get("messages", []))
 
 tools = [retriever_tool]
 
 llm = llm.bind_tools(tools=tools)
 
 class AgentState(TypedDict):
-    messages: Annotated[Sequence[BaseMessage], add_messages]
+    messages: Annotated[Sequence[BaseMessage], append_messages]
 
 def should_continue(state: AgentState) -> str:
     """Check if the last message contains tool calls."""
@@ -131,31 +197,134 @@ def call_llm(state: AgentState) -> AgentState:
     messages = [SystemMessage(content=system_prompt)] + list(state['messages'])
     response = llm.invoke(messages)
     print(f"\n🤖 AI: {response.content}")    
-    return AgentState(messages=list(state['messages']) + [response])
+    return AgentState(messages=[response])
+
+# 投机检索：不等模型决定调用 retriever_tool，直接用用户原始问题去检索
+#   off     - 原始流程：agent -> tools -> agent
+#   parallel- 第一次 call_llm 和检索并发执行，模型请求的正好是这个 query 时直接复用结果
+#   prefill - 跳过第一次 call_llm，把检索结果作为预先填好的工具调用交给模型
+SPECULATIVE_MODE = os.getenv("RAG_SPECULATIVE", "off").lower()
+
+speculation_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-speculate")
+
+# used: 结果被模型复用；cancelled: 还没开始执行就取消了；
+# wasted: 丢弃时已经在执行，检索和 embedding 调用照常完成（结果只进了 retrieval_cache）
+speculation_stats = {"used": 0, "cancelled": 0, "wasted": 0}
+_speculation_lock = threading.Lock()
+
+def _count_speculation(outcome: str) -> None:
+    with _speculation_lock:
+        speculation_stats[outcome] += 1
+
+def discard_speculation(future: Future) -> None:
+    """Drop a speculative retrieval the model did not ask for.
+
+    Future.cancel() only works while the job is still queued; a retrieval
+    that already started cannot be interrupted, so it is left to finish in
+    the background and counted as wasted.
+    """
+    if future.cancel():
+        _count_speculation("cancelled")
+        return
+
+    def finished(done: Future) -> None:
+        # 取出异常，避免后台检索的错误悄悄丢失
+        if done.exception() is not None:
+            print(f"\n⚠️ Discarded speculative retrieval failed: {done.exception()!r}")
+        _count_speculation("wasted")
+
+    future.add_done_callback(finished)
+
+def latest_question(state: AgentState) -> str:
+    for message in reversed(state['messages']):
+        if isinstance(message, HumanMessage):
+            return str(message.content)
+    return ""
+
+def speculative_retrieval(state: AgentState) -> AgentState:
+    """Retrieve on the raw user question before (or while) the model decides what to search."""
+    question = latest_question(state)
+    history = list(state['messages'])
+
+    if SPECULATIVE_MODE == "prefill":
+        call_id = f"call_{uuid.uuid4().hex}"
+        tool_request = AIMessage(
+            content="",
+            tool_calls=[{"name": "retriever_tool", "args": {"query": question}, "id": call_id}],
+        )
+        tool_result = ToolMessage(
+            content=retrieve_context(question, history),
+            name="retriever_tool",
+            tool_call_id=call_id,
+        )
+        return AgentState(messages=[tool_request, tool_result])
+
+    future = speculation_pool.submit(retrieve_context, question, history)
+    response = llm.invoke([SystemMessage(content=system_prompt)] + history)
+    print(f"\n🤖 AI: {response.content}")
+
+    tool_calls = getattr(response, 'tool_calls', None) or []
+    if (
+        len(tool_calls) == 1
+        and tool_calls[0]['name'] == "retriever_tool"
+        and normalize_query(tool_calls[0]['args'].get("query", "")) == normalize_query(question)
+    ):
+        tool_result = ToolMessage(
+            content=future.result(),
+            name="retriever_tool",
+            tool_call_id=tool_calls[0]['id'],
+        )
+        _count_speculation("used")
+        return AgentState(messages=[response, tool_result])
+
+    # 模型想查别的内容（或不需要检索），丢弃投机结果，回到正常循环
+    discard_speculation(future)
+    return AgentState(messages=[response])
+
+def after_speculation(state: AgentState) -> str:
+    if isinstance(state['messages'][-1], ToolMessage):
+        return "agent"
+    return should_continue(state)
+
+def build_graph(speculative_mode: str = "off"):
+    graph = StateGraph(AgentState)
+
+    # Add nodes
+    graph.add_node("agent", call_llm)
+    graph.add_node("tools", ToolNode(tools))
+
+    # Add conditional edges
+    graph.add_conditional_edges(
+        "agent",
+        should_continue,
+        {
+            "tools": "tools",
+            "end": END
+        }
+    )
 
-# Create the graph
-graph = StateGraph(AgentState)
-
-# Add nodes
-graph.add_node("agent", call_llm)
-graph.add_node("tools", ToolNode(tools))
-
-# Add conditional edges
-graph.add_conditional_edges(
-    "agent",
-    should_continue,
-    {
-        "tools": "tools",
-        "end": END
-    }
-)
+    # Add edge from tools back to agent
+    graph.add_edge("tools", "agent")
+
+    if speculative_mode in ("parallel", "prefill"):
+        graph.add_node("speculate", speculative_retrieval)
+        graph.add_conditional_edges(
+            "speculate",
+            after_speculation,
+            {
+                "agent": "agent",
+                "tools": "tools",
+                "end": END
+            }
+        )
+        graph.set_entry_point("speculate")
+    else:
+        graph.set_entry_point("agent")
 
-# Add edge from tools back to agent
-graph.add_edge("tools", "agent")
+    return graph.compile()
 
-# Set entry point and compile
-graph.set_entry_point("agent")
-app = graph.compile()
+# Create the graph
+app = build_graph(SPECULATIVE_MODE)
 
 def running_agent():
     print("\n=== RAG AGENT===")
@@ -163,7 +332,14 @@ def running_agent():
     while True:
         user_input = input("\nWhat is your question: ")
         if user_input.lower() in ['exit', 'quit']:
+            print(f"\n📊 Retrieval cache: {retrieval_cache.stats.to_dict()}")
+            if SPECULATIVE_MODE == "parallel":
+                print(f"📊 Speculative retrieval: {speculation_stats}")
             break
+        if user_input.lower() == 'reindex':
+            reindex(background=True)
+            print("🔄 Rebuilding the index in the background...")
+            continue
             
         messages = [HumanMessage(content=user_input)]
         result = app.invoke(AgentState(messages=messages))
@@ -0,0 +1,97 @@
+"""Ingestion throughput of the local hashing embeddings vs the remote OpenAI embeddings.
+
+Usage:
+    python bench_embeddings.py [--chunks 2000] [--remote-chunks 200]
+
+The remote path only runs when OPENAI_API_KEY is set.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from local_embeddings import HashingEmbeddings
+
+load_dotenv()
+
+WORDS = ["Java", "Spring Boot", "MySQL", "Redis", "Kafka", "微服务", "分布式", "高并发",
+         "项目经验", "负责", "设计", "优化", "接口", "性能", "缓存", "消息队列", "LangGraph", "RAG"]
+
+
+def synthetic_chunks(count: int, size: int = 200, seed: int = 0) -> list[Document]:
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(count):
+        text = ""
+        while len(text) < size:
+            text += rng.choice(WORDS) + rng.choice([" ", "，", "。", " "])
+        chunks.append(Document(page_content=text[:size], metadata={"source": "synthetic", "page": i // 10}))
+    return chunks
+
+
+def bench_embed(name: str, embeddings, chunks: list[Document]) -> float:
+    texts = [chunk.page_content for chunk in chunks]
+    started = time.perf_counter()
+    embeddings.embed_documents(texts)
+    elapsed = time.perf_counter() - started
+    rate = len(texts) / elapsed
+    print(f"{name:<28} embed   {len(texts):>6} chunks  {elapsed:8.3f}s  {rate:10.1f} chunks/sec")
+    return rate
+
+
+def bench_ingest(name: str, embeddings, chunks: list[Document]) -> float:
+    try:
+        from langchain_chroma import Chroma
+    except ImportError:
+        print(f"{name:<28} ingest  skipped (langchain_chroma not installed)")
+        return 0.0
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        started = time.perf_counter()
+        Chroma.from_documents(
+            documents=chunks,
+            embedding=embeddings,
+            persist_directory=persist_directory,
+            collection_name="bench",
+        )
+        elapsed = time.perf_counter() - started
+    rate = len(chunks) / elapsed
+    print(f"{name:<28} ingest  {len(chunks):>6} chunks  {elapsed:8.3f}s  {rate:10.1f} chunks/sec")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--remote-chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.chunks)
+    local = HashingEmbeddings()
+    bench_embed("local (hashing)", local, chunks)
+    bench_ingest("local (hashing)", local, chunks)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        print("OPENAI_API_KEY not set, skipping remote embeddings.")
+        return
+
+    from langchain_openai import OpenAIEmbeddings
+    from pydantic import SecretStr
+
+    remote = OpenAIEmbeddings(
+        api_key=SecretStr(api_key),
+        base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+        model="text-embedding-3-small",
+    )
+    remote_chunks = chunks[:args.remote_chunks]
+    bench_embed("remote (openai)", remote, remote_chunks)
+    bench_ingest("remote (openai)", remote, remote_chunks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Per-turn graph overhead when nodes return message deltas versus the full history.
+
+Usage:
+    python bench_message_deltas.py [--turns 1500] [--bucket 250]
+
+Runs one long conversation inside a single graph run (a user node and an
+agent node in a loop, no model call) on an add_messages channel. The "full"
+variant returns `list(state['messages']) + [message]` like call_llm and
+our_agent used to; "delta" returns `[message]`; "append" returns deltas
+into message_deltas.append_messages instead of add_messages. Per-turn time
+is reported per bucket of turns, so growth with history length is visible.
+"""
+import argparse
+import statistics
+import time
+from typing import Annotated, List, Sequence, TypedDict
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+
+from message_deltas import append_messages
+
+
+class ChatState(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+
+
+class AppendState(TypedDict):
+    messages: Annotated[Sequence[BaseMessage], append_messages]
+
+
+VARIANTS = ("full", "delta", "append")
+
+
+def build(turns: int, variant: str, turn_times: List[float]):
+    full_history = variant == "full"
+
+    # 节点不加类型注解，否则 StateGraph 会按注解里的 reducer 推断输入 schema
+    def respond(state, message: BaseMessage) -> dict:
+        if full_history:
+            return {"messages": list(state['messages']) + [message]}
+        return {"messages": [message]}
+
+    def user(state) -> dict:
+        turn_times.append(time.perf_counter())
+        return respond(state, HumanMessage(content=f"question {len(state['messages']) // 2}"))
+
+    def agent(state) -> dict:
+        return respond(state, AIMessage(content=f"answer {len(state['messages']) // 2}"))
+
+    graph = StateGraph(AppendState if variant == "append" else ChatState)
+    graph.add_node("user", user)
+    graph.add_node("agent", agent)
+    graph.add_edge(START, "user")
+    graph.add_edge("user", "agent")
+    graph.add_conditional_edges("agent", lambda state: "user" if len(state['messages']) < 2 * turns else "end",
+                                {"user": "user", "end": END})
+    return graph.compile()
+
+
+def run(turns: int, variant: str) -> List[float]:
+    turn_times: List[float] = []
+    app = build(turns, variant, turn_times)
+    app.invoke({"messages": []}, {"recursion_limit": 2 * turns + 10})
+    turn_times.append(time.perf_counter())
+    return [(b - a) * 1e6 for a, b in zip(turn_times, turn_times[1:])]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=1500)
+    parser.add_argument("--bucket", type=int, default=250)
+    args = parser.parse_args()
+
+    results = {name: run(args.turns, name) for name in VARIANTS}
+    print(f"{'turns':>13}" + "".join(f"  {name + ' us/turn':>15}" for name in VARIANTS))
+    for start in range(0, args.turns, args.bucket):
+        end = min(start + args.bucket, args.turns)
+        row = [statistics.median(results[name][start:end]) for name in VARIANTS]
+        print(f"{start + 1:>5}-{end:<7}" + "".join(f"  {value:>15.1f}" for value in row))
+    for name, times in results.items():
+        first, last = statistics.median(times[:args.bucket]), statistics.median(times[-args.bucket:])
+        print(f"{name}: total {sum(times) / 1e6:.2f}s, last/first bucket {last / first:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Storage size and reconstruct latency of the delta-encoded Drafter version history.
+
+Usage:
+    python bench_version_history.py [--edits 1000] [--lines 200] [--snapshot-interval 20]
+
+Simulates a document that receives small in-place edits (line replacements,
+insertions, deletions) and compares the history against storing a full copy
+of every version.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from version_history import VersionHistory
+
+WORDS = ["The", "report", "covers", "quarterly", "results", "and", "next", "steps", "for", "the",
+         "team", "including", "budget", "hiring", "roadmap", "risks", "会议", "纪要", "项目", "进度"]
+
+
+def random_line(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 14)))
+
+
+def synthetic_versions(edits: int, lines: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    document = [random_line(rng) for _ in range(lines)]
+    versions = ["\n".join(document)]
+    for _ in range(edits):
+        roll = rng.random()
+        at = rng.randrange(len(document))
+        if roll < 0.6:
+            document[at] = random_line(rng)
+        elif roll < 0.85 or len(document) < 10:
+            document[at:at] = [random_line(rng) for _ in range(rng.randint(1, 3))]
+        else:
+            del document[at:at + rng.randint(1, 3)]
+        versions.append("\n".join(document))
+    return versions
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edits", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--snapshot-interval", type=int, default=20)
+    args = parser.parse_args()
+
+    versions = synthetic_versions(args.edits, args.lines)
+    history = VersionHistory(snapshot_interval=args.snapshot_interval)
+
+    append_times = []
+    for version, content in enumerate(versions, start=1):
+        started = time.perf_counter()
+        history.append(version, content)
+        append_times.append(time.perf_counter() - started)
+
+    full_copies = sum(len(json.dumps(content, ensure_ascii=False).encode("utf-8")) for content in versions)
+    stored = history.size_bytes()
+    snapshots = sum(1 for _, _, kind in history.versions() if kind == "snapshot")
+    print(f"versions                 {len(versions):>10}")
+    print(f"snapshots / deltas       {snapshots:>10} / {len(versions) - snapshots}")
+    print(f"full copies              {full_copies / 1024:>10.1f} KiB")
+    print(f"delta history            {stored / 1024:>10.1f} KiB  ({full_copies / stored:.1f}x smaller)")
+    print(f"append                   avg {statistics.mean(append_times) * 1000:.3f} ms  "
+          f"p95 {percentile(append_times, 0.95) * 1000:.3f} ms")
+
+    reconstruct_times = []
+    for version, content in enumerate(versions, start=1):
+        started = time.perf_counter()
+        rebuilt = history.reconstruct(version)
+        reconstruct_times.append(time.perf_counter() - started)
+        assert rebuilt == content, f"version {version} reconstructed incorrectly"
+    print(f"reconstruct              avg {statistics.mean(reconstruct_times) * 1000:.3f} ms  "
+          f"p95 {percentile(reconstruct_times, 0.95) * 1000:.3f} ms  max {max(reconstruct_times) * 1000:.3f} ms")
+
+    dropped = history.gc(keep_last=100)
+    for version in range(len(versions) - 99, len(versions) + 1):
+        assert history.reconstruct(version) == versions[version - 1]
+    print(f"gc(keep_last=100)        dropped {dropped} versions, {history.size_bytes() / 1024:.1f} KiB left")
+
+
+if __name__ == "__main__":
+    main()
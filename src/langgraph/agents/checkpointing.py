@@ -0,0 +1,90 @@
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+DEFAULT_CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "checkpoints.sqlite")
+
+
+class TimedSqliteSaver(SqliteSaver):
+    """SqliteSaver that records how long each checkpoint write takes."""
+
+    def __init__(self, conn: sqlite3.Connection, **kwargs: Any):
+        super().__init__(conn, **kwargs)
+        self.write_timings: List[float] = []
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        started = time.perf_counter()
+        try:
+            return super().put(config, checkpoint, metadata, new_versions)
+        finally:
+            self.write_timings.append(time.perf_counter() - started)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        started = time.perf_counter()
+        try:
+            return super().put_writes(config, writes, task_id, task_path)
+        finally:
+            self.write_timings.append(time.perf_counter() - started)
+
+    def drain_timings(self) -> Dict[str, float]:
+        """Summarize (and reset) the write timings recorded since the last call, e.g. one turn."""
+        timings, self.write_timings = self.write_timings, []
+        if not timings:
+            return {"writes": 0, "total_ms": 0.0, "max_ms": 0.0}
+        return {
+            "writes": len(timings),
+            "total_ms": round(sum(timings) * 1000, 2),
+            "max_ms": round(max(timings) * 1000, 2),
+        }
+
+
+def open_checkpointer(path: str = DEFAULT_CHECKPOINT_DB) -> TimedSqliteSaver:
+    """Open (and create if needed) a local SQLite checkpointer shared by the graphs in this process."""
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    saver = TimedSqliteSaver(conn)
+    saver.setup()
+    return saver
+
+
+def prune_checkpoints(saver: SqliteSaver, thread_id: str, keep: int = 10) -> int:
+    """Delete all but the newest `keep` checkpoints of a thread (and their pending writes).
+
+    Resuming only needs the latest checkpoint; the extra ones just allow
+    time travel. Checkpoint ids are time ordered, so sorting by id is enough.
+    """
+    with saver.lock:
+        cur = saver.conn.execute(
+            """
+            DELETE FROM checkpoints
+            WHERE thread_id = ? AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints
+                WHERE thread_id = ?
+                ORDER BY checkpoint_id DESC
+                LIMIT ?
+            )
+            """,
+            (thread_id, thread_id, keep),
+        )
+        removed = cur.rowcount
+        saver.conn.execute(
+            """
+            DELETE FROM writes
+            WHERE thread_id = ? AND checkpoint_id NOT IN (
+                SELECT checkpoint_id FROM checkpoints WHERE thread_id = ?
+            )
+            """,
+            (thread_id, thread_id),
+        )
+        saver.conn.commit()
+    return removed
+
+
+def compact(saver: SqliteSaver) -> None:
+    """Give space freed by pruning back to the file system."""
+    with saver.lock:
+        saver.conn.execute("VACUUM")
@@ -0,0 +1,118 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langgraph.types import Command
+
+_DONE = object()
+
+
+def message_event(message: BaseMessage) -> Optional[Dict[str, Any]]:
+    if isinstance(message, AIMessage):
+        return {
+            "type": "ai",
+            "content": message.content,
+            "tool_calls": [call["name"] for call in message.tool_calls],
+        }
+    if isinstance(message, ToolMessage):
+        return {"type": "tool", "name": message.name, "content": message.content}
+    return None
+
+
+def stream_turn(app, thread_id: str, text: str,
+                new_input: Callable[[HumanMessage], dict]) -> Iterator[Dict[str, Any]]:
+    """Run one user turn of a checkpointed graph and yield its events.
+
+    If the thread is paused at an interrupt (waiting for the user), the turn
+    resumes it with `text`; otherwise it starts a new run with
+    `new_input(HumanMessage(text))`. Each new AI / tool message is yielded
+    once, followed by a final "waiting" (paused at an interrupt) or
+    "finished" event carrying the thread's state values.
+    """
+    config = {"configurable": {"thread_id": thread_id}}
+    snapshot = app.get_state(config)
+    seen = {message.id for message in snapshot.values.get("messages", [])}
+    if snapshot.interrupts:
+        payload = Command(resume=text)
+    else:
+        payload = new_input(HumanMessage(content=text))
+
+    for values in app.stream(payload, config, stream_mode="values"):
+        for message in values.get("messages", []):
+            if message.id in seen:
+                continue
+            seen.add(message.id)
+            event = message_event(message)
+            if event is not None:
+                yield event
+
+    snapshot = app.get_state(config)
+    yield {
+        "type": "waiting" if snapshot.interrupts else "finished",
+        "thread_id": thread_id,
+        "values": snapshot.values,
+    }
+
+
+class TurnWorker:
+    """Serve many conversations from a small, fixed pool of threads.
+
+    Conversations waiting for the user hold no thread: their state sits in
+    the checkpointer until the next `send_turn`. Turns of the same thread_id
+    run one at a time; turns of different threads run concurrently on up to
+    `max_workers` threads.
+    """
+
+    def __init__(self, send_turn: Callable[[str, str], Iterator[Dict[str, Any]]],
+                 max_workers: int = 4, max_buffered_events: int = 64):
+        self._send_turn = send_turn
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn-worker")
+        self._max_buffered_events = max_buffered_events
+        self._thread_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _lock_for(self, thread_id: str) -> threading.Lock:
+        with self._lock:
+            return self._thread_locks.setdefault(thread_id, threading.Lock())
+
+    @staticmethod
+    def _put(events: queue.Queue, item: Any, abandoned: threading.Event) -> bool:
+        while not abandoned.is_set():
+            try:
+                events.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, thread_id: str, text: str, events: queue.Queue, abandoned: threading.Event) -> None:
+        try:
+            with self._lock_for(thread_id):
+                for event in self._send_turn(thread_id, text):
+                    # 调用方不再读取时停止推送，避免工作线程卡在满队列上
+                    if not self._put(events, event, abandoned):
+                        return
+        except BaseException as e:
+            self._put(events, e, abandoned)
+        finally:
+            self._put(events, _DONE, abandoned)
+
+    def send_turn(self, thread_id: str, text: str) -> Iterator[Dict[str, Any]]:
+        events: queue.Queue = queue.Queue(maxsize=self._max_buffered_events)
+        abandoned = threading.Event()
+        self._pool.submit(self._run, thread_id, text, events, abandoned)
+        try:
+            while True:
+                event = events.get()
+                if event is _DONE:
+                    return
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            abandoned.set()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
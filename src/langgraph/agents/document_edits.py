@@ -0,0 +1,163 @@
+import re
+from typing import List, Optional, Sequence, Tuple
+
+from token_count import estimate_tokens
+
+_HEADING = re.compile(r"^(#{1,6})\s+\S")
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class EditError(ValueError):
+    """An edit could not be applied to the current document."""
+
+
+def _lines(text: str) -> List[str]:
+    return text.split("\n") if text else []
+
+
+def _join(lines: Sequence[str]) -> str:
+    return "\n".join(lines)
+
+
+def replace_range(text: str, start_line: int, end_line: int, new_text: str) -> Tuple[str, int]:
+    """Replace lines start_line..end_line (1-based, inclusive). Returns (document, first changed line)."""
+    lines = _lines(text)
+    if start_line < 1 or end_line < start_line - 1 or end_line > len(lines):
+        raise EditError(f"Line range {start_line}-{end_line} is outside the document (1-{len(lines)}).")
+    lines[start_line - 1:end_line] = _lines(new_text)
+    return _join(lines), start_line
+
+
+def find_anchor(text: str, anchor: str) -> int:
+    """0-based index of the single line containing anchor."""
+    matches = [i for i, line in enumerate(_lines(text)) if anchor in line]
+    if not matches:
+        raise EditError(f"Anchor not found: {anchor!r}")
+    if len(matches) > 1:
+        raise EditError(f"Anchor {anchor!r} matches lines {[m + 1 for m in matches]}; use a more specific anchor.")
+    return matches[0]
+
+
+def insert_after(text: str, anchor: str, new_text: str) -> Tuple[str, int]:
+    lines = _lines(text)
+    index = find_anchor(text, anchor)
+    lines[index + 1:index + 1] = _lines(new_text)
+    return _join(lines), index + 2
+
+
+def _heading_level(line: str) -> Optional[int]:
+    match = _HEADING.match(line)
+    return len(match.group(1)) if match else None
+
+
+def delete_section(text: str, heading: str) -> Tuple[str, int]:
+    """Delete a markdown heading line and everything up to the next heading of the same or higher level."""
+    lines = _lines(text)
+    start = find_anchor(text, heading)
+    level = _heading_level(lines[start])
+    end = start + 1
+    if level is None:
+        # 不是 markdown 标题时，删除到下一个空行为止（一个段落）
+        while end < len(lines) and lines[end].strip():
+            end += 1
+    else:
+        while end < len(lines):
+            next_level = _heading_level(lines[end])
+            if next_level is not None and next_level <= level:
+                break
+            end += 1
+    del lines[start:end]
+    return _join(lines), start + 1
+
+
+def apply_unified_diff(text: str, diff: str, fuzz: int = 3) -> Tuple[str, int]:
+    """Apply a unified diff to text. Hunks may be off by up to `fuzz` lines."""
+    lines = _lines(text)
+    hunks: List[Tuple[int, int, List[str]]] = []
+    current: Optional[List[str]] = None
+    for raw in diff.split("\n"):
+        match = _HUNK.match(raw)
+        if match:
+            current = []
+            old_length = int(match.group(2)) if match.group(2) is not None else 1
+            hunks.append((int(match.group(1)), old_length, current))
+        elif raw.startswith(("---", "+++")) and current is None:
+            continue
+        elif current is not None and raw[:1] in (" ", "-", "+"):
+            current.append(raw)
+        elif current is not None and raw == "":
+            current.append(" ")
+    if not hunks:
+        raise EditError("No hunks found in diff.")
+
+    offset = 0
+    first_changed = None
+    for old_start, old_length, body in hunks:
+        while body and body[-1] == " ":
+            body.pop()
+        old = [line[1:] for line in body if line[0] in (" ", "-")]
+        new = [line[1:] for line in body if line[0] in (" ", "+")]
+        # 纯插入的 hunk（-N,0）里 N 是插入位置的前一行，其余情况 N 是第一行
+        expected = (old_start if old_length == 0 else max(old_start - 1, 0)) + offset
+        position = None
+        for delta in sorted(range(-fuzz, fuzz + 1), key=abs):
+            at = expected + delta
+            if 0 <= at <= len(lines) - len(old) and lines[at:at + len(old)] == old:
+                position = at
+                break
+        if position is None:
+            raise EditError(f"Hunk at line {old_start} does not match the document.")
+        lines[position:position + len(old)] = new
+        offset += len(new) - len(old)
+        if first_changed is None:
+            first_changed = position + 1
+    return _join(lines), first_changed or 1
+
+
+def outline(text: str, max_entries: int = 40) -> List[str]:
+    """Headings (or paragraph openings when there are none) with their line numbers."""
+    lines = _lines(text)
+    entries = [f"{i + 1}: {line.strip()}" for i, line in enumerate(lines) if _heading_level(line)]
+    if not entries:
+        entries = [
+            f"{i + 1}: {line.strip()[:60]}"
+            for i, line in enumerate(lines)
+            if line.strip() and (i == 0 or not lines[i - 1].strip())
+        ]
+    return entries[:max_entries]
+
+
+def numbered(lines: Sequence[str], first_line: int = 1) -> str:
+    return "\n".join(f"{first_line + i}| {line}" for i, line in enumerate(lines))
+
+
+def best_focus_line(text: str, query: str) -> Optional[int]:
+    """1-based line that shares the most words with query, if any."""
+    terms = {t for t in re.findall(r"\w+", query.lower()) if len(t) > 1}
+    if not terms:
+        return None
+    best, best_score = None, 0
+    for i, line in enumerate(_lines(text)):
+        score = len(terms & set(re.findall(r"\w+", line.lower())))
+        if score > best_score:
+            best, best_score = i + 1, score
+    return best
+
+
+def document_view(text: str, query: str = "", focus_line: Optional[int] = None,
+                  full_view_tokens: int = 800, radius: int = 15) -> str:
+    """What the model sees of the document: all of it when small, else outline + a window."""
+    if not text:
+        return "(empty)"
+    lines = _lines(text)
+    if estimate_tokens(text) <= full_view_tokens:
+        return numbered(lines)
+
+    focus = best_focus_line(text, query) or focus_line or 1
+    start = max(1, focus - radius)
+    end = min(len(lines), focus + radius)
+    return (
+        f"Document has {len(lines)} lines (~{estimate_tokens(text)} tokens); showing an outline and lines {start}-{end}.\n"
+        "Outline:\n" + "\n".join(outline(text)) + "\n\n"
+        f"Lines {start}-{end}:\n" + numbered(lines[start - 1:end], start)
+    )
@@ -0,0 +1,331 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from version_history import HistoryEntry, VersionHistory
+
+
+@dataclass(frozen=True)
+class DocumentVersion:
+    """Immutable snapshot of a document. Edits create a new one (copy-on-write)."""
+    session_id: str
+    version: int = 0
+    content: str = ""
+    updated_at: float = field(default_factory=time.time)
+
+
+class VersionConflict(RuntimeError):
+    """The document changed since the version the edit was based on."""
+
+
+def _write_atomic(path: str, data: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^\w.-]", "_", name) or "_"
+
+
+def _history_line(entry: HistoryEntry) -> str:
+    return json.dumps(entry.to_dict(), ensure_ascii=False) + "\n"
+
+
+@dataclass
+class _PendingWrite:
+    """What a session still has to write: the latest snapshot plus history entries not yet on disk."""
+    doc: DocumentVersion
+    entries: List[HistoryEntry] = field(default_factory=list)
+    # gc 删掉旧版本后需要整体重写历史文件，此时是完整的历史
+    rewrite: Optional[List[HistoryEntry]] = None
+
+
+class DocumentStore:
+    """Per-session documents with bounded memory and asynchronous, atomic persistence.
+
+    Every commit swaps in a new immutable DocumentVersion, so readers never see
+    a half-applied edit, and schedules a write-behind: the snapshot is written
+    atomically to `root/<session>.json` and new history entries are appended
+    to `root/<session>.history.jsonl`. Commits made while a write is queued
+    are folded into it. Documents not touched for `idle_seconds`, or beyond
+    `max_resident` (least recently used first), are dropped from memory and
+    reloaded from disk on the next access.
+
+    Each session also keeps a delta-encoded VersionHistory for undo and
+    browsing, trimmed to `max_history` versions and `history_max_age` seconds.
+    Trimming rewrites the history file, so it runs only once the history is a
+    quarter over its limit (or every that many commits for the age limit).
+
+    The store lock only guards the in-memory maps; loading, edits and disk
+    writes of one session are serialized by that session's own locks.
+    """
+
+    def __init__(self, root: str = "drafter_documents", max_resident: int = 256,
+                 idle_seconds: float = 300.0, max_workers: int = 4,
+                 max_history: int = 200, history_max_age: Optional[float] = None):
+        self.root = root
+        self.max_resident = max_resident
+        self.idle_seconds = idle_seconds
+        self.max_history = max_history
+        self.history_max_age = history_max_age
+        self._gc_slack = max(max_history // 4, 1)
+        self._resident: "OrderedDict[str, DocumentVersion]" = OrderedDict()
+        self._histories: Dict[str, VersionHistory] = {}
+        self._commits_since_gc: Dict[str, int] = {}
+        self._last_access: Dict[str, float] = {}
+        self._session_locks: Dict[str, threading.RLock] = {}
+        self._write_locks: Dict[str, threading.Lock] = {}
+        self._dirty: Dict[str, _PendingWrite] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.RLock()
+        self._writer = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="doc-store")
+        self._stop = threading.Event()
+        self._janitor = threading.Thread(target=self._evict_loop, name="doc-store-janitor", daemon=True)
+        os.makedirs(root, exist_ok=True)
+        self._janitor.start()
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.root, f"{_safe_name(session_id)}.json")
+
+    def _history_path(self, session_id: str) -> str:
+        return os.path.join(self.root, f"{_safe_name(session_id)}.history.jsonl")
+
+    def _session_lock(self, session_id: str) -> threading.RLock:
+        with self._lock:
+            return self._session_locks.setdefault(session_id, threading.RLock())
+
+    def _read(self, session_id: str) -> "tuple[DocumentVersion, VersionHistory, bool]":
+        """Load a session from disk. The flag is set when the history file has to be (re)written."""
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        try:
+            with open(self._history_path(session_id), "r", encoding="utf-8") as f:
+                entries = []
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break  # 追加到一半时进程退出，丢掉不完整的最后一行
+            legacy = False
+        except FileNotFoundError:
+            # 旧格式把完整历史写在快照文件里
+            entries = data.get("history", []) if data else []
+            legacy = bool(entries)
+
+        history = VersionHistory.from_list(entries)
+        if data is None:
+            doc = DocumentVersion(session_id=session_id)
+        else:
+            doc = DocumentVersion(session_id, data["version"], data["content"], data["updated_at"])
+        latest = history.entries[-1] if history.entries else None
+        if latest is not None and latest.version > doc.version:
+            # 历史先于快照落盘，快照没来得及写时以历史为准
+            doc = DocumentVersion(session_id, latest.version, history.reconstruct(latest.version), latest.timestamp)
+        return doc, history, legacy
+
+    def get(self, session_id: str) -> DocumentVersion:
+        with self._lock:
+            doc = self._resident.get(session_id)
+            if doc is not None:
+                self._touch(session_id)
+                return doc
+
+        with self._session_lock(session_id):
+            with self._lock:
+                doc = self._resident.get(session_id)
+                pending = self._pending.get(session_id)
+            if doc is None:
+                if pending is not None:
+                    pending.result()  # 被换出的文档可能还在落盘，先等写完（不持有全局锁）
+                doc, history, legacy = self._read(session_id)
+                with self._lock:
+                    self._resident[session_id] = doc
+                    self._histories[session_id] = history
+                    if legacy:
+                        self._schedule(session_id, doc, rewrite=list(history.entries))
+                    self._evict_over_capacity()
+            with self._lock:
+                self._touch(session_id)
+            return doc
+
+    def _touch(self, session_id: str) -> None:
+        self._resident.move_to_end(session_id)
+        self._last_access[session_id] = time.monotonic()
+
+    def commit(self, session_id: str, content: str, base_version: Optional[int] = None,
+               undo_to: Optional[int] = None) -> DocumentVersion:
+        """Publish new content for a session. With base_version, fails if someone else edited first."""
+        with self._session_lock(session_id):
+            current = self.get(session_id)
+            if base_version is not None and base_version != current.version:
+                raise VersionConflict(
+                    f"Document {session_id} is at version {current.version}, edit was based on {base_version}."
+                )
+            doc = DocumentVersion(session_id, current.version + 1, content)
+            with self._lock:
+                history = self._histories[session_id]
+            entry = history.append(doc.version, content, doc.updated_at, undo_to=undo_to)
+            rewrite = None
+            if self._history_needs_gc(session_id, history):
+                if history.gc(keep_last=self.max_history, max_age_seconds=self.history_max_age):
+                    # 历史条目是不可变的，拷贝列表即可在后台线程里安全地序列化
+                    rewrite = list(history.entries)
+            with self._lock:
+                self._resident[session_id] = doc
+                self._histories[session_id] = history
+                self._schedule(session_id, doc, entry=entry, rewrite=rewrite)
+            return doc
+
+    def _history_needs_gc(self, session_id: str, history: VersionHistory) -> bool:
+        if len(history.entries) > self.max_history + self._gc_slack:
+            self._commits_since_gc[session_id] = 0
+            return True
+        if self.history_max_age is None:
+            return False
+        count = self._commits_since_gc.get(session_id, 0) + 1
+        self._commits_since_gc[session_id] = 0 if count >= self._gc_slack else count
+        return count >= self._gc_slack
+
+    def _schedule(self, session_id: str, doc: DocumentVersion, entry: Optional[HistoryEntry] = None,
+                  rewrite: Optional[List[HistoryEntry]] = None) -> None:
+        """Record what has to be written; queue a write only if none is waiting for this session yet."""
+        dirty = self._dirty.get(session_id)
+        if dirty is None:
+            dirty = self._dirty[session_id] = _PendingWrite(doc)
+            write_lock = self._write_locks.setdefault(session_id, threading.Lock())
+            self._pending[session_id] = self._writer.submit(self._persist, session_id, write_lock)
+        dirty.doc = doc
+        if rewrite is not None:
+            dirty.rewrite, dirty.entries = rewrite, []
+        elif entry is not None:
+            dirty.entries.append(entry)
+
+    def edit(self, session_id: str, apply: Callable[[str], Tuple[str, int]]) -> Tuple[DocumentVersion, int]:
+        """Apply an edit function to the latest content and commit the result.
+
+        apply(content) returns (new content, first changed line). Edits of a
+        session run one after another, so several edits issued in the same step
+        each build on the previous one instead of on the same stale version.
+        """
+        with self._session_lock(session_id):
+            current = self.get(session_id)
+            content, line = apply(current.content)
+            return self.commit(session_id, content, base_version=current.version), line
+
+    def history(self, session_id: str) -> VersionHistory:
+        with self._session_lock(session_id):
+            self.get(session_id)
+            with self._lock:
+                return self._histories[session_id]
+
+    def restore(self, session_id: str, version: int) -> DocumentVersion:
+        """Commit the content of an earlier version as the newest version."""
+        with self._session_lock(session_id):
+            content = self.history(session_id).reconstruct(version)
+            return self.commit(session_id, content)
+
+    def undo(self, session_id: str) -> Optional[Tuple[DocumentVersion, int]]:
+        """Bring back the version before the current one as (new version, restored version).
+
+        Returns None when there is nothing left to undo.
+        """
+        with self._session_lock(session_id):
+            history = self.history(session_id)
+            target = history.undo_target()
+            if target is None:
+                return None
+            return self.commit(session_id, history.reconstruct(target), undo_to=target), target
+
+    def _persist(self, session_id: str, write_lock: threading.Lock) -> None:
+        # 每个会话单独加锁写盘，不同会话的保存互不阻塞，也不占用全局锁
+        with write_lock:
+            with self._lock:
+                dirty = self._dirty.pop(session_id, None)
+            if dirty is None:
+                return
+            doc = dirty.doc
+            # 先写历史再写快照：读取时历史比快照新就以历史为准
+            if dirty.rewrite is not None:
+                _write_atomic(self._history_path(session_id), "".join(_history_line(e) for e in dirty.rewrite))
+            elif dirty.entries:
+                with open(self._history_path(session_id), "a", encoding="utf-8") as f:
+                    f.write("".join(_history_line(e) for e in dirty.entries))
+                    f.flush()
+                    os.fsync(f.fileno())
+            payload = json.dumps(
+                {"session_id": doc.session_id, "version": doc.version, "content": doc.content,
+                 "updated_at": doc.updated_at},
+                ensure_ascii=False,
+            )
+            _write_atomic(self._path(session_id), payload)
+
+    def export(self, session_id: str, filename: str, export_dir: str = "exports") -> "tuple[str, Future]":
+        """Write the current content to a per-session export file in the background."""
+        doc = self.get(session_id)
+        path = os.path.join(export_dir, _safe_name(session_id), os.path.basename(filename))
+        return path, self._writer.submit(_write_atomic, path, doc.content)
+
+    def evict(self, session_id: str) -> bool:
+        """Drop a document from memory. Every commit is already being written, so nothing is lost.
+
+        A session that is being loaded or edited right now is left alone.
+        """
+        with self._lock:
+            session_lock = self._session_lock(session_id)
+            if not session_lock.acquire(blocking=False):
+                return False
+            try:
+                self._resident.pop(session_id, None)
+                self._histories.pop(session_id, None)
+                self._last_access.pop(session_id, None)
+                self._commits_since_gc.pop(session_id, None)
+            finally:
+                session_lock.release()
+            return True
+
+    def _evict_over_capacity(self) -> None:
+        # 最久未用的在前；正在使用的会话跳过，下次再换出
+        for session_id in list(self._resident)[:max(len(self._resident) - self.max_resident, 0)]:
+            self.evict(session_id)
+
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [sid for sid, at in self._last_access.items() if at < cutoff]
+            return sum(self.evict(session_id) for session_id in idle)
+
+    def _evict_loop(self) -> None:
+        while not self._stop.wait(max(self.idle_seconds / 2, 1.0)):
+            self.evict_idle()
+
+    @property
+    def resident_count(self) -> int:
+        return len(self._resident)
+
+    def flush(self) -> None:
+        """Wait for all scheduled writes."""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            future.result()
+
+    def close(self) -> None:
+        self._stop.set()
+        self.flush()
+        self._writer.shutdown(wait=True)
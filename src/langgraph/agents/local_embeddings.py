@@ -0,0 +1,73 @@
+import re
+import zlib
+from functools import lru_cache
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1 << 18)
+def _feature_hash(feature: str) -> int:
+    # crc32 is stable across processes (unlike hash()), so persisted vectors stay valid
+    return zlib.crc32(feature.encode("utf-8"))
+
+
+class HashingEmbeddings(Embeddings):
+    """Local CPU embeddings built by feature hashing, with no network or model files.
+
+    Each text is turned into word unigrams plus character n-grams (which also
+    cover Chinese, where words are not space separated). Features are hashed
+    into `dimensions` signed buckets, counts are damped with log1p and rows are
+    L2-normalised, so cosine similarity behaves like a TF overlap score.
+    """
+
+    def __init__(self, dimensions: int = 1024, ngram_range: tuple = (2, 3), batch_size: int = 256):
+        if dimensions & (dimensions - 1):
+            raise ValueError("dimensions must be a power of two.")
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+        self.model = f"hashing-{dimensions}-ngram{ngram_range[0]}-{ngram_range[1]}"
+
+    def _features(self, text: str) -> List[str]:
+        text = text.lower()
+        features = [f"w:{word}" for word in _WORD_PATTERN.findall(text)]
+        compact = "".join(text.split())
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            features.extend(f"c{n}:{compact[i:i + n]}" for i in range(len(compact) - n + 1))
+        return features
+
+    def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        hashes: List[int] = []
+        for row, text in enumerate(texts):
+            row_hashes = [_feature_hash(feature) for feature in self._features(text)]
+            hashes.extend(row_hashes)
+            rows.extend([row] * len(row_hashes))
+
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        if hashes:
+            hashed = np.asarray(hashes, dtype=np.uint32)
+            columns = (hashed & (self.dimensions - 1)).astype(np.intp)
+            signs = np.where(hashed >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix, (np.asarray(rows, dtype=np.intp), columns), signs)
+
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        batches = [
+            self._embed_batch(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if not batches:
+            return []
+        return np.vstack(batches).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage, HumanMessage, RemoveMessage, SystemMessage
+
+from token_count import estimate_tokens
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the existing summary with the new messages below. Keep names, facts, preferences and open questions; drop small talk.
+Reply with the updated summary only.
+
+Existing summary:
+{summary}
+
+New messages:
+{transcript}"""
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return estimate_tokens(str(message.content)) + 4
+
+
+class MemoryManager:
+    """Sliding-window + rolling-summary memory, usable as a LangGraph node.
+
+    The newest messages are kept verbatim up to `window_tokens`. Only when the
+    whole history grows past `summarize_threshold` are the older messages
+    folded into the summary (one LLM call) and removed from state, so the
+    summary is refreshed incrementally instead of on every turn.
+    """
+
+    def __init__(self, llm: BaseChatModel, window_tokens: int = 1500, summarize_threshold: int = 2500):
+        if summarize_threshold < window_tokens:
+            raise ValueError("summarize_threshold must be >= window_tokens")
+        self.llm = llm
+        self.window_tokens = window_tokens
+        self.summarize_threshold = summarize_threshold
+
+    def split_window(self, messages: Sequence[BaseMessage]) -> int:
+        """Index of the first message kept verbatim; everything before it gets summarized."""
+        used = 0
+        start = len(messages)
+        for i in range(len(messages) - 1, -1, -1):
+            used += message_tokens(messages[i])
+            if used > self.window_tokens and start < len(messages):
+                break
+            start = i
+        # 窗口从用户消息开始，避免把一问一答拆开
+        while start < len(messages) - 1 and not isinstance(messages[start], HumanMessage):
+            start += 1
+        return start
+
+    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        messages = state["messages"]
+        history_tokens = sum(message_tokens(m) for m in messages)
+        if history_tokens <= self.summarize_threshold:
+            return {}
+
+        start = self.split_window(messages)
+        folded = messages[:start]
+        if not folded:
+            return {}
+
+        transcript = "\n".join(f"{m.type}: {m.content}" for m in folded)
+        prompt = SUMMARY_PROMPT.format(summary=state.get("summary") or "(none)", transcript=transcript)
+        summary = str(self.llm.invoke([HumanMessage(content=prompt)]).content)
+        return {
+            "summary": summary,
+            "messages": [RemoveMessage(id=m.id) for m in folded],
+        }
+
+    def build_prompt(self, state: Dict[str, Any]) -> List[BaseMessage]:
+        summary = state.get("summary")
+        prompt: List[BaseMessage] = []
+        if summary:
+            prompt.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        return prompt + list(state["messages"])
+
+    @staticmethod
+    def prompt_metrics(prompt: Sequence[BaseMessage], summary: str = "") -> Dict[str, int]:
+        return {
+            "prompt_tokens": sum(message_tokens(m) for m in prompt),
+            "summary_tokens": estimate_tokens(summary or ""),
+            "window_messages": sum(1 for m in prompt if not isinstance(m, SystemMessage)),
+        }
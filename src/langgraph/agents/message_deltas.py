@@ -0,0 +1,174 @@
+"""Detect graph nodes that return the full message history into an add_messages channel.
+
+`add_messages` merges whatever a node returns into the existing list and
+dedupes by message id, so a node returning `state['messages'] + [response]`
+makes every turn re-merge the whole conversation (O(n²) over a thread).
+Nodes should return only the messages they created.
+
+Even with delta returns `add_messages` re-converts the whole existing list
+on every write. `append_messages` is a drop-in reducer for channels whose
+nodes return deltas: new messages are appended, and it falls back to
+`add_messages` only for RemoveMessage or ids that are already present.
+
+Static check (AST):
+    python message_deltas.py Drafter.py RAG_Agent.py ...
+
+Runtime check, for a node and a sample state:
+    assert_returns_delta(call_llm, {"messages": history})
+"""
+import ast
+import sys
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+from langchain_core.messages import BaseMessage, RemoveMessage, convert_to_messages, message_chunk_to_message
+from langgraph.graph.message import add_messages
+
+Messages = Union[Sequence[Any], Any]
+
+
+def append_messages(left: Messages, right: Messages) -> List[BaseMessage]:
+    """add_messages for delta updates, without re-processing the existing history."""
+    if not isinstance(left, list):
+        left = [left] if isinstance(left, BaseMessage) else list(left)
+    if not isinstance(right, list):
+        right = [right] if isinstance(right, BaseMessage) else list(right)
+    new = [message_chunk_to_message(message) for message in convert_to_messages(right)]
+    explicit = [message.id for message in new if message.id is not None]
+    if (any(isinstance(message, RemoveMessage) for message in new) or len(set(explicit)) < len(explicit)
+            or (explicit and not set(explicit).isdisjoint(message.id for message in left))):
+        # 删除或按 id 替换已有消息，交给 add_messages 处理
+        return add_messages(left, new)
+    for message in new:
+        if message.id is None:
+            message.id = str(uuid.uuid4())
+    return left + new
+
+
+@dataclass
+class Finding:
+    path: str
+    line: int
+    function: str
+    reason: str
+
+    def __str__(self) -> str:
+        return f"{self.path}:{self.line}: {self.function}() {self.reason}"
+
+
+def _is_history(node: ast.AST, state: str, aliases: Set[str]) -> bool:
+    """state['messages'], state["messages"], state.get('messages', ...) or a local alias of one of them."""
+    if isinstance(node, ast.Name):
+        return node.id in aliases
+    if isinstance(node, ast.Subscript):
+        return (isinstance(node.value, ast.Name) and node.value.id == state
+                and isinstance(node.slice, ast.Constant) and node.slice.value == "messages")
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == "get":
+        return (isinstance(node.func.value, ast.Name) and node.func.value.id == state
+                and bool(node.args) and isinstance(node.args[0], ast.Constant) and node.args[0].value == "messages")
+    return False
+
+
+def _history_expr(expr: ast.AST, state: str, aliases: Set[str]) -> bool:
+    """Whether the expression evaluates to the whole history, possibly extended.
+
+    Covers the history itself, list()/tuple() copies, concatenations and
+    [*history, ...]. Passing the history to another call (llm.invoke(history))
+    or indexing one message (history[-1]) does not count.
+    """
+    if _is_history(expr, state, aliases):
+        return True
+    if isinstance(expr, ast.Call) and isinstance(expr.func, ast.Name) and expr.func.id in ("list", "tuple"):
+        return len(expr.args) == 1 and _history_expr(expr.args[0], state, aliases)
+    if isinstance(expr, ast.BinOp) and isinstance(expr.op, ast.Add):
+        return _history_expr(expr.left, state, aliases) or _history_expr(expr.right, state, aliases)
+    if isinstance(expr, (ast.List, ast.Tuple)):
+        return any(isinstance(item, ast.Starred) and _history_expr(item.value, state, aliases) for item in expr.elts)
+    return False
+
+
+def _returned_messages(value: ast.AST) -> Optional[ast.AST]:
+    """The expression a return statement puts into the "messages" key, if any."""
+    if isinstance(value, ast.Call):
+        for keyword in value.keywords:
+            if keyword.arg == "messages":
+                return keyword.value
+    if isinstance(value, ast.Dict):
+        for key, item in zip(value.keys, value.values):
+            if isinstance(key, ast.Constant) and key.value == "messages":
+                return item
+    return None
+
+
+def _check_function(path: str, func: ast.AST) -> List[Finding]:
+    args = func.args.posonlyargs + func.args.args
+    if not args or args[0].arg in ("self", "cls"):
+        return []
+    state = args[0].arg
+    # 只有读过 state 里消息的函数才算作操作 add_messages 通道的节点
+    if not any(_is_history(node, state, set()) for node in ast.walk(func)):
+        return []
+    aliases: Set[str] = set()
+    findings = []
+    for node in ast.walk(func):
+        if isinstance(node, ast.Assign) and _history_expr(node.value, state, aliases):
+            aliases.update(target.id for target in node.targets if isinstance(target, ast.Name))
+        if not isinstance(node, ast.Return) or node.value is None:
+            continue
+        if isinstance(node.value, ast.Name) and node.value.id == state:
+            findings.append(Finding(path, node.lineno, func.name, "returns the whole input state"))
+            continue
+        messages = _returned_messages(node.value)
+        if messages is not None and _history_expr(messages, state, aliases):
+            findings.append(Finding(path, node.lineno, func.name, "returns the full message history"))
+    return findings
+
+
+def lint_source(source: str, path: str = "<string>") -> List[Finding]:
+    tree = ast.parse(source, filename=path)
+    findings = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            findings.extend(_check_function(path, node))
+    return sorted(findings, key=lambda finding: finding.line)
+
+
+def lint_paths(paths: Iterable[str]) -> List[Finding]:
+    findings = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            findings.extend(lint_source(f.read(), path))
+    return findings
+
+
+def history_overlap(state: Dict[str, Any], update: Optional[Dict[str, Any]]) -> int:
+    """How many of the messages in a node's update are already in the input state (by id, else by identity)."""
+    existing = state.get("messages") or []
+    returned = (update or {}).get("messages") or []
+    ids = {message.id for message in existing if getattr(message, "id", None)}
+    objects = {id(message) for message in existing}
+    return sum(1 for message in returned
+               if (getattr(message, "id", None) and message.id in ids) or id(message) in objects)
+
+
+def assert_returns_delta(node: Callable[[Dict[str, Any]], Any], state: Dict[str, Any]) -> Any:
+    """Run a node on a sample state and fail if its update repeats messages from the history."""
+    update = node(state)
+    repeated = history_overlap(state, update)
+    if repeated:
+        name = getattr(node, "__name__", repr(node))
+        raise AssertionError(f"{name} returned {repeated} message(s) already in state['messages']; "
+                             "return only the new messages")
+    return update
+
+
+def main(argv: List[str]) -> int:
+    findings = lint_paths(argv)
+    for finding in findings:
+        print(finding)
+    return 1 if findings else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
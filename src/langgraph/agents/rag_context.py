@@ -0,0 +1,171 @@
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from langchain_core.documents import Document
+
+from token_count import estimate_tokens
+
+
+_POSSESSIVE = re.compile(r"['’]s\b")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a retrieval query, so trivially different phrasings compare equal."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = _POSSESSIVE.sub("", text)
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+
+@dataclass
+class ContextChunk:
+    """A retrieved passage, possibly merged from several adjacent chunks."""
+    text: str
+    source: str = ""
+    page: Optional[int] = None
+    start: Optional[int] = None
+    relevance: float = 0.0
+    tokens: int = 0
+    shingles: Set[str] = field(default_factory=set)
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+def shingle(text: str, size: int = 5) -> Set[str]:
+    """Character shingles, which work for both Chinese and English text."""
+    compact = "".join(text.split())
+    if len(compact) <= size:
+        return {compact} if compact else set()
+    return {compact[i:i + size] for i in range(len(compact) - size + 1)}
+
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def containment(part: Set[str], whole: Set[str]) -> float:
+    """Fraction of `part` that already appears in `whole`."""
+    if not part:
+        return 1.0
+    return len(part & whole) / len(part)
+
+
+def _suffix_prefix_overlap(left: str, right: str, min_overlap: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    longest = min(len(left), len(right))
+    for size in range(longest, min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+class ContextPacker:
+    """Assemble retrieved chunks into a compact, token-budgeted context block.
+
+    The pipeline is: merge overlapping neighbours -> drop passages already
+    shown in this conversation -> MMR selection under a token budget.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 600,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.8,
+        min_overlap: int = 20,
+    ):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.min_overlap = min_overlap
+
+    def to_chunks(self, docs: Sequence[Document]) -> List[ContextChunk]:
+        """Convert retriever output (best first) into chunks with rank-based relevance."""
+        chunks = []
+        for rank, doc in enumerate(docs):
+            metadata = doc.metadata or {}
+            chunks.append(ContextChunk(
+                text=doc.page_content,
+                source=str(metadata.get("source", "")),
+                page=metadata.get("page"),
+                start=metadata.get("start_index"),
+                relevance=1.0 / (rank + 1),
+            ))
+        return chunks
+
+    def merge_adjacent(self, chunks: List[ContextChunk]) -> List[ContextChunk]:
+        """Merge chunks from the same page whose text overlaps or touches."""
+        groups: Dict[tuple, List[ContextChunk]] = {}
+        for chunk in chunks:
+            groups.setdefault((chunk.source, chunk.page), []).append(chunk)
+
+        merged: List[ContextChunk] = []
+        for group in groups.values():
+            group.sort(key=lambda c: (c.start is None, c.start or 0))
+            current = group[0]
+            for chunk in group[1:]:
+                combined = self._try_merge(current, chunk)
+                if combined is None:
+                    merged.append(current)
+                    current = chunk
+                else:
+                    current = combined
+            merged.append(current)
+        return merged
+
+    def _try_merge(self, left: ContextChunk, right: ContextChunk) -> Optional[ContextChunk]:
+        if left.start is not None and right.start is not None and left.end is not None:
+            if right.start > left.end:
+                return None
+            text = left.text + right.text[left.end - right.start:]
+        else:
+            overlap = _suffix_prefix_overlap(left.text, right.text, self.min_overlap)
+            if not overlap:
+                return None
+            text = left.text + right.text[overlap:]
+        return ContextChunk(
+            text=text,
+            source=left.source,
+            page=left.page,
+            start=left.start,
+            relevance=max(left.relevance, right.relevance),
+        )
+
+    def pack(self, docs: Sequence[Document], seen_texts: Iterable[str] = ()) -> List[ContextChunk]:
+        """Return the chunks to show, in MMR order, within the token budget."""
+        chunks = self.merge_adjacent(self.to_chunks(docs))
+        for chunk in chunks:
+            chunk.shingles = shingle(chunk.text)
+            chunk.tokens = estimate_tokens(chunk.text)
+
+        seen: Set[str] = set()
+        for text in seen_texts:
+            seen |= shingle(text)
+        if seen:
+            chunks = [c for c in chunks if containment(c.shingles, seen) < self.duplicate_threshold]
+
+        selected: List[ContextChunk] = []
+        used = 0
+        candidates = list(chunks)
+        while candidates:
+            best = max(candidates, key=lambda c: self._mmr_score(c, selected))
+            candidates.remove(best)
+            if used + best.tokens > self.token_budget:
+                continue
+            selected.append(best)
+            used += best.tokens
+        return selected
+
+    def _mmr_score(self, chunk: ContextChunk, selected: List[ContextChunk]) -> float:
+        redundancy = max((jaccard(chunk.shingles, s.shingles) for s in selected), default=0.0)
+        return self.mmr_lambda * chunk.relevance - (1 - self.mmr_lambda) * redundancy
+
+
+def format_context(chunks: Sequence[ContextChunk]) -> str:
+    return "\n\n".join(f"Document {i + 1}:\n{chunk.text}" for i, chunk in enumerate(chunks))
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from rag_context import normalize_query
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+    miss_seconds: float = 0.0
+    saved_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "avg_miss_ms": round(self.miss_seconds / self.misses * 1000, 2) if self.misses else 0.0,
+            "saved_ms": round(self.saved_seconds * 1000, 2),
+        }
+
+
+class RetrievalCache:
+    """LRU cache of retrieval results keyed by (normalized query, k, index version).
+
+    Entries from an older index version are dropped as soon as a lookup
+    arrives for a newer one, so a rebuilt index never serves stale results.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[Tuple[str, int, Optional[str]], Tuple[Any, float]]" = OrderedDict()
+        self._version: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _check_version(self, version: Optional[str]) -> None:
+        if version != self._version:
+            if self._entries:
+                self.stats.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get_or_compute(self, query: str, k: int, version: Optional[str], compute: Callable[[], Any]) -> Any:
+        key = (normalize_query(query), k, version)
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                self.stats.saved_seconds += entry[1]
+                return entry[0]
+
+        started = time.perf_counter()
+        value = compute()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.stats.misses += 1
+            self.stats.miss_seconds += elapsed
+            if version == self._version:
+                self._entries[key] = (value, elapsed)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.stats.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
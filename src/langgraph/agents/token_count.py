@@ -0,0 +1,25 @@
+import re
+from typing import Iterable
+
+# 各脚本目录单独运行、不能互相导入，src/agents/cancellation.py、src/langchain/chat_session.py
+# 和 src/mini-deepseek/result_shaping.py 各有一份 estimate_tokens 的原样拷贝，修改时一起改
+
+# CJK 字符基本上一个字就是一个 token，英文单词大约 4 个字符一个 token
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text locally, without calling a tokenizer service."""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    tokens = cjk
+    for word in _WORD_PATTERN.findall(text):
+        tokens += max(1, (len(word) + 3) // 4)
+    return tokens
+
+
+def estimate_message_tokens(contents: Iterable[str], per_message_overhead: int = 4) -> int:
+    """Estimate the prompt size of a list of message contents."""
+    return sum(estimate_tokens(content) + per_message_overhead for content in contents)
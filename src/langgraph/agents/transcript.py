@@ -0,0 +1,63 @@
+import gzip
+import logging
+import os
+import queue
+import shutil
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+def _gzip_namer(name: str) -> str:
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class TranscriptWriter:
+    """Append-only conversation transcript written on a background thread.
+
+    Each turn is queued (never blocking the chat loop) and a QueueListener
+    thread appends it to `path`, flushing after every line. When the file
+    grows beyond `max_bytes` it is rotated to `path.1`, `path.2`, ... and,
+    with `compress=True`, rotated segments are gzipped.
+    """
+
+    def __init__(self, path: str = "logging.txt", max_bytes: int = 1 << 20,
+                 backup_count: int = 5, compress: bool = False):
+        self.path = path
+        handler = RotatingFileHandler(path, mode="a", maxBytes=max_bytes,
+                                      backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        if compress:
+            handler.namer = _gzip_namer
+            handler.rotator = _gzip_rotator
+
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._logger = logging.getLogger(f"transcript.{uuid.uuid4().hex}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(QueueHandler(self._queue))
+        self._listener = QueueListener(self._queue, handler)
+        self._handler = handler
+        self._listener.start()
+
+    def write(self, line: str) -> None:
+        self._logger.info(line)
+
+    def write_turn(self, speaker: str, content: str) -> None:
+        self.write(f"{speaker}: {content}")
+
+    def close(self) -> None:
+        """Flush everything queued so far and stop the background thread."""
+        self._listener.stop()
+        self._handler.close()
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,237 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+def _write_json_atomic(path: str, payload: Dict[str, Any]) -> None:
+    """Write JSON next to path and rename it into place, so readers never see a partial file."""
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class VersionedIndex:
+    """Chroma index stored as immutable versions under one root directory.
+
+    Layout::
+
+        root/
+          CURRENT                       -> {"version": "..."}, swapped atomically
+          versions/<version>/           -> Chroma persist directory
+          versions/<version>/manifest.json
+
+    A new version is built in a private `.building-*` directory, renamed into
+    `versions/` once complete, and only then published by replacing CURRENT.
+    Readers therefore only ever open fully written versions.
+
+    Readers hold a version open with acquire()/release(); gc never deletes a
+    version that is still referenced, and retries once the last reader of a
+    retired version lets go.
+    """
+
+    def __init__(self, root: str, collection_name: str, embedding: Embeddings, keep_versions: int = 2):
+        self.root = root
+        self.collection_name = collection_name
+        self.embedding = embedding
+        self.keep_versions = keep_versions
+        self.versions_dir = os.path.join(root, "versions")
+        self.current_path = os.path.join(root, CURRENT_FILE)
+        self._builder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-build")
+        self._readers: Dict[str, int] = {}
+        self._readers_lock = threading.Lock()
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+    def version_path(self, version: str) -> str:
+        return os.path.join(self.versions_dir, version)
+
+    def current_version(self) -> Optional[str]:
+        pointer = _read_json(self.current_path)
+        return pointer.get("version") if pointer else None
+
+    def manifest(self, version: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        version = version or self.current_version()
+        if not version:
+            return None
+        return _read_json(os.path.join(self.version_path(version), MANIFEST_FILE))
+
+    def build(self, documents: Sequence[Document], source_fingerprint: str = "", publish: bool = True) -> Dict[str, Any]:
+        """Embed documents into a new version directory and (optionally) publish it."""
+        version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        staging = os.path.join(self.versions_dir, f".building-{version}")
+        started = time.perf_counter()
+
+        store = Chroma.from_documents(
+            documents=list(documents),
+            embedding=self.embedding,
+            persist_directory=staging,
+            collection_name=self.collection_name,
+        )
+        del store
+
+        manifest = {
+            "version": version,
+            "collection_name": self.collection_name,
+            "source_fingerprint": source_fingerprint,
+            "document_count": len(documents),
+            "embedding": type(self.embedding).__name__,
+            "embedding_model": getattr(self.embedding, "model", None),
+            "created_at": datetime.now().isoformat(),
+            "build_seconds": round(time.perf_counter() - started, 3),
+        }
+        _write_json_atomic(os.path.join(staging, MANIFEST_FILE), manifest)
+        os.replace(staging, self.version_path(version))
+
+        if publish:
+            self.publish(version)
+        return manifest
+
+    def build_async(self, documents: Sequence[Document], source_fingerprint: str = "") -> Future:
+        """Build and publish a new version in the background while the current one keeps serving."""
+        return self._builder.submit(self.build, documents, source_fingerprint)
+
+    def publish(self, version: str) -> None:
+        if not os.path.exists(os.path.join(self.version_path(version), MANIFEST_FILE)):
+            raise ValueError(f"Index version {version} is incomplete or missing.")
+        _write_json_atomic(self.current_path, {"version": version, "published_at": datetime.now().isoformat()})
+        self.gc()
+
+    def list_versions(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if not name.startswith(".") and os.path.exists(os.path.join(self.versions_dir, name, MANIFEST_FILE))
+        )
+
+    def acquire(self, version: str) -> None:
+        """Mark version as in use so gc keeps it."""
+        with self._readers_lock:
+            self._readers[version] = self._readers.get(version, 0) + 1
+
+    def release(self, version: str) -> None:
+        with self._readers_lock:
+            self._readers[version] -= 1
+            if self._readers[version] > 0:
+                return
+            del self._readers[version]
+        if version != self.current_version():
+            # 删除放到构建线程上，不占用查询线程
+            self._builder.submit(self.gc)
+
+    def gc(self) -> List[str]:
+        """Delete all but the newest `keep_versions` versions.
+
+        The current version and versions still acquired by a reader are kept.
+        """
+        current = self.current_version()
+        removed = []
+        for version in self.list_versions()[:-self.keep_versions or None]:
+            with self._readers_lock:
+                if version == current or version in self._readers:
+                    continue
+                # 在锁内只做一次改名，删除目录放到锁外，不阻塞 acquire
+                doomed = os.path.join(self.versions_dir, f".deleting-{version}")
+                os.replace(self.version_path(version), doomed)
+            shutil.rmtree(doomed, ignore_errors=True)
+            removed.append(version)
+        return removed
+
+    def open_store(self, version: str) -> Chroma:
+        return Chroma(
+            persist_directory=self.version_path(version),
+            embedding_function=self.embedding,
+            collection_name=self.collection_name,
+        )
+
+
+class HotReloadingRetriever:
+    """Retriever that follows the CURRENT pointer of a VersionedIndex.
+
+    The pointer file is checked at most every `check_interval` seconds; when a
+    new version has been published, the next query opens it and swaps it in
+    without interrupting queries already running on the old store. The open
+    version, and every version a query is running on, stays acquired on the
+    index so gc cannot delete it underneath.
+    """
+
+    def __init__(self, index: VersionedIndex, search_kwargs: Optional[Dict[str, Any]] = None,
+                 search_type: str = "similarity", check_interval: float = 1.0):
+        self.index = index
+        self.search_kwargs = search_kwargs or {"k": 5}
+        self.search_type = search_type
+        self.check_interval = check_interval
+        self.version: Optional[str] = None
+        self._retriever = None
+        self._pointer_mtime = 0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if self._retriever is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.index.current_path).st_mtime_ns
+            except FileNotFoundError:
+                raise RuntimeError(f"No published index version under {self.index.root}")
+            if self._retriever is not None and mtime == self._pointer_mtime:
+                return
+            version = self.index.current_version()
+            if version and version != self.version:
+                self.index.acquire(version)
+                if self.index.manifest(version) is None:
+                    # 读到指针后这个版本已经被新的发布取代并删除，下次检查再切换
+                    self.index.release(version)
+                    if self._retriever is None:
+                        raise RuntimeError(f"Index version {version} was removed while loading; retry")
+                    return
+                try:
+                    store = self.index.open_store(version)
+                except Exception:
+                    self.index.release(version)
+                    raise
+                previous = self.version
+                self._retriever = store.as_retriever(search_type=self.search_type, search_kwargs=self.search_kwargs)
+                self.version = version
+                if previous:
+                    self.index.release(previous)
+                print(f"\n📚 Loaded index version {version}")
+            self._pointer_mtime = mtime
+
+    def current_version(self) -> Optional[str]:
+        self._refresh()
+        return self.version
+
+    def invoke(self, query: str) -> List[Document]:
+        self._refresh()
+        with self._lock:
+            retriever, version = self._retriever, self.version
+            self.index.acquire(version)
+        try:
+            return retriever.invoke(query)
+        finally:
+            self.index.release(version)
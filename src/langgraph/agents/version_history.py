@@ -0,0 +1,172 @@
+import difflib
+import json
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    """One stored version: either a full snapshot of its lines or a delta against the previous version.
+
+    Delta ops are ("c", i1, i2) to copy previous lines [i1:i2] and
+    ("i", lines) to insert new lines. `undo_to` is set on versions created by
+    an undo and names the version whose content they brought back.
+    """
+    version: int
+    timestamp: float
+    snapshot: Optional[Tuple[str, ...]] = None
+    delta: Optional[Tuple[tuple, ...]] = None
+    undo_to: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"v": self.version, "t": self.timestamp}
+        if self.snapshot is not None:
+            data["s"] = list(self.snapshot)
+        else:
+            data["d"] = [["i", list(op[1])] if op[0] == "i" else list(op) for op in self.delta]
+        if self.undo_to is not None:
+            data["u"] = self.undo_to
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HistoryEntry":
+        if "s" in data:
+            return cls(data["v"], data["t"], snapshot=tuple(data["s"]), undo_to=data.get("u"))
+        ops = tuple(("i", tuple(op[1])) if op[0] == "i" else ("c", op[1], op[2]) for op in data["d"])
+        return cls(data["v"], data["t"], delta=ops, undo_to=data.get("u"))
+
+
+def _encode_delta(old: List[str], new: List[str]) -> Tuple[tuple, ...]:
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append(("c", i1, i2))
+        elif j2 > j1:
+            ops.append(("i", tuple(new[j1:j2])))
+    return tuple(ops)
+
+
+def _apply_delta(old: List[str], delta: Tuple[tuple, ...]) -> List[str]:
+    new: List[str] = []
+    for op in delta:
+        if op[0] == "c":
+            new.extend(old[op[1]:op[2]])
+        else:
+            new.extend(op[1])
+    return new
+
+
+def _entry_size(entry: HistoryEntry) -> int:
+    return len(json.dumps(entry.to_dict(), ensure_ascii=False).encode("utf-8"))
+
+
+class VersionHistory:
+    """Document history stored as periodic full snapshots plus line deltas.
+
+    A snapshot is written every `snapshot_interval` versions (or whenever a
+    delta would be larger than half the document), so reconstructing any
+    version applies at most `snapshot_interval - 1` deltas.
+    """
+
+    def __init__(self, snapshot_interval: int = 20):
+        self.snapshot_interval = snapshot_interval
+        self.entries: List[HistoryEntry] = []
+        self._positions: Dict[int, int] = {}
+        self._latest_lines: Optional[List[str]] = None
+        self._since_snapshot = 0
+
+    def append(self, version: int, content: str, timestamp: Optional[float] = None,
+               undo_to: Optional[int] = None) -> HistoryEntry:
+        lines = content.split("\n")
+        timestamp = time.time() if timestamp is None else timestamp
+        entry = None
+        if self._latest_lines is not None and self._since_snapshot < self.snapshot_interval - 1:
+            delta = _encode_delta(self._latest_lines, lines)
+            candidate = HistoryEntry(version, timestamp, delta=delta, undo_to=undo_to)
+            if _entry_size(candidate) * 2 <= len(content.encode("utf-8")):
+                entry = candidate
+                self._since_snapshot += 1
+        if entry is None:
+            entry = HistoryEntry(version, timestamp, snapshot=tuple(lines), undo_to=undo_to)
+            self._since_snapshot = 0
+
+        self._positions[version] = len(self.entries)
+        self.entries.append(entry)
+        self._latest_lines = lines
+        return entry
+
+    def versions(self) -> List[Tuple[int, float, str]]:
+        return [(e.version, e.timestamp, "snapshot" if e.snapshot is not None else "delta") for e in self.entries]
+
+    def undo_target(self) -> Optional[int]:
+        """Version an undo should bring back, or None when there is nothing left to undo.
+
+        Versions created by undo are followed back to the version they restored,
+        so repeated undos keep walking back instead of toggling between the
+        last two versions.
+        """
+        if not self.entries:
+            return None
+        position = len(self.entries) - 1
+        while self.entries[position].undo_to is not None:
+            position = self._positions.get(self.entries[position].undo_to)
+            if position is None:
+                return None  # 撤销到的版本已经被 gc 清理
+        return self.entries[position - 1].version if position > 0 else None
+
+    def reconstruct(self, version: int) -> str:
+        position = self._positions.get(version)
+        if position is None:
+            raise KeyError(f"Version {version} is not in the history.")
+        base = position
+        while self.entries[base].snapshot is None:
+            base -= 1
+        lines = list(self.entries[base].snapshot)
+        for entry in self.entries[base + 1:position + 1]:
+            lines = _apply_delta(lines, entry.delta)
+        return "\n".join(lines)
+
+    def gc(self, keep_last: Optional[int] = None, max_age_seconds: Optional[float] = None) -> int:
+        """Drop old versions by count and/or age. The newest version is always kept."""
+        if not self.entries:
+            return 0
+        cutoff = 0
+        if keep_last is not None:
+            cutoff = max(cutoff, len(self.entries) - max(keep_last, 1))
+        if max_age_seconds is not None:
+            oldest_allowed = time.time() - max_age_seconds
+            while cutoff < len(self.entries) - 1 and self.entries[cutoff].timestamp < oldest_allowed:
+                cutoff += 1
+        if cutoff == 0:
+            return 0
+
+        first = self.entries[cutoff]
+        if first.snapshot is None:
+            # 新的第一个版本要变成快照，否则它依赖的旧版本已被删除
+            first = replace(first, snapshot=tuple(self.reconstruct(first.version).split("\n")), delta=None)
+        self.entries = [first] + self.entries[cutoff + 1:]
+        self._positions = {e.version: i for i, e in enumerate(self.entries)}
+        self._since_snapshot = next(
+            (i for i, e in enumerate(reversed(self.entries)) if e.snapshot is not None), 0
+        )
+        return cutoff
+
+    def size_bytes(self) -> int:
+        return sum(_entry_size(e) for e in self.entries)
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [e.to_dict() for e in self.entries]
+
+    @classmethod
+    def from_list(cls, data: List[Dict[str, Any]], snapshot_interval: int = 20) -> "VersionHistory":
+        history = cls(snapshot_interval)
+        history.entries = [HistoryEntry.from_dict(d) for d in data]
+        history._positions = {e.version: i for i, e in enumerate(history.entries)}
+        if history.entries:
+            history._latest_lines = history.reconstruct(history.entries[-1].version).split("\n")
+            history._since_snapshot = next(
+                (i for i, e in enumerate(reversed(history.entries)) if e.snapshot is not None), 0
+            )
+        return history
@@ -0,0 +1,246 @@
+"""LangGraph execution overhead on the exercise graphs and scaled-up synthetic graphs.
+
+Usage:
+    python bench_graphs.py [--quick] [--repeat 3] [--output-dir bench_results]
+
+Every graph is compiled and run under `invoke` and `stream` (updates mode).
+Reported per graph: compile time, steps, per-step overhead for both modes and
+tracemalloc peak memory of one invoke. A separate sweep measures how per-step
+cost grows with state size when nodes return only their delta versus the
+whole state. Results are written to <output-dir>/langgraph-<version>.json so
+runs can be compared across langgraph upgrades.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from importlib.metadata import version
+from typing import Any, Callable, Dict, List, TypedDict
+
+from langgraph.graph import END, START, StateGraph
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 每个练习脚本的输入；脚本本身在导入时会运行并打印一次，这里只借用它编译好的 graph
+EXERCISES: Dict[str, Dict[str, Any]] = {
+    "01_simple-agent.py": {"name": "Kindred"},
+    "02_multiple-input.py": {"values": [1, 2, 3, 4], "name": "Kindred", "result": ""},
+    "03_operation-inputs.py": {"names": ["Alice", "Bob"], "values": [1, 2, 3, 4], "operation": "+", "result": ""},
+    "04_simple-edge.py": {"names": "Alice", "age": 30, "skills": ["Python", "Langgraph"], "result": ""},
+    "05_simple-condition.py": {
+        "number1": 10, "operation1": "add", "number2": 5, "finalNumber1": 0,
+        "number3": 20, "operation2": "subtract", "number4": 15, "finalNumber2": 0,
+    },
+    "06_simple_loop.py": {
+        "player_name": "Alice", "target_number": 0, "guesses": [], "attempts": 0,
+        "hint": "", "lower_bound": 1, "upper_bound": 20,
+    },
+}
+
+
+def load_exercise(filename: str) -> StateGraph:
+    """Execute an exercise script (quietly) and return its StateGraph, even if its demo run raises."""
+    path = os.path.join(HERE, filename)
+    namespace: Dict[str, Any] = {"__name__": "exercise", "__file__": path}
+    with open(path, "r", encoding="utf-8") as f:
+        code = compile(f.read(), path, "exec")
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            exec(code, namespace)
+        except Exception:
+            pass
+    return namespace["graph"]
+
+
+class CounterState(TypedDict):
+    counter: int
+    payload: List[int]
+
+
+def _increment(state: CounterState) -> dict:
+    return {"counter": state["counter"] + 1}
+
+
+def chain_graph(length: int) -> StateGraph:
+    graph = StateGraph(CounterState)
+    previous = START
+    for i in range(length):
+        graph.add_node(f"n{i}", _increment)
+        graph.add_edge(previous, f"n{i}")
+        previous = f"n{i}"
+    graph.add_edge(previous, END)
+    return graph
+
+
+def fanout_graph(depth: int) -> StateGraph:
+    """Binary decision tree: level i routes left/right on bit i of payload[0], so a run visits `depth` nodes.
+
+    Seed payload[0] with a random `depth`-bit number to pick the path through the tree.
+    """
+    graph = StateGraph(CounterState)
+
+    def router(level: int) -> Callable[[CounterState], str]:
+        return lambda state: "left" if (state["payload"][0] >> level) & 1 else "right"
+
+    graph.add_node("d0_0", _increment)
+    graph.add_edge(START, "d0_0")
+    for level in range(depth - 1):
+        for index in range(2 ** level):
+            name = f"d{level}_{index}"
+            left, right = f"d{level + 1}_{2 * index}", f"d{level + 1}_{2 * index + 1}"
+            graph.add_node(left, _increment)
+            graph.add_node(right, _increment)
+            graph.add_conditional_edges(name, router(level), {"left": left, "right": right})
+    for index in range(2 ** (depth - 1)):
+        graph.add_edge(f"d{depth - 1}_{index}", END)
+    return graph
+
+
+def loop_graph(iterations: int) -> StateGraph:
+    graph = StateGraph(CounterState)
+    graph.add_node("step", _increment)
+    graph.add_edge(START, "step")
+    graph.add_conditional_edges("step", lambda state: "again" if state["counter"] < iterations else "done",
+                                {"again": "step", "done": END})
+    return graph
+
+
+def state_size_graph(steps: int, full_state: bool) -> StateGraph:
+    """Chain whose nodes return either only the counter or the whole (large) state, like the exercise nodes do."""
+    def delta(state: CounterState) -> dict:
+        return {"counter": state["counter"] + 1}
+
+    def whole(state: CounterState) -> CounterState:
+        state["counter"] += 1
+        return state
+
+    graph = StateGraph(CounterState)
+    previous = START
+    for i in range(steps):
+        graph.add_node(f"n{i}", whole if full_state else delta)
+        graph.add_edge(previous, f"n{i}")
+        previous = f"n{i}"
+    graph.add_edge(previous, END)
+    return graph
+
+
+def _timed(fn: Callable[[], Any], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def bench_graph(name: str, graph: StateGraph, inputs: Dict[str, Any], repeat: int,
+                recursion_limit: int = 25) -> Dict[str, Any]:
+    config = {"recursion_limit": recursion_limit}
+    started = time.perf_counter()
+    app = graph.compile()
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    sink = io.StringIO()
+    result: Dict[str, Any] = {"graph": name, "nodes": len(graph.nodes), "compile_ms": round(compile_ms, 3)}
+    with contextlib.redirect_stdout(sink):
+        try:
+            steps = sum(1 for _ in app.stream(_fresh(inputs), config, stream_mode="updates"))
+            invoke_s = _timed(lambda: app.invoke(_fresh(inputs), config), repeat)
+            stream_s = _timed(lambda: sum(1 for _ in app.stream(_fresh(inputs), config, stream_mode="updates")), repeat)
+            tracemalloc.start()
+            app.invoke(_fresh(inputs), config)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        except Exception as e:
+            if tracemalloc.is_tracing():
+                tracemalloc.stop()
+            result["error"] = f"{type(e).__name__}: {e}"
+            return result
+    result.update({
+        "steps": steps,
+        "invoke_ms": round(invoke_s * 1000, 3),
+        "stream_ms": round(stream_s * 1000, 3),
+        "invoke_us_per_step": round(invoke_s / max(steps, 1) * 1e6, 2),
+        "stream_us_per_step": round(stream_s / max(steps, 1) * 1e6, 2),
+        "peak_kib": round(peak / 1024, 1),
+    })
+    return result
+
+
+def _fresh(inputs: Dict[str, Any]) -> Dict[str, Any]:
+    # 练习节点会原地修改 state（比如 guesses.append），每次运行都给一份新的输入
+    return {key: list(value) if isinstance(value, list) else value for key, value in inputs.items()}
+
+
+def state_copy_sweep(sizes: List[int], steps: int, repeat: int) -> List[Dict[str, Any]]:
+    rows = []
+    for full_state in (False, True):
+        app = state_size_graph(steps, full_state).compile()
+        for size in sizes:
+            inputs = {"counter": 0, "payload": list(range(size))}
+            elapsed = _timed(lambda: app.invoke(_fresh(inputs)), repeat)
+            rows.append({
+                "returns": "full_state" if full_state else "delta",
+                "payload_items": size,
+                "us_per_step": round(elapsed / steps * 1e6, 2),
+            })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="smaller synthetic graphs")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output-dir", default=os.path.join(HERE, "bench_results"))
+    args = parser.parse_args()
+
+    random.seed(0)
+    chain_length, depth, iterations = (100, 8, 1000) if args.quick else (1000, 12, 10000)
+    results = []
+    for filename, inputs in EXERCISES.items():
+        results.append(bench_graph(filename, load_exercise(filename), inputs, args.repeat))
+    results.append(bench_graph(f"chain_{chain_length}", chain_graph(chain_length), {"counter": 0, "payload": []},
+                               args.repeat, recursion_limit=chain_length + 10))
+    results.append(bench_graph(f"fanout_depth_{depth}", fanout_graph(depth),
+                               {"counter": 0, "payload": [random.getrandbits(depth)]},
+                               args.repeat, recursion_limit=depth + 10))
+    results.append(bench_graph(f"loop_{iterations}", loop_graph(iterations), {"counter": 0, "payload": []},
+                               args.repeat, recursion_limit=iterations + 10))
+    sweep = state_copy_sweep([0, 1000, 10000, 100000], steps=20, repeat=args.repeat)
+
+    for row in results:
+        if "error" in row:
+            print(f"{row['graph']:<24} error: {row['error']}")
+        else:
+            print(f"{row['graph']:<24} nodes {row['nodes']:>5}  steps {row['steps']:>6}  "
+                  f"compile {row['compile_ms']:>9.2f} ms  invoke {row['invoke_us_per_step']:>8.1f} us/step  "
+                  f"stream {row['stream_us_per_step']:>8.1f} us/step  peak {row['peak_kib']:>9.1f} KiB")
+    for row in sweep:
+        print(f"state copy  {row['returns']:<10} payload {row['payload_items']:>7}  {row['us_per_step']:>9.1f} us/step")
+
+    langgraph_version = version("langgraph")
+    report = {
+        "langgraph": langgraph_version,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "quick": args.quick,
+        "graphs": results,
+        "state_copy": sweep,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"langgraph-{langgraph_version}{'-quick' if args.quick else ''}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
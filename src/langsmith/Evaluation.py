@@ -1,83 +1,125 @@
-from langsmith import Client
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
+"""Evaluate the QA chain on a local JSONL dataset.
+
+Usage:
+    python Evaluation.py [--dataset datasets/qa_sample.jsonl] [--experiment first-eval-local]
+                         [--workers 4] [--offline] [--no-cache] [--compare OTHER_EXPERIMENT]
+
+Results are checkpointed to eval_results/<experiment>.jsonl; running the same
+experiment again resumes where it stopped. Outputs and judgements are also
+cached in eval_results/cache.sqlite by (example, target, evaluator)
+fingerprint, so a new experiment only executes examples whose content,
+prompt/model or judge changed. --compare prints a per-example diff against
+an earlier experiment. With --offline (or without OPENAI_API_KEY) a stub
+model and a lexical judge are used, so no network is needed.
+"""
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
 from pydantic import SecretStr
-import os
 
-LANGSMITH_TRACING = os.getenv("LANGSMITH_TRACING", "false").lower() == "true"
-LANGSMITH_ENDPOINT = os.getenv("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com")
-LANGSMITH_API_KEY = SecretStr(os.getenv("LANGSMITH_API_KEY") or "")
-LANGSMITH_PROJECT = os.getenv("LANGSMITH_PROJECT", "default")
+from local_eval import (
+    EvaluationRunner, ResultCache, diff_experiments, fingerprint, lexical_correctness, load_jsonl, load_results,
+)
+
+load_dotenv()
 
 OPENAI_API_KEY = SecretStr(os.getenv("OPENAI_API_KEY") or "")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 
-client = Client(api_key=OPENAI_API_KEY.get_secret_value(), api_url=OPENAI_BASE_URL)
+HERE = os.path.dirname(os.path.abspath(__file__))
 
-print(LANGSMITH_API_KEY)
-# 0 create evaluation dataset
-dataset = client.create_dataset(
-    dataset_name="Sample dataset", description="A sample dataset in LangSmith."
-)
+# 0 the evaluation dataset is a local JSONL file: {"id", "inputs": {"question"}, "outputs": {"answer"}} per line
+DEFAULT_DATASET = os.path.join(HERE, "datasets", "qa_sample.jsonl")
 
-# Create examples
-examples = [
-    {
-        "inputs": {"question": "Which country is Mount Kilimanjaro located in?"},
-        "outputs": {"answer": "Mount Kilimanjaro is located in Tanzania."},
-    },
-    {
-        "inputs": {"question": "What is Earth's lowest point?"},
-        "outputs": {"answer": "Earth's lowest point is The Dead Sea."},
-    },
-]
+# 1 create app (built once, shared by all worker threads)
+def stub_model(prompt_value) -> AIMessage:
+    """Offline stand-in for the chat model: repeats the question back."""
+    return AIMessage(content=f"You asked: {prompt_value.to_messages()[-1].content}")
 
-# Add examples to the dataset
-client.create_examples(dataset_id=dataset.id, examples=examples)
+QA_MODEL = "gpt-3.5-turbo"
+QA_MESSAGES = [
+    ("system", "You are a helpful assistant."),
+    ("human", "{question}")
+]
 
-# 1 create app
-def create_qa_chain(inputs):
+def create_qa_chain(offline: bool):
     """一个简单的问答Chain"""
-    llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", "You are a helpful assistant."),
-        ("human", "{question}")
-    ])
-    chain = prompt | llm | StrOutputParser()
-    return chain.invoke({"question": inputs["question"]})
-
-# 2 define Evaluator client
-from openevals.llm import create_llm_as_judge
-from openevals.prompts import CORRECTNESS_PROMPT
-
-def correctness_evaluator(inputs: dict, outputs: dict, reference_outputs: dict):
-    evaluator = create_llm_as_judge(
+    if offline:
+        llm = RunnableLambda(stub_model)
+    else:
+        from langchain_openai import ChatOpenAI
+        llm = ChatOpenAI(model=QA_MODEL, temperature=0, api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+    prompt = ChatPromptTemplate.from_messages(QA_MESSAGES)
+    return prompt | llm | StrOutputParser()
+
+def qa_chain_fingerprint(offline: bool) -> str:
+    # prompt、模型或离线桩变化时指纹随之变化，缓存结果自动失效
+    return fingerprint(QA_MESSAGES, "stub" if offline else QA_MODEL, stub_model if offline else 0)
+
+# 2 define Evaluator (built once, not per example)
+JUDGE_MODEL = "openai:gpt-4.1-mini"
+
+def create_correctness_evaluator(offline: bool):
+    if offline:
+        return lexical_correctness
+    from openevals.llm import create_llm_as_judge
+    from openevals.prompts import CORRECTNESS_PROMPT
+
+    return create_llm_as_judge(
         prompt=CORRECTNESS_PROMPT,
-        model="openai:gpt-4.1-mini",
+        model=JUDGE_MODEL,
         feedback_key="correctness",
     )
-    eval_result = evaluator(
-        inputs=inputs,
-        outputs=outputs,
-        reference_outputs=reference_outputs
-    )
-    return eval_result
+
+def correctness_fingerprint(offline: bool) -> str:
+    if offline:
+        return fingerprint(lexical_correctness)
+    from openevals.prompts import CORRECTNESS_PROMPT
+    return fingerprint(CORRECTNESS_PROMPT, JUDGE_MODEL)
 
 # 3 run and view evaluation results
-# Define the target function for evaluation
-def target(inputs):
-    return {"answer": create_qa_chain(inputs)}
-
-# Run evaluation using built-in "qa" evaluator
-# After running the evaluation, a link will be provided to view the results in langsmith
-experiment_results = client.evaluate(
-    target,
-    data="Sample dataset",
-    evaluators=[
-        correctness_evaluator,
-        # can add multiple evaluators here
-    ],
-    experiment_prefix="first-eval-in-langsmith",
-    max_concurrency=2,
-)
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--experiment", default="first-eval-local")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("EVAL_WORKERS", "4")))
+    parser.add_argument("--results-dir", default=os.path.join(HERE, "eval_results"))
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--compare", help="earlier experiment to diff against")
+    args = parser.parse_args()
+
+    offline = args.offline or not OPENAI_API_KEY.get_secret_value()
+    chain = create_qa_chain(offline)
+
+    # Define the target function for evaluation
+    def target(inputs):
+        return {"answer": chain.invoke({"question": inputs["question"]})}
+
+    runner = EvaluationRunner(
+        target,
+        evaluators=[create_correctness_evaluator(offline)],
+        max_workers=args.workers,
+        results_dir=args.results_dir,
+        cache=None if args.no_cache else ResultCache(os.path.join(args.results_dir, "cache.sqlite")),
+        target_fingerprint=qa_chain_fingerprint(offline),
+        evaluator_fingerprint=correctness_fingerprint(offline),
+    )
+    report = runner.run(load_jsonl(args.dataset), args.experiment)
+    print(json.dumps(report.summary(), ensure_ascii=False, indent=2))
+
+    if args.compare:
+        diff = diff_experiments(
+            load_results(runner.checkpoint_path(args.compare)),
+            load_results(runner.checkpoint_path(args.experiment)),
+        )
+        print(json.dumps(diff, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,23 @@
 from dotenv import load_dotenv
 from pydantic import SecretStr
 import os
-from langsmith.wrappers import wrap_openai
+
+from local_tracing import LocalTraceExporter, Tracer, trace_openai
 
 load_dotenv()
 
 
-LANGSMITH_TRACING = os.getenv("LANGSMITH_TRACING", "false").lower() == "true"
-LANGSMITH_ENDPOINT = os.getenv("LANGSMITH_ENDPOINT", "https://api.smith.langchain.com")
-LANGSMITH_API_KEY = SecretStr(os.getenv("LANGSMITH_API_KEY") or "")
-LANGSMITH_PROJECT = os.getenv("LANGSMITH_PROJECT", "default")
 OPENAI_API_KEY = SecretStr(os.getenv("OPENAI_API_KEY") or "")
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 
+# 追踪数据先进入进程内队列，由后台线程批量写入本地文件（.jsonl 或 .sqlite），请求路径上不做任何网络导出
+TRACE_PATH = os.getenv("TRACE_PATH", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
 import openai
-from langsmith import wrappers
 
 # Use OpenAI client same as you normally would.
-# After each conversation, you can view the local chat records at https://smith.langchain.com/
-# On the web interface, you can clearly see the details of each conversation (also called a "Trace"), including:
+# Every call is recorded as a span in TRACE_PATH (a JSON line or a SQLite row per span), including:
 
 # Complete call chain: You can see every step from user input to final output. 
 # If your application calls tools, retrieves documents, or has multiple intermediate steps, each will be displayed step by step.
@@ -28,7 +27,9 @@ from langsmith import wrappers
 # Performance metrics: This includes key indicators such as token usage, response latency, and cost.
 
 # Errors and debugging: If any step fails, it will be clearly marked, helping you quickly locate the root cause.
-client = wrappers.wrap_openai(openai.OpenAI())
+exporter = LocalTraceExporter(TRACE_PATH, sample_rate=TRACE_SAMPLE_RATE)
+tracer = Tracer(exporter)
+client = trace_openai(openai.OpenAI(api_key=OPENAI_API_KEY.get_secret_value(), base_url=OPENAI_BASE_URL), tracer)
 
 # Chat API:
 from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
@@ -47,4 +48,7 @@ completion_response = client.completions.create(
     prompt="hello?",
     max_tokens=256,
 )
-print(completion_response.choices[0].text)
\ No newline at end of file
+print(completion_response.choices[0].text)
+
+exporter.close()
+print(f"Traces written to {TRACE_PATH}: {exporter.stats()}")
@@ -0,0 +1,67 @@
+"""Throughput of the vectorized numeric evaluator on synthetic arithmetic answers.
+
+Usage:
+    python bench_numeric_eval.py [--examples 10000]
+"""
+import argparse
+import math
+import random
+import time
+
+from numeric_eval import evaluate_numeric, extract_number, numeric_matches
+
+TEMPLATES = [
+    "✅ 最终答案: {a} / {b} = {q}, {q} × {c} = {answer}",
+    "The result of {a} + {b} is {answer}.",
+    "计算结果是 {answer}",
+    "{a} * {b} equals {answer}",
+]
+
+
+def synthetic(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    answers, references, tool_calls, steps = [], [], [], []
+    for _ in range(count):
+        a, b, c = rng.randint(1, 500), rng.randint(1, 50), rng.randint(1, 9)
+        reference = a / b * c
+        # 大约 10% 的答案故意算错
+        answer = reference if rng.random() > 0.1 else reference + rng.randint(1, 5)
+        answers.append(rng.choice(TEMPLATES).format(a=a, b=b, c=c, q=round(a / b, 6), answer=round(answer, 6)))
+        references.append(reference)
+        tool_calls.append(rng.randint(1, 3))
+        steps.append(rng.randint(2, 4))
+    return answers, references, tool_calls, steps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--examples", type=int, default=10000)
+    args = parser.parse_args()
+
+    answers, references, tool_calls, steps = synthetic(args.examples)
+
+    started = time.perf_counter()
+    report = evaluate_numeric(answers, references, tool_calls, steps, rel_tol=1e-4)
+    total = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predicted = [extract_number(answer) for answer in answers]
+    extraction = time.perf_counter() - started
+
+    started = time.perf_counter()
+    loop_correct = [math.isclose(p, r, rel_tol=1e-4, abs_tol=1e-9) for p, r in zip(predicted, references)]
+    loop = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vector_correct = numeric_matches(predicted, references, rel_tol=1e-4)
+    vectorized = time.perf_counter() - started
+    assert loop_correct == vector_correct.tolist() == report["correct"]
+
+    report.pop("correct")
+    print(report)
+    print(f"evaluate_numeric  {total:.4f}s  ({args.examples / total:,.0f} examples/sec)")
+    print(f"  extraction      {extraction:.4f}s")
+    print(f"  compare: numpy  {vectorized:.4f}s  vs python loop {loop:.4f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Per-request overhead of local tracing.
+
+Usage:
+    python bench_tracing.py [--requests 2000] [--spans 6] [--sample-rate 1.0]
+
+Each simulated request opens a root span plus `--spans` child spans (graph
+nodes, LLM call, tools), once with the Tracer and once through the LangChain
+callback handler, and compares against the same work without tracing.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from local_tracing import LocalTraceCallbackHandler, LocalTraceExporter, Tracer
+
+
+def work() -> int:
+    return sum(range(200))
+
+
+def bench_tracer(tracer: Tracer, requests: int, spans: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        with tracer.span("request", inputs={"question": f"q{i}"}) as root:
+            for step in range(spans):
+                with tracer.span(f"node_{step}", kind="tool" if step % 2 else "chain", inputs={"step": step}) as span:
+                    span["outputs"] = work()
+            root["outputs"] = "done"
+    return time.perf_counter() - started
+
+
+def bench_plain(requests: int, spans: int) -> float:
+    started = time.perf_counter()
+    for _ in range(requests):
+        for _ in range(spans):
+            work()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--spans", type=int, default=6)
+    parser.add_argument("--sample-rate", type=float, default=1.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for filename in ("traces.jsonl", "traces.sqlite"):
+            exporter = LocalTraceExporter(os.path.join(directory, filename), sample_rate=args.sample_rate)
+            plain = bench_plain(args.requests, args.spans)
+            traced = bench_tracer(Tracer(exporter), args.requests, args.spans)
+            overhead_ms = (traced - plain) / args.requests * 1000
+            exporter.flush()
+            print(f"{filename:<14} tracer    {overhead_ms:.4f} ms/request  {exporter.stats()}")
+            exporter.close()
+
+        exporter = LocalTraceExporter(os.path.join(directory, "callbacks.jsonl"), sample_rate=args.sample_rate)
+        chain = RunnableLambda(lambda x: work(), name="node_0")
+        for step in range(1, args.spans):
+            chain = chain | RunnableLambda(lambda x: work(), name=f"node_{step}")
+        requests = max(args.requests // 4, 1)
+        started = time.perf_counter()
+        for i in range(requests):
+            chain.invoke(i)
+        untraced = time.perf_counter() - started
+        handler = LocalTraceCallbackHandler(exporter)
+        started = time.perf_counter()
+        for i in range(requests):
+            chain.invoke(i, config={"callbacks": [handler]})
+        traced = time.perf_counter() - started
+        exporter.flush()
+        print(f"{'callbacks':<14} handler   {(traced - untraced) / requests * 1000:.4f} ms/request  {exporter.stats()}")
+        exporter.close()
+
+
+if __name__ == "__main__":
+    main()
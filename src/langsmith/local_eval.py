@@ -0,0 +1,372 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+Evaluator = Callable[..., Any]
+
+
+@dataclass(frozen=True)
+class Example:
+    id: str
+    inputs: Dict[str, Any]
+    outputs: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def hash(self) -> str:
+        """Content hash of the example, independent of its id."""
+        payload = json.dumps({"inputs": self.inputs, "outputs": self.outputs}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def load_jsonl(path: str) -> List[Example]:
+    """Read a dataset with one {"id"?, "inputs", "outputs"} object per line. Missing ids default to the content hash."""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            example = Example(str(data.get("id", "")), data["inputs"], data.get("outputs") or {})
+            if not example.id:
+                example = Example(example.hash, example.inputs, example.outputs)
+            examples.append(example)
+    return examples
+
+
+def _feedback(result: Any, default_key: str) -> List[Dict[str, Any]]:
+    """Normalize an evaluator return value (dict, list of dicts, bool or number) to a list of feedback dicts."""
+    if isinstance(result, list):
+        return [item for entry in result for item in _feedback(entry, default_key)]
+    if isinstance(result, dict):
+        return [{"key": result.get("key", default_key), "score": result.get("score"), "comment": result.get("comment")}]
+    return [{"key": default_key, "score": result, "comment": None}]
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable short hash of whatever defines a target or evaluator (prompt text, model name, settings, code)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if callable(part):
+            try:
+                part = inspect.getsource(part)
+            except (OSError, TypeError):
+                part = getattr(part, "__qualname__", repr(part))
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """SQLite cache of target outputs and evaluator feedback.
+
+    Outputs are keyed on (example hash, target fingerprint) and feedback on
+    (example hash, target fingerprint, evaluator fingerprint), so changing
+    only the evaluators reuses the target outputs, and changing nothing
+    reuses both.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS outputs (example_hash TEXT, target TEXT, outputs TEXT, "
+                "PRIMARY KEY (example_hash, target))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS feedback (example_hash TEXT, target TEXT, evaluator TEXT, feedback TEXT, "
+                "PRIMARY KEY (example_hash, target, evaluator))"
+            )
+
+    def get_outputs(self, example_hash: str, target: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT outputs FROM outputs WHERE example_hash = ? AND target = ?", (example_hash, target)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_feedback(self, example_hash: str, target: str, evaluator: str) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT feedback FROM feedback WHERE example_hash = ? AND target = ? AND evaluator = ?",
+                (example_hash, target, evaluator),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, example_hash: str, target: str, evaluator: str,
+            outputs: Dict[str, Any], feedback: List[Dict[str, Any]]) -> None:
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?)",
+                (example_hash, target, json.dumps(outputs, ensure_ascii=False, default=str)),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO feedback VALUES (?, ?, ?, ?)",
+                (example_hash, target, evaluator, json.dumps(feedback, ensure_ascii=False, default=str)),
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+_WORDS = re.compile(r"\w+")
+
+
+def lexical_correctness(inputs: dict, outputs: dict, reference_outputs: dict) -> dict:
+    """Offline stand-in for the LLM judge: the answer must cover most reference words the question doesn't already contain."""
+    question = set(_WORDS.findall(str(inputs.get("question", "")).lower()))
+    reference = set(_WORDS.findall(str(reference_outputs.get("answer", "")).lower())) - question
+    answer = set(_WORDS.findall(str(outputs.get("answer", "")).lower()))
+    coverage = len(reference & answer) / len(reference) if reference else 0.0
+    return {"key": "correctness", "score": coverage >= 0.6, "comment": f"reference word coverage {coverage:.2f}"}
+
+
+@dataclass
+class ExperimentReport:
+    experiment: str
+    results: List[Dict[str, Any]]
+    executed: int
+    resumed: int
+    elapsed: float
+    cached: int = 0
+
+    @property
+    def examples_per_second(self) -> float:
+        return self.executed / self.elapsed if self.elapsed > 0 else 0.0
+
+    def scores(self) -> Dict[str, float]:
+        """Mean score per feedback key (booleans count as 0/1)."""
+        totals: Dict[str, List[float]] = {}
+        for result in self.results:
+            for feedback in result["feedback"]:
+                if isinstance(feedback["score"], (bool, int, float)):
+                    totals.setdefault(feedback["key"], []).append(float(feedback["score"]))
+        return {key: round(sum(values) / len(values), 4) for key, values in totals.items()}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "experiment": self.experiment,
+            "examples": len(self.results),
+            "executed": self.executed,
+            "resumed": self.resumed,
+            "cached": self.cached,
+            "errors": sum(1 for result in self.results if result["error"]),
+            "scores": self.scores(),
+            "elapsed_s": round(self.elapsed, 3),
+            "examples_per_sec": round(self.examples_per_second, 2),
+        }
+
+
+class EvaluationRunner:
+    """Run a target and its evaluators over a dataset on a thread pool.
+
+    Evaluators are plain callables `(inputs, outputs, reference_outputs)`,
+    built once by the caller and shared by all workers. Each finished example
+    is appended to `<results_dir>/<experiment>.jsonl` as soon as it completes,
+    so running the same experiment again skips examples that already
+    succeeded and only retries the rest.
+
+    With a ResultCache, examples whose content, target fingerprint and
+    evaluator fingerprint were all seen before (in any experiment) are
+    merged from the cache instead of being executed.
+    """
+
+    def __init__(self, target: Callable[[Dict[str, Any]], Dict[str, Any]], evaluators: Sequence[Evaluator],
+                 max_workers: int = 4, results_dir: str = "eval_results", cache: Optional[ResultCache] = None,
+                 target_fingerprint: Optional[str] = None, evaluator_fingerprint: Optional[str] = None):
+        self.target = target
+        self.evaluators = list(evaluators)
+        self.max_workers = max_workers
+        self.results_dir = results_dir
+        self.cache = cache
+        self.target_fingerprint = target_fingerprint or fingerprint(target)
+        self.evaluator_fingerprint = evaluator_fingerprint or fingerprint(*self.evaluators)
+
+    def checkpoint_path(self, experiment: str) -> str:
+        return os.path.join(self.results_dir, f"{experiment}.jsonl")
+
+    def load_checkpoint(self, experiment: str) -> Dict[str, Dict[str, Any]]:
+        """Successful results already written for this experiment, by example id."""
+        done: Dict[str, Dict[str, Any]] = {}
+        try:
+            with open(self.checkpoint_path(experiment), "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # 进程被中断时最后一行可能只写了一半
+                    if not result.get("error"):
+                        done[result["example_id"]] = result
+        except FileNotFoundError:
+            pass
+        return done
+
+    def evaluate_example(self, example: Example) -> Dict[str, Any]:
+        started = time.perf_counter()
+        result: Dict[str, Any] = {
+            "example_id": example.id,
+            "example_hash": example.hash,
+            "target_fingerprint": self.target_fingerprint,
+            "evaluator_fingerprint": self.evaluator_fingerprint,
+            "inputs": example.inputs,
+            "reference_outputs": example.outputs,
+            "outputs": None,
+            "feedback": [],
+            "error": None,
+        }
+        try:
+            outputs = None
+            if self.cache is not None:
+                outputs = self.cache.get_outputs(example.hash, self.target_fingerprint)
+            if outputs is None:
+                outputs = self.target(example.inputs)
+            result["outputs"] = outputs
+            for evaluator in self.evaluators:
+                key = getattr(evaluator, "__name__", type(evaluator).__name__)
+                score = evaluator(inputs=example.inputs, outputs=outputs, reference_outputs=example.outputs)
+                result["feedback"].extend(_feedback(score, key))
+            if self.cache is not None:
+                self.cache.put(example.hash, self.target_fingerprint, self.evaluator_fingerprint,
+                               outputs, result["feedback"])
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def cached_result(self, example: Example) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        feedback = self.cache.get_feedback(example.hash, self.target_fingerprint, self.evaluator_fingerprint)
+        if feedback is None:
+            return None
+        return {
+            "example_id": example.id,
+            "example_hash": example.hash,
+            "target_fingerprint": self.target_fingerprint,
+            "evaluator_fingerprint": self.evaluator_fingerprint,
+            "inputs": example.inputs,
+            "reference_outputs": example.outputs,
+            "outputs": self.cache.get_outputs(example.hash, self.target_fingerprint),
+            "feedback": feedback,
+            "error": None,
+            "latency_ms": 0.0,
+            "cached": True,
+        }
+
+    def run(self, examples: Iterable[Example], experiment: str) -> ExperimentReport:
+        examples = list(examples)
+        done = self.load_checkpoint(experiment)
+        current = (self.target_fingerprint, self.evaluator_fingerprint)
+        pending = [
+            example for example in examples
+            if example.id not in done
+            or done[example.id].get("example_hash") != example.hash
+            or (done[example.id].get("target_fingerprint"), done[example.id].get("evaluator_fingerprint")) != current
+        ]
+
+        os.makedirs(self.results_dir, exist_ok=True)
+        path = self.checkpoint_path(experiment)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn_tail = f.read(1) != b"\n"
+        else:
+            torn_tail = False
+        started = time.perf_counter()
+        fresh: Dict[str, Dict[str, Any]] = {}
+        to_run = []
+        with open(path, "a", encoding="utf-8") as f, \
+                ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="eval") as pool:
+            if torn_tail:
+                f.write("\n")
+            for example in pending:
+                cached = self.cached_result(example)
+                if cached is None:
+                    to_run.append(example)
+                else:
+                    f.write(json.dumps(cached, ensure_ascii=False, default=str) + "\n")
+                    fresh[example.id] = cached
+            f.flush()
+            futures = [pool.submit(self.evaluate_example, example) for example in to_run]
+            for future in as_completed(futures):
+                result = future.result()
+                # 每完成一个样例就落盘，中断后重跑只补没完成的
+                f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                fresh[result["example_id"]] = result
+        elapsed = time.perf_counter() - started
+
+        results = [fresh[example.id] if example.id in fresh else done[example.id] for example in examples]
+        return ExperimentReport(experiment, results, executed=len(to_run), resumed=len(examples) - len(pending),
+                                elapsed=elapsed, cached=len(pending) - len(to_run))
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """Latest result per example id from an experiment's JSONL file."""
+    results: Dict[str, Dict[str, Any]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[result["example_id"]] = result
+    return results
+
+
+def _example_scores(result: Dict[str, Any]) -> Dict[str, float]:
+    scores: Dict[str, List[float]] = {}
+    for feedback in result.get("feedback") or []:
+        if isinstance(feedback["score"], (bool, int, float)):
+            scores.setdefault(feedback["key"], []).append(float(feedback["score"]))
+    return {key: sum(values) / len(values) for key, values in scores.items()}
+
+
+def diff_experiments(base: Dict[str, Dict[str, Any]], candidate: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Compare two experiments' results (as returned by load_results) example by example."""
+    shared = sorted(set(base) & set(candidate))
+    per_key: Dict[str, Dict[str, Any]] = {}
+    changed_outputs = []
+    for example_id in shared:
+        before, after = _example_scores(base[example_id]), _example_scores(candidate[example_id])
+        if base[example_id].get("outputs") != candidate[example_id].get("outputs"):
+            changed_outputs.append(example_id)
+        for key in set(before) | set(after):
+            entry = per_key.setdefault(key, {"base": [], "candidate": [], "improved": [], "regressed": []})
+            if key in before:
+                entry["base"].append(before[key])
+            if key in after:
+                entry["candidate"].append(after[key])
+            if key in before and key in after:
+                if after[key] > before[key]:
+                    entry["improved"].append(example_id)
+                elif after[key] < before[key]:
+                    entry["regressed"].append(example_id)
+
+    def mean(values: List[float]) -> Optional[float]:
+        return round(sum(values) / len(values), 4) if values else None
+
+    return {
+        "shared": len(shared),
+        "only_in_base": sorted(set(base) - set(candidate)),
+        "only_in_candidate": sorted(set(candidate) - set(base)),
+        "changed_outputs": changed_outputs,
+        "scores": {
+            key: {
+                "base": mean(entry["base"]),
+                "candidate": mean(entry["candidate"]),
+                "improved": entry["improved"],
+                "regressed": entry["regressed"],
+            }
+            for key, entry in per_key.items()
+        },
+    }
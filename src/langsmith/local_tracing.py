@@ -0,0 +1,313 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+_current_span: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _clip(value: Any, limit: int) -> Any:
+    """Keep span payloads small: values whose JSON form is too long are replaced by a truncated string."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    if len(text) <= limit:
+        return value if isinstance(value, (str, dict, list)) else text
+    return text[:limit] + f"…(+{len(text) - limit} chars)"
+
+
+class LocalTraceExporter:
+    """Batch spans to a local JSONL or SQLite file from a background thread.
+
+    `export()` only appends to a deque (atomic in CPython, no lock on the
+    request path; only dropped and sampled-out spans take the counter lock).
+    A daemon thread drains it every `flush_interval` seconds, or as soon as
+    `batch_size` spans are waiting, and writes them in one batch.
+    The queue is bounded by `max_queue`; when it is full new spans are dropped
+    and counted instead of blocking the caller. Sampling is decided once per
+    trace (head sampling), so a kept trace is always complete.
+    """
+
+    def __init__(self, path: str = "traces.jsonl", sample_rate: float = 1.0, max_queue: int = 10000,
+                 batch_size: int = 256, flush_interval: float = 1.0, max_field_chars: int = 4000):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_field_chars = max_field_chars
+        self.counters = {"exported": 0, "dropped_full": 0, "sampled_out": 0, "batches": 0, "write_errors": 0}
+        # 计数同时由提交 span 的应用线程和导出线程修改
+        self._counters_lock = threading.Lock()
+        self._queue: deque = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._sqlite = path.endswith((".sqlite", ".db"))
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def _count(self, **deltas: int) -> None:
+        with self._counters_lock:
+            for name, delta in deltas.items():
+                self.counters[name] += delta
+
+    def sampled(self) -> bool:
+        if self.sample_rate >= 1.0:
+            return True
+        if random.random() < self.sample_rate:
+            return True
+        self._count(sampled_out=1)
+        return False
+
+    def export(self, span: Dict[str, Any]) -> None:
+        if len(self._queue) >= self.max_queue:
+            self._count(dropped_full=1)
+            return
+        self._queue.append(span)
+        if len(self._queue) >= self.batch_size:
+            self._wake.set()
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while self._queue and len(batch) < self.batch_size:
+            batch.append(self._queue.popleft())
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]], conn: Optional[sqlite3.Connection]) -> None:
+        if conn is not None:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO spans (trace_id, span_id, parent_id, name, kind, start, duration_ms, error, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (s["trace_id"], s["span_id"], s["parent_id"], s["name"], s["kind"], s["start"],
+                         s["duration_ms"], s["error"], json.dumps(s, ensure_ascii=False, default=str))
+                        for s in batch
+                    ],
+                )
+        else:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in batch))
+
+    def _open(self) -> Optional[sqlite3.Connection]:
+        if not self._sqlite:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            return None
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS spans (trace_id TEXT, span_id TEXT PRIMARY KEY, parent_id TEXT, name TEXT, "
+            "kind TEXT, start REAL, duration_ms REAL, error TEXT, data TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS spans_trace ON spans (trace_id)")
+        return conn
+
+    def _run(self) -> None:
+        conn = self._open()
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            while self._queue:
+                batch = self._drain()
+                try:
+                    self._write(batch, conn)
+                    self._count(exported=len(batch), batches=1)
+                except Exception:
+                    self._count(write_errors=1)
+            self._idle.set()
+            if self._stop.is_set():
+                break
+        if conn is not None:
+            conn.close()
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Block until everything queued so far has been written."""
+        deadline = time.monotonic() + timeout
+        while True:
+            self._idle.clear()
+            self._wake.set()
+            if not self._idle.wait(max(deadline - time.monotonic(), 0)) or not self._queue:
+                return
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        with self._counters_lock:
+            return dict(self.counters, queued=len(self._queue))
+
+
+class Tracer:
+    """Create spans for arbitrary code (graph nodes, tools, SDK calls) and hand them to an exporter."""
+
+    def __init__(self, exporter: LocalTraceExporter):
+        self.exporter = exporter
+
+    @contextmanager
+    def span(self, name: str, kind: str = "chain", inputs: Any = None, **metadata: Any) -> Iterator[Dict[str, Any]]:
+        parent = _current_span.get()
+        if parent is None:
+            # 采样在 trace 的根上决定一次，子 span 跟随父 span
+            sampled = self.exporter.sampled()
+            trace_id = uuid.uuid4().hex
+        else:
+            sampled = parent["_sampled"]
+            trace_id = parent["trace_id"]
+        limit = self.exporter.max_field_chars
+        span: Dict[str, Any] = {
+            "trace_id": trace_id,
+            "span_id": uuid.uuid4().hex,
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "kind": kind,
+            "start": time.time(),
+            "inputs": _clip(inputs, limit) if sampled else None,
+            "outputs": None,
+            "error": None,
+            "metadata": metadata,
+            "_sampled": sampled,
+        }
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            if sampled:
+                span["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+                span["outputs"] = _clip(span["outputs"], limit)
+                del span["_sampled"]
+                self.exporter.export(span)
+
+    def wrap(self, fn: Callable, name: Optional[str] = None, kind: str = "chain") -> Callable:
+        """Wrap a callable so each call is recorded as a span with its arguments and result."""
+        span_name = name or getattr(fn, "__qualname__", "call")
+
+        @functools.wraps(fn)
+        def traced(*args, **kwargs):
+            with self.span(span_name, kind, inputs={"args": args, "kwargs": kwargs}) as span:
+                result = fn(*args, **kwargs)
+                span["outputs"] = result
+                return result
+
+        return traced
+
+
+def trace_openai(client, tracer: Tracer):
+    """Trace an openai.OpenAI client's chat and text completion calls locally (replaces wrap_openai)."""
+
+    def summarize(response):
+        usage = getattr(response, "usage", None)
+        choices = getattr(response, "choices", None) or []
+        first = choices[0] if choices else None
+        text = getattr(getattr(first, "message", None), "content", None) or getattr(first, "text", None)
+        return {"output": text, "usage": usage.model_dump() if hasattr(usage, "model_dump") else usage}
+
+    def wrap(create, name):
+        @functools.wraps(create)
+        def traced(*args, **kwargs):
+            with tracer.span(name, "llm", inputs=kwargs, model=kwargs.get("model")) as span:
+                response = create(*args, **kwargs)
+                if not kwargs.get("stream"):
+                    span["outputs"] = summarize(response)
+                return response
+        return traced
+
+    client.chat.completions.create = wrap(client.chat.completions.create, "openai.chat.completions")
+    client.completions.create = wrap(client.completions.create, "openai.completions")
+    return client
+
+
+class LocalTraceCallbackHandler(BaseCallbackHandler):
+    """LangChain/LangGraph callback handler that records chains, graph nodes, LLM calls and tools as spans."""
+
+    def __init__(self, exporter: LocalTraceExporter):
+        self.exporter = exporter
+        self._open: Dict[UUID, Dict[str, Any]] = {}
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: str, kind: str, inputs: Any,
+               metadata: Optional[Dict[str, Any]] = None) -> None:
+        parent = self._open.get(parent_run_id) if parent_run_id else None
+        if parent is None:
+            sampled = self.exporter.sampled()
+            trace_id = run_id.hex
+        else:
+            sampled, trace_id = parent["_sampled"], parent["trace_id"]
+        self._open[run_id] = {
+            "trace_id": trace_id,
+            "span_id": run_id.hex,
+            "parent_id": parent_run_id.hex if parent_run_id else None,
+            "name": name,
+            "kind": kind,
+            "start": time.time(),
+            "inputs": _clip(inputs, self.exporter.max_field_chars) if sampled else None,
+            "outputs": None,
+            "error": None,
+            "metadata": {key: metadata[key] for key in ("langgraph_node", "langgraph_step") if key in metadata}
+            if metadata else {},
+            "_sampled": sampled,
+            "_started": time.perf_counter(),
+        }
+
+    def _end(self, run_id: UUID, outputs: Any = None, error: Optional[BaseException] = None) -> None:
+        span = self._open.pop(run_id, None)
+        if span is None or not span.pop("_sampled"):
+            return
+        span["duration_ms"] = round((time.perf_counter() - span.pop("_started")) * 1000, 3)
+        span["outputs"] = _clip(outputs, self.exporter.max_field_chars)
+        if error is not None:
+            span["error"] = f"{type(error).__name__}: {error}"
+        self.exporter.export(span)
+
+    @staticmethod
+    def _name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+        return kwargs.get("name") or (serialized or {}).get("name") or default
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chain"), "chain", inputs, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id, outputs)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        inputs = [[f"{m.type}: {m.content}" for m in batch] for batch in messages]
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chat_model"), "llm", inputs, metadata)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "llm"), "llm", prompts, metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        texts = [generation.text for generations in response.generations for generation in generations]
+        self._end(run_id, {"output": texts, "llm_output": response.llm_output})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "tool"), "tool", input_str, metadata)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._end(run_id, output)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=error)
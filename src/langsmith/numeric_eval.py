@@ -0,0 +1,144 @@
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:,\d{3})*(?:\.\d+)?(?:[eE][-+]?\d+)?(?:\s*/\s*\d+(?:\.\d+)?)?%?")
+_EQUALS_TAIL = re.compile(r"(?:=|＝|等于|是|\bis|\bequals|:|：)\s*$", re.IGNORECASE)
+
+
+def _parse_number(token: str) -> float:
+    percent = token.endswith("%")
+    token = token.rstrip("%").replace(",", "")
+    if "/" in token:
+        numerator, denominator = (float(part) for part in token.split("/"))
+        value = numerator / denominator if denominator else math.nan
+    else:
+        value = float(token)
+    return value / 100 if percent else value
+
+
+def extract_number(text: str) -> float:
+    """The numeric answer in a final-answer text, or NaN if there is none.
+
+    Prefers the last number that follows "=", "is", "等于", ":" and the like
+    (the result of the last step), otherwise the last number in the text.
+    """
+    matches = list(_NUMBER.finditer(text or ""))
+    if not matches:
+        return math.nan
+    for match in reversed(matches):
+        if _EQUALS_TAIL.search(text[max(0, match.start() - 8):match.start()]):
+            return _parse_number(match.group())
+    return _parse_number(matches[-1].group())
+
+
+def _type_of(message: Any) -> str:
+    if isinstance(message, dict):
+        return str(message.get("type") or message.get("message_type") or "")
+    kind = getattr(message, "type", "")
+    return str(getattr(kind, "value", kind))
+
+
+def _content_of(message: Any) -> str:
+    if isinstance(message, dict):
+        return str(message.get("content", ""))
+    return str(getattr(message, "content", "") or "")
+
+
+def final_answer_text(messages: Sequence[Any]) -> str:
+    """Content of the last FINAL_ANSWER stream message, or of the last AI message without tool calls."""
+    for message in reversed(messages):
+        if _type_of(message) == "final_answer":
+            return _content_of(message)
+    for message in reversed(messages):
+        if _type_of(message) == "ai" and not getattr(message, "tool_calls", None):
+            return _content_of(message)
+    return ""
+
+
+def trajectory_metrics(messages: Sequence[Any]) -> Dict[str, int]:
+    """Tool calls and reasoning steps in one run, from stream messages or LangChain messages."""
+    tool_calls = steps = 0
+    for message in messages:
+        kind = _type_of(message)
+        if kind == "tool_call":
+            tool_calls += 1
+        elif kind == "reasoning":
+            steps += 1
+        elif kind == "ai":
+            steps += 1
+            tool_calls += len(getattr(message, "tool_calls", None) or [])
+    return {"tool_calls": tool_calls, "steps": steps}
+
+
+def outputs_from_messages(messages: Sequence[Any]) -> Dict[str, Any]:
+    """Evaluation outputs for one agent run: the final answer text plus its efficiency metrics."""
+    return {"answer": final_answer_text(messages), **trajectory_metrics(messages)}
+
+
+def numeric_matches(predicted: Iterable[float], reference: Iterable[float],
+                    rel_tol: float = 1e-6, abs_tol: float = 1e-9) -> np.ndarray:
+    """Element-wise |predicted - reference| <= abs_tol + rel_tol * |reference|; NaN never matches."""
+    predicted = np.asarray(predicted, dtype=np.float64)
+    reference = np.asarray(reference, dtype=np.float64)
+    return np.isclose(predicted, reference, rtol=rel_tol, atol=abs_tol, equal_nan=False)
+
+
+def _distribution(values: np.ndarray) -> Dict[str, float]:
+    if values.size == 0:
+        return {"mean": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def evaluate_numeric(answers: Sequence[str], references: Sequence[float],
+                     tool_calls: Optional[Sequence[int]] = None, steps: Optional[Sequence[int]] = None,
+                     rel_tol: float = 1e-6, abs_tol: float = 1e-9) -> Dict[str, Any]:
+    """Score a whole batch of final answers at once.
+
+    Extraction is a regex per answer; everything after it (comparison, error
+    and efficiency statistics) runs on NumPy arrays.
+    """
+    predicted = np.fromiter((extract_number(answer) for answer in answers), dtype=np.float64, count=len(answers))
+    reference = np.asarray(references, dtype=np.float64)
+    correct = numeric_matches(predicted, reference, rel_tol, abs_tol)
+    extracted = ~np.isnan(predicted)
+    errors = np.abs(predicted[extracted] - reference[extracted])
+
+    report: Dict[str, Any] = {
+        "examples": int(reference.size),
+        "accuracy": round(float(correct.mean()), 4) if reference.size else 0.0,
+        "extraction_failures": int((~extracted).sum()),
+        "abs_error": _distribution(errors),
+        # 转成 Python 列表，报告可以直接 json.dumps / 写入结果缓存
+        "correct": correct.tolist(),
+    }
+    if tool_calls is not None:
+        report["tool_calls"] = _distribution(np.asarray(tool_calls, dtype=np.float64))
+    if steps is not None:
+        report["steps"] = _distribution(np.asarray(steps, dtype=np.float64))
+    return report
+
+
+def numeric_correctness(inputs: dict, outputs: dict, reference_outputs: dict) -> List[Dict[str, Any]]:
+    """Per-example evaluator for local_eval.EvaluationRunner.
+
+    Expects outputs {"answer": str, "tool_calls"?: int, "steps"?: int} and
+    reference_outputs {"answer": number}.
+    """
+    predicted = extract_number(str(outputs.get("answer", "")))
+    correct = bool(numeric_matches([predicted], [float(reference_outputs["answer"])])[0])
+    feedback = [{
+        "key": "numeric_correctness",
+        "score": correct,
+        "comment": f"extracted {predicted} vs reference {reference_outputs['answer']}",
+    }]
+    for key in ("tool_calls", "steps"):
+        if key in outputs:
+            feedback.append({"key": key, "score": outputs[key], "comment": None})
+    return feedback
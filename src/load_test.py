@@ -0,0 +1,153 @@
+"""
+src/main.py 的压测脚本（只用标准库）
+
+    python src/main.py --workers 8 --fake-llm 0.2 &
+    python src/load_test.py --concurrency 50 --requests 200
+
+每个虚拟用户循环发起 /ask 请求并读完整个 NDJSON 流，统计首个事件延迟、
+总延迟、事件数和吞吐。--slow-read 让客户端每读一个事件就停顿，用来观察
+服务端的背压；--disconnect-after N 在读到 N 个事件后断开，再用
+last_event_id 续传，检查续传后能收到完整结果；--abandon-after N 断开后不再
+续传，用来观察服务端在 --cancel-grace 之后取消运行（见 /healthz 的 cancellation）。
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+QUESTIONS = ["计算 25 + 37 是多少？", "100 除以 4 然后乘以 8 等于多少？", "帮我算一下 15 * 6 + 10"]
+
+
+@dataclass
+class Results:
+    ttfb: List[float] = field(default_factory=list)
+    latency: List[float] = field(default_factory=list)
+    events: int = 0
+    completed: int = 0
+    resumed: int = 0
+    abandoned: int = 0
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def stream(host: str, port: int, path: str, slow_read: float, stop_after: Optional[int] = None
+                 ) -> Tuple[float, List[dict]]:
+    """请求一个 NDJSON 流，返回（首个事件延迟, 事件列表）"""
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/x-ndjson\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        if b" 200 " not in status_line:
+            raise RuntimeError(status_line.decode(errors="replace").strip())
+        await reader.readuntil(b"\r\n\r\n")
+        ttfb = None
+        events = []
+        async for line in reader:
+            event = json.loads(line)
+            if event["type"] == "keepalive":
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            events.append(event)
+            if stop_after is not None and len(events) >= stop_after:
+                break
+            if slow_read:
+                await asyncio.sleep(slow_read)
+        return ttfb or 0.0, events
+    finally:
+        writer.close()
+
+
+async def user(host: str, port: int, args: argparse.Namespace, counter: List[int], results: Results) -> None:
+    while counter[0] < args.requests:
+        counter[0] += 1
+        question = QUESTIONS[counter[0] % len(QUESTIONS)]
+        started = time.perf_counter()
+        try:
+            ttfb, events = await stream(host, port, f"/ask?format=ndjson&q={quote(question)}", args.slow_read,
+                                        args.abandon_after or args.disconnect_after)
+            if args.abandon_after is not None and events and events[-1]["type"] != "done":
+                results.abandoned += 1
+                continue
+            if args.disconnect_after is not None and events and events[-1]["type"] != "done":
+                last_id = next((event["id"] for event in reversed(events) if "id" in event), "")
+                session_id = events[0]["data"]["session_id"]
+                _, rest = await stream(host, port, f"/sessions/{session_id}/events?format=ndjson"
+                                                   f"&last_event_id={quote(last_id)}", args.slow_read)
+                ids = {event.get("id") for event in events}
+                if ids & {event.get("id") for event in rest if "id" in event}:
+                    results.error("duplicate_after_resume")
+                events += rest
+                results.resumed += 1
+            results.ttfb.append(ttfb)
+            results.latency.append(time.perf_counter() - started)
+            results.events += len(events)
+            if events and events[-1]["type"] == "done":
+                results.completed += 1
+            else:
+                results.error("incomplete")
+        except Exception as e:
+            results.error(type(e).__name__)
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(args: argparse.Namespace) -> None:
+    results = Results()
+    counter = [0]
+    started = time.perf_counter()
+    await asyncio.gather(*(user(args.host, args.port, args, counter, results) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    print(f"requests {args.requests}, concurrency {args.concurrency}, elapsed {elapsed:.2f}s "
+          f"({len(results.latency) / elapsed:.1f} req/s, {results.events / elapsed:.1f} events/s)")
+    print(f"completed {results.completed}, resumed {results.resumed}, abandoned {results.abandoned}, "
+          f"errors {results.errors or 0}")
+    for name, values in (("first event", results.ttfb), ("total", results.latency)):
+        if values:
+            print(f"{name:>12}: p50 {statistics.median(values) * 1000:8.1f} ms   "
+                  f"p95 {percentile(values, 0.95) * 1000:8.1f} ms   max {max(values) * 1000:8.1f} ms")
+
+    _, health = await fetch_json(args.host, args.port, "/healthz")
+    print(f"server: {health}")
+
+
+async def fetch_json(host: str, port: int, path: str) -> Tuple[int, dict]:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--slow-read", type=float, default=0.0, help="seconds to pause after each event")
+    parser.add_argument("--disconnect-after", type=int, default=None,
+                        help="disconnect after N events and resume with last_event_id")
+    parser.add_argument("--abandon-after", type=int, default=None,
+                        help="disconnect after N events and never come back")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+"""
+流式 Agent 的 HTTP 入口（asyncio.start_server，不依赖 web 框架）
+
+    python src/main.py --port 8000 --workers 4
+
+接口:
+    GET  /ask?q=...             开始一次问答（EventSource 只能发 GET）
+    POST /ask {"question": ...} 同上
+    GET  /sessions/<id>/events  从存储中回放会话消息，会话仍在进行时继续轮询
+    GET  /sessions/<id>         会话总结（StreamingAPI.get_session_history）
+    GET  /healthz               运行统计
+
+Accept: text/event-stream 或 ?format=sse 时返回 SSE，否则返回 NDJSON。
+SSE 事件 id 为 "<session_id>/<message_id>"：浏览器断线重连时会带上
+Last-Event-ID，请求 /ask 会改为从存储续传，不会重新提问。NDJSON 客户端用
+?last_event_id= 达到同样效果。
+
+同步的 Agent 在线程池（--workers）中运行，每个连接一个有界 asyncio.Queue
+（--queue-size）：客户端读得慢时生产线程阻塞在 put 上，不会无限堆积消息。
+空闲超过 --keepalive 秒时发送心跳。
+
+客户端断开后运行不会立刻停止：--cancel-grace 秒内有续传连接接上就继续，
+否则取消运行（中断进行中的LLM请求，会话记为 cancelled）。
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from agents.api import StreamingAPI
+from agents.cancellation import CancellationToken
+from agents.models import ConversationSession, StreamMessage
+
+FINISHED_STATUSES = ("completed", "error", "cancelled")
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 64 * 1024
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: Dict[str, str]
+    headers: Dict[str, str]
+    body: bytes = b""
+
+    def param(self, name: str, header: Optional[str] = None) -> Optional[str]:
+        return self.query.get(name) or (self.headers.get(header) if header else None)
+
+
+async def read_request(reader: asyncio.StreamReader) -> Request:
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.LimitOverrunError:
+        raise HttpError(431, "request headers too large")
+    except asyncio.IncompleteReadError:
+        raise ConnectionResetError("client closed before sending a request")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length < 0:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    url = urlsplit(target)
+    query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    return Request(method.upper(), url.path, query, headers, body)
+
+
+@dataclass
+class StreamFormat:
+    """SSE 和 NDJSON 的编码"""
+    sse: bool
+
+    @property
+    def content_type(self) -> str:
+        return "text/event-stream; charset=utf-8" if self.sse else "application/x-ndjson; charset=utf-8"
+
+    def event(self, payload: Dict[str, Any], event_id: Optional[str] = None, name: Optional[str] = None) -> bytes:
+        data = json.dumps(payload, ensure_ascii=False)
+        if not self.sse:
+            if event_id:
+                payload = dict(payload, id=event_id)
+                data = json.dumps(payload, ensure_ascii=False)
+            return (data + "\n").encode("utf-8")
+        lines = []
+        if event_id:
+            lines.append(f"id: {event_id}")
+        if name:
+            lines.append(f"event: {name}")
+        lines.append(f"data: {data}")
+        return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+    def keepalive(self) -> bytes:
+        return b": keep-alive\n\n" if self.sse else b'{"type": "keepalive"}\n'
+
+
+def parse_event_id(event_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """"<session_id>/<message_id>" -> (session_id, message_id)"""
+    if not event_id:
+        return None, None
+    session_id, _, message_id = event_id.partition("/")
+    return session_id or None, message_id or None
+
+
+@dataclass
+class ServerStats:
+    connections: int = 0
+    runs_started: int = 0
+    runs_waiting: int = 0
+    runs_active: int = 0
+    runs_finished: int = 0
+    resumes: int = 0
+    disconnects: int = 0
+    backpressure_waits: int = 0
+    events_sent: int = 0
+    started_at: float = field(default_factory=time.time)
+    # 计数同时由事件循环和工作线程修改
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, **deltas: int) -> None:
+        with self._lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {name: value for name, value in vars(self).items() if not name.startswith("_")}
+
+
+class StreamServer:
+    """把 StreamingAPI 暴露为 SSE / NDJSON 流"""
+
+    def __init__(self, api: StreamingAPI, workers: int = 4, queue_size: int = 32, keepalive: float = 15.0,
+                 poll_interval: float = 0.5, cancel_grace: float = 5.0):
+        self.api = api
+        self.workers = workers
+        self.queue_size = queue_size
+        self.keepalive = keepalive
+        self.poll_interval = poll_interval
+        self.cancel_grace = cancel_grace
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent-worker")
+        self.stats = ServerStats()
+        # 本进程中正在运行的会话、正在接收它的连接数、断开后等待取消的定时器
+        self.runs: Dict[str, CancellationToken] = {}
+        self.watchers: Dict[str, int] = {}
+        self.pending_cancels: Dict[str, asyncio.TimerHandle] = {}
+
+    @property
+    def storage(self):
+        return self.api.agent.storage.storage
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.stats.add(connections=1)
+        try:
+            request = await read_request(reader)
+            await self.route(request, reader, writer)
+        except HttpError as e:
+            await self.send_json(writer, e.status, {"error": e.message})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.stats.add(disconnects=1)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def route(self, request: Request, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        parts = [part for part in request.path.split("/") if part]
+        if parts == ["healthz"]:
+            await self.send_json(writer, 200, self.health())
+        elif parts == ["ask"] and request.method in ("GET", "POST"):
+            fmt = self.stream_format(request)
+            session_id, message_id = parse_event_id(request.param("last_event_id", "last-event-id"))
+            if session_id:
+                await self.resume(reader, writer, fmt, session_id, message_id)
+            else:
+                await self.ask(reader, writer, fmt, self.question(request))
+        elif len(parts) == 3 and parts[0] == "sessions" and parts[2] == "events" and request.method == "GET":
+            _, message_id = parse_event_id(request.param("last_event_id", "last-event-id"))
+            await self.resume(reader, writer, self.stream_format(request), parts[1], message_id)
+        elif len(parts) == 2 and parts[0] == "sessions" and request.method == "GET":
+            history = await asyncio.to_thread(self.api.get_session_history, parts[1])
+            await self.send_json(writer, 404 if "error" in history else 200, history)
+        else:
+            raise HttpError(404, "not found")
+
+    @staticmethod
+    def stream_format(request: Request) -> StreamFormat:
+        requested = request.query.get("format")
+        if requested:
+            return StreamFormat(sse=requested == "sse")
+        return StreamFormat(sse="text/event-stream" in request.headers.get("accept", ""))
+
+    @staticmethod
+    def question(request: Request) -> str:
+        question = request.query.get("q")
+        if request.method == "POST" and request.body:
+            try:
+                question = json.loads(request.body).get("question", question)
+            except (json.JSONDecodeError, AttributeError):
+                raise HttpError(400, "body must be a JSON object")
+        if not question or not str(question).strip():
+            raise HttpError(400, "missing question")
+        return str(question)
+
+    def health(self) -> Dict[str, Any]:
+        stats = self.stats.snapshot()
+        stats["uptime_s"] = round(time.time() - stats.pop("started_at"), 1)
+        stats["workers"] = self.workers
+        stats["cancellation"] = self.api.agent.cancel_metrics.snapshot()
+        return stats
+
+    def attach(self, session_id: str) -> None:
+        self.watchers[session_id] = self.watchers.get(session_id, 0) + 1
+        pending = self.pending_cancels.pop(session_id, None)
+        if pending is not None:
+            pending.cancel()
+
+    def detach(self, session_id: str) -> None:
+        """最后一个连接离开时，宽限期后取消仍在运行的会话"""
+        self.watchers[session_id] -= 1
+        if self.watchers[session_id] > 0:
+            return
+        del self.watchers[session_id]
+        token = self.runs.get(session_id)
+        if token is None:
+            return
+
+        def cancel() -> None:
+            self.pending_cancels.pop(session_id, None)
+            token.cancel("client disconnected")
+
+        if self.cancel_grace > 0:
+            self.pending_cancels[session_id] = asyncio.get_running_loop().call_later(self.cancel_grace, cancel)
+        else:
+            cancel()
+
+    # -- 问答 ----------------------------------------------------------
+
+    def _put(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, item: Tuple[str, Any],
+             closed: threading.Event) -> bool:
+        """在工作线程中把事件放入连接队列；队列满时阻塞（背压），连接关闭后放弃并返回 False"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        waited = False
+        while True:
+            try:
+                future.result(timeout=0.2)
+                return True
+            except concurrent.futures.TimeoutError:
+                if not waited:
+                    waited = True
+                    self.stats.add(backpressure_waits=1)
+                if closed.is_set():
+                    future.cancel()
+                    return False
+
+    def _produce(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue, question: str,
+                 session: ConversationSession, token: CancellationToken, closed: threading.Event) -> None:
+        self.stats.add(runs_waiting=-1, runs_active=1)
+        stream = self.api.agent.stream_process(question, session=session, cancel_token=token)
+        try:
+            for message in stream:
+                # 连接断开后继续运行（消息已写入存储，续传连接从存储读取），直到被取消
+                if not closed.is_set():
+                    self._put(loop, queue, ("message", message), closed)
+        except Exception as e:
+            self._put(loop, queue, ("error", f"{type(e).__name__}: {e}"), closed)
+        finally:
+            stream.close()
+            self.runs.pop(session.session_id, None)
+            self.stats.add(runs_active=-1, runs_finished=1)
+            self._put(loop, queue, ("end", None), closed)
+
+    @staticmethod
+    def _report_run_failure(run: asyncio.Future) -> None:
+        """_produce 自身出错（例如在 finally 中）时打印异常，不让它随 future 一起丢失"""
+        if not run.cancelled() and run.exception() is not None:
+            error = run.exception()
+            print(f"Agent run failed: {type(error).__name__}: {error}", file=sys.stderr)
+            traceback.print_exception(error)
+
+    async def ask(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, fmt: StreamFormat,
+                  question: str) -> None:
+        session = await asyncio.to_thread(self.api.agent.storage.create_session, question)
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        closed = threading.Event()
+        token = CancellationToken()
+        self.runs[session.session_id] = token
+        self.attach(session.session_id)
+        self.stats.add(runs_started=1, runs_waiting=1)
+        run = loop.run_in_executor(self.executor, self._produce, loop, queue, question, session, token, closed)
+        run.add_done_callback(self._report_run_failure)
+
+        disconnected = asyncio.ensure_future(reader.read())
+        try:
+            await self.start_stream(writer, fmt)
+            await self.send(writer, fmt.event({"type": "session", "data": {"session_id": session.session_id}},
+                                              name="session"))
+            while True:
+                item = await self.next_item(queue, disconnected, writer, fmt)
+                kind, value = item
+                if kind == "end":
+                    break
+                if kind == "error":
+                    await self.send(writer, fmt.event({"type": "error", "data": {"error": value}}, name="error"))
+                    continue
+                await self.send_message(writer, fmt, session.session_id, value)
+            await self.send_done(writer, fmt, session.session_id)
+        finally:
+            # 正常结束、客户端断开或处理任务被取消都会走到这里
+            closed.set()
+            disconnected.cancel()
+            self.detach(session.session_id)
+
+    async def next_item(self, queue: asyncio.Queue, disconnected: asyncio.Future, writer: asyncio.StreamWriter,
+                        fmt: StreamFormat) -> Tuple[str, Any]:
+        """等待下一条事件；空闲时发送心跳，客户端断开时抛出 ConnectionResetError"""
+        getter = asyncio.ensure_future(queue.get())
+        try:
+            while True:
+                done, _ = await asyncio.wait({getter, disconnected}, timeout=self.keepalive,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    return getter.result()
+                if disconnected in done:
+                    raise ConnectionResetError("client disconnected")
+                await self.send(writer, fmt.keepalive())
+        finally:
+            getter.cancel()
+
+    # -- 续传 ----------------------------------------------------------
+
+    async def resume(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, fmt: StreamFormat,
+                     session_id: str, last_message_id: Optional[str]) -> None:
+        session = await asyncio.to_thread(self.storage.get_session, session_id)
+        if session is None:
+            raise HttpError(404, "session not found")
+        self.stats.add(resumes=1)
+        seen = set()
+        if last_message_id and any(message.id == last_message_id for message in session.messages):
+            for message in session.messages:
+                seen.add(message.id)
+                if message.id == last_message_id:
+                    break
+
+        disconnected = asyncio.ensure_future(reader.read())
+        self.attach(session_id)
+        try:
+            await self.start_stream(writer, fmt)
+            idle_since = time.monotonic()
+            while True:
+                for message in session.messages:
+                    if message.id not in seen:
+                        seen.add(message.id)
+                        await self.send_message(writer, fmt, session_id, message)
+                        idle_since = time.monotonic()
+                if session.status in FINISHED_STATUSES:
+                    await self.send_done(writer, fmt, session_id, session.status)
+                    return
+                # 会话仍在其他连接/进程中运行：轮询存储
+                await asyncio.wait({disconnected}, timeout=self.poll_interval)
+                if disconnected.done():
+                    raise ConnectionResetError("client disconnected")
+                if time.monotonic() - idle_since >= self.keepalive:
+                    await self.send(writer, fmt.keepalive())
+                    idle_since = time.monotonic()
+                session = await asyncio.to_thread(self.storage.get_session, session_id)
+        finally:
+            disconnected.cancel()
+            self.detach(session_id)
+
+    # -- 输出 ----------------------------------------------------------
+
+    @staticmethod
+    async def send(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(data)
+        await writer.drain()
+
+    async def start_stream(self, writer: asyncio.StreamWriter, fmt: StreamFormat) -> None:
+        head = (
+            "HTTP/1.1 200 OK\r\n"
+            f"Content-Type: {fmt.content_type}\r\n"
+            "Cache-Control: no-cache\r\n"
+            "X-Accel-Buffering: no\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        await self.send(writer, head.encode("latin-1") + (b"retry: 2000\n\n" if fmt.sse else b""))
+
+    async def send_message(self, writer: asyncio.StreamWriter, fmt: StreamFormat, session_id: str,
+                           message: StreamMessage) -> None:
+        await self.send(writer, fmt.event(self.api.stream_payload(message), event_id=f"{session_id}/{message.id}"))
+        self.stats.add(events_sent=1)
+
+    async def send_done(self, writer: asyncio.StreamWriter, fmt: StreamFormat, session_id: str,
+                        status: Optional[str] = None) -> None:
+        if status is None:
+            session = await asyncio.to_thread(self.storage.get_session, session_id)
+            status = session.status if session else "unknown"
+        await self.send(writer, fmt.event({"type": "done", "data": {"session_id": session_id, "status": status}},
+                                          name="done"))
+
+    async def send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+                  431: "Request Header Fields Too Large"}.get(status, "Error")
+        head = (
+            f"HTTP/1.1 {status} {reason}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n"
+        )
+        try:
+            await self.send(writer, head.encode("latin-1") + body)
+        except ConnectionError:
+            self.stats.add(disconnects=1)
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER_BYTES)
+        addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets)
+        print(f"Serving on {addresses} with {self.workers} workers")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def use_fake_llm(api: StreamingAPI, latency: float) -> None:
+    """用固定回答的假模型替换 LLM，压测服务本身时不消耗 token"""
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    answer = "这是一个用于压测的固定回答。"
+    # 流式调用时 sleep 作用于每个字符
+    api.agent.model = FakeListChatModel(responses=[answer], sleep=latency / len(answer))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Streaming agent HTTP server (SSE / NDJSON)")
+    parser.add_argument("--host", default=os.getenv("AGENT_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AGENT_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("AGENT_WORKERS", "4")),
+                        help="concurrent agent runs (thread pool size)")
+    parser.add_argument("--queue-size", type=int, default=int(os.getenv("AGENT_QUEUE_SIZE", "32")),
+                        help="buffered events per connection before the agent thread blocks")
+    parser.add_argument("--keepalive", type=float, default=float(os.getenv("AGENT_KEEPALIVE", "15")),
+                        help="seconds of silence before a keep-alive is sent")
+    parser.add_argument("--cancel-grace", type=float, default=float(os.getenv("AGENT_CANCEL_GRACE", "5")),
+                        help="seconds a run keeps going after its client disconnects, waiting for a resume")
+    parser.add_argument("--storage-dir", default=os.getenv("AGENT_STORAGE_DIR", "data"))
+    parser.add_argument("--fake-llm", type=float, metavar="SECONDS", default=None,
+                        help="replace the LLM with a canned answer taking SECONDS (load testing)")
+    args = parser.parse_args()
+
+    api = StreamingAPI(args.storage_dir)
+    if args.fake_llm is not None:
+        use_fake_llm(api, args.fake_llm)
+    server = StreamServer(api, workers=args.workers, queue_size=args.queue_size, keepalive=args.keepalive,
+                          cancel_grace=args.cancel_grace)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Sequential vs fanned-out vs cached search latency, using the offline stub backend.
+
+Usage:
+    python bench_search.py [--queries 6] [--latency 0.3] [--workers 4]
+"""
+import argparse
+import time
+
+from search_service import SearchService, StubBackend
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.3, help="simulated backend latency in seconds")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    queries = [f"LangGraph feature {i}" for i in range(args.queries)]
+
+    sequential = SearchService(StubBackend(latency=args.latency), max_workers=args.workers)
+    started = time.perf_counter()
+    for query in queries:
+        sequential.search(query)
+    print(f"sequential   {time.perf_counter() - started:8.3f}s  {sequential.stats()['query']}")
+
+    service = SearchService(StubBackend(latency=args.latency), max_workers=args.workers)
+    service.search_batch(queries)
+    print(f"batch        {service.batch_latencies[-1]:8.3f}s  {service.stats()['query']}")
+
+    # 大小写和标点不同的同一批查询命中缓存
+    service.search_batch([query.upper() + "?" for query in queries])
+    stats = service.stats()
+    print(f"cached batch {service.batch_latencies[-1]:8.3f}s  hits={stats['hits']} misses={stats['misses']} "
+          f"backend calls={service.backend.calls}")
+
+    sequential.close()
+    service.close()
+
+
+if __name__ == "__main__":
+    main()
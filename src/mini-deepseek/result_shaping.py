@@ -0,0 +1,123 @@
+import re
+from typing import Any, Dict, Iterable, List, Sequence, Set, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+_SHOWN = re.compile(r"^URL: (?P<url>\S+)\nContent: (?P<content>.*)$", re.MULTILINE)
+
+# estimate_tokens 和 shingle 是 src/langgraph/agents 里 token_count / rag_context 的原样拷贝：
+# 脚本在各自目录下单独运行（mini-deepseek 也不是合法的包名），不能跨目录导入
+
+# CJK 字符基本上一个字就是一个 token，英文单词大约 4 个字符一个 token
+_CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_WORD_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of text locally, without calling a tokenizer service."""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    tokens = cjk
+    for word in _WORD_PATTERN.findall(text):
+        tokens += max(1, (len(word) + 3) // 4)
+    return tokens
+
+
+def normalize_url(url: str) -> str:
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower().removeprefix("www."), path, parts.query, ""))
+
+
+def shingle(text: str, size: int = 5) -> Set[str]:
+    """Character shingles, which work for both Chinese and English text."""
+    compact = "".join(text.split())
+    if len(compact) <= size:
+        return {compact} if compact else set()
+    return {compact[i:i + size] for i in range(len(compact) - size + 1)}
+
+
+def overlap(a: Set[str], b: Set[str]) -> float:
+    """Fraction of the smaller shingle set found in the other (a clipped copy still counts as a duplicate)."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def clip_to_tokens(text: str, budget: int) -> str:
+    """Cut text to about `budget` tokens, preferring a sentence boundary."""
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= budget:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    clipped = text[:low]
+    boundary = max(clipped.rfind(mark) for mark in (". ", "。", "! ", "? ", "！", "？"))
+    if boundary > low // 2:
+        clipped = clipped[:boundary + 1]
+    return clipped.rstrip() + " …"
+
+
+def shown_results(contents: Iterable[str]) -> Tuple[Set[str], List[str]]:
+    """URLs and snippets of search results already shown in earlier tool messages."""
+    urls, texts = set(), []
+    for content in contents:
+        for match in _SHOWN.finditer(content):
+            urls.add(normalize_url(match.group("url")))
+            texts.append(match.group("content"))
+    return urls, texts
+
+
+class ResultShaper:
+    """Trim raw search results before they reach the model.
+
+    Results are ordered by score; results whose URL was already shown, or
+    whose snippet mostly overlaps an earlier snippet (shingle overlap >=
+    `duplicate_threshold`), are dropped; each remaining snippet is clipped
+    to `per_result_tokens`. Sizes before and after are accumulated so the
+    savings can be reported.
+    """
+
+    def __init__(self, per_result_tokens: int = 120, max_results: int = 5, duplicate_threshold: float = 0.7):
+        self.per_result_tokens = per_result_tokens
+        self.max_results = max_results
+        self.duplicate_threshold = duplicate_threshold
+        self.raw_chars = 0
+        self.shaped_chars = 0
+        self.dropped_duplicates = 0
+
+    def shape(self, results: Sequence[Dict[str, Any]], seen_urls: Set[str], seen_texts: List[str]) -> List[Dict[str, Any]]:
+        """Return the results to show. seen_urls / seen_texts are extended with what is kept."""
+        seen_shingles = [shingle(text.lower()) for text in seen_texts]
+        kept = []
+        for result in sorted(results, key=lambda r: r.get("score") or 0.0, reverse=True):
+            self.raw_chars += len(result.get("title", "")) + len(result.get("url", "")) + len(result.get("content", ""))
+            url = normalize_url(result.get("url", ""))
+            content_shingles = shingle(result.get("content", "").lower())
+            if url in seen_urls or any(
+                overlap(content_shingles, seen) >= self.duplicate_threshold for seen in seen_shingles
+            ):
+                self.dropped_duplicates += 1
+                continue
+            if len(kept) >= self.max_results:
+                continue
+            shaped = dict(result, content=clip_to_tokens(result.get("content", ""), self.per_result_tokens))
+            kept.append(shaped)
+            seen_urls.add(url)
+            seen_texts.append(shaped["content"])
+            seen_shingles.append(content_shingles)
+            self.shaped_chars += len(shaped.get("title", "")) + len(shaped.get("url", "")) + len(shaped["content"])
+        return kept
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "raw_chars": self.raw_chars,
+            "shaped_chars": self.shaped_chars,
+            "saved": round(1 - self.shaped_chars / self.raw_chars, 3) if self.raw_chars else 0.0,
+            "dropped_duplicates": self.dropped_duplicates,
+        }
@@ -0,0 +1,155 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+# src/langgraph/agents/rag_context.normalize_query 的原样拷贝（脚本目录之间不能互相导入）
+_POSSESSIVE = re.compile(r"['’]s\b")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a retrieval query, so trivially different phrasings compare equal."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = _POSSESSIVE.sub("", text)
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+
+class TavilyBackend:
+    """One TavilySearch client, created once and reused for every query."""
+
+    def __init__(self, api_key: str, max_results: int = 3, topic: str = "general"):
+        from langchain_tavily import TavilySearch
+
+        self.client = TavilySearch(api_key=api_key, max_results=max_results, topic=topic)
+
+    def search(self, query: str) -> Dict[str, Any]:
+        return self.client.invoke(query)
+
+
+class StubBackend:
+    """Offline backend returning deterministic Tavily-shaped results, for tests and benchmarks."""
+
+    def __init__(self, max_results: int = 3, latency: float = 0.0,
+                 results: Optional[Callable[[str], List[Dict[str, Any]]]] = None):
+        self.max_results = max_results
+        self.latency = latency
+        self.results = results or self._fake_results
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _fake_results(self, query: str) -> List[Dict[str, Any]]:
+        digest = hashlib.sha1(normalize_query(query).encode("utf-8")).hexdigest()[:8]
+        return [
+            {
+                "title": f"Result {i + 1} for {query}",
+                "url": f"https://example.com/{digest}/{i + 1}",
+                "content": f"Stub content {i + 1} about {query}.",
+                "score": round(1.0 - i * 0.1, 2),
+                "raw_content": None,
+            }
+            for i in range(self.max_results)
+        ]
+
+    def search(self, query: str) -> Dict[str, Any]:
+        with self._lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {"query": query, "results": self.results(query), "response_time": self.latency}
+
+
+class SearchService:
+    """Search front end: TTL cache on the normalized query plus concurrent batch fan-out.
+
+    Latencies are recorded per query (cache hits included) and per batch;
+    `stats()` summarizes them.
+    """
+
+    def __init__(self, backend, ttl_seconds: float = 300.0, maxsize: int = 256, max_workers: int = 4):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.maxsize = maxsize
+        self._cache: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self.hits = 0
+        self.misses = 0
+        self.query_latencies: List[float] = []
+        self.batch_latencies: List[float] = []
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            stored_at, response = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return response
+
+    def _store(self, key: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            self._cache[key] = (time.monotonic(), response)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def search(self, query: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        key = normalize_query(query)
+        response = self._cached(key)
+        if response is None:
+            response = self.backend.search(query)
+            self._store(key, response)
+            with self._lock:
+                self.misses += 1
+        else:
+            with self._lock:
+                self.hits += 1
+        with self._lock:
+            self.query_latencies.append(time.perf_counter() - started)
+        return response
+
+    def search_batch(self, queries: Sequence[str]) -> List[Dict[str, Any]]:
+        """Run several queries concurrently; queries that normalize to the same key are searched once."""
+        started = time.perf_counter()
+        unique: Dict[str, str] = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        futures = {key: self._pool.submit(self.search, query) for key, query in unique.items()}
+        responses = [futures[normalize_query(query)].result() for query in queries]
+        with self._lock:
+            self.batch_latencies.append(time.perf_counter() - started)
+        return responses
+
+    def stats(self) -> Dict[str, Any]:
+        def summary(values: List[float]) -> Dict[str, float]:
+            if not values:
+                return {"count": 0, "avg_ms": 0.0, "max_ms": 0.0}
+            return {
+                "count": len(values),
+                "avg_ms": round(sum(values) / len(values) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2),
+            }
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "query": summary(self.query_latencies),
+                "batch": summary(self.batch_latencies),
+            }
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
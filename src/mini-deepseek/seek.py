@@ -8,11 +8,14 @@ from langchain_openai import ChatOpenAI
 from langchain_core.tools import tool
 from langgraph.graph.message import add_messages
 from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from langchain_tavily import TavilySearch
+from langgraph.prebuilt import ToolNode, InjectedState
 from pydantic import SecretStr
 import os
 
+from search_service import SearchService, StubBackend, TavilyBackend
+from result_shaping import ResultShaper, shown_results
+import time
+
 
 load_dotenv()
 
@@ -22,26 +25,37 @@ OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
 if not OPENAI_API_KEY or not OPENAI_BASE_URL:
     raise ValueError("Please set OPENAI_API_KEY and OPENAI_BASE_URL in your environment variables.")
 
+SEARCH_BACKEND = os.getenv("SEEK_SEARCH_BACKEND", "tavily")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
-if not TAVILY_API_KEY:
-    raise ValueError("Please set TAVILY_API_KEY in your environment variables.")
+if SEARCH_BACKEND == "tavily" and not TAVILY_API_KEY:
+    raise ValueError("Please set TAVILY_API_KEY in your environment variables (or SEEK_SEARCH_BACKEND=stub).")
 
 class AgentState(TypedDict):
     """State of the agent, containing messages."""
     messages: Annotated[Sequence[BaseMessage], add_messages]
 
-@tool()
-def search(query: str) -> str:
-    """Search for a query using TVLY."""
+# 客户端只创建一次并复用；结果按规范化后的查询缓存，SEEK_SEARCH_BACKEND=stub 时完全离线
+search_service = SearchService(
+    StubBackend() if SEARCH_BACKEND == "stub" else TavilyBackend(TAVILY_API_KEY, max_results=3, topic="general"),
+    ttl_seconds=float(os.getenv("SEEK_CACHE_TTL", "300")),
+    max_workers=int(os.getenv("SEEK_SEARCH_WORKERS", "4")),
+)
 
-    tavily_client = TavilySearch(
-                api_key=TAVILY_API_KEY,
-                max_results=3,
-                topic="general"
-            )
-    
-    response = tavily_client.invoke(query)    
+# 返回给模型前：按分数排序、去掉本次对话里已经出现过的 URL 和近似重复的片段、每条截断到 token 预算
+result_shaper = ResultShaper(
+    per_result_tokens=int(os.getenv("SEEK_RESULT_TOKENS", "120")),
+    max_results=int(os.getenv("SEEK_MAX_RESULTS", "5")),
+)
+
+def shown_in_conversation(state: dict) -> tuple[set, list]:
+    return shown_results(
+        str(message.content)
+        for message in state.get("messages", [])
+        if isinstance(message, ToolMessage) and message.name in ("search", "search_many")
+    )
+
+def format_results(response: dict, seen_urls: set, seen_texts: list) -> str:
     # response's structure is:
             # {
             #     'query': 'What happened at the last wimbledon',
@@ -57,28 +71,51 @@ def search(query: str) -> str:
             #     'response_time': 1.31
             # }
     
+    if not response['results']:
+        return "No relevant results found."
+
     final_result = ""
-    for result in response['results']:
+    for result in result_shaper.shape(response['results'], seen_urls, seen_texts):
         final_result += f"Title: {result['title']}\nURL: {result['url']}\nContent: {result['content']}\n\n"
     
     if not final_result:
-        return "No relevant results found."
+        return "All results for this query were already shown earlier in this conversation."
     
     return final_result
 
+@tool()
+def search(query: str, state: Annotated[dict, InjectedState]) -> str:
+    """Search for a query using TVLY."""
+    return format_results(search_service.search(query), *shown_in_conversation(state))
+
+@tool()
+def search_many(queries: list[str], state: Annotated[dict, InjectedState]) -> str:
+    """Search several independent queries at once. Prefer this over repeated 'search' calls."""
+    responses = search_service.search_batch(queries)
+    seen_urls, seen_texts = shown_in_conversation(state)
+    return "\n".join(
+        f"### {query}\n{format_results(response, seen_urls, seen_texts)}" for query, response in zip(queries, responses)
+    )
 
-tools = [search]
+
+tools = [search, search_many]
 
 model = ChatOpenAI(api_key=SecretStr(OPENAI_API_KEY), base_url=OPENAI_BASE_URL, model="gpt-4.1-mini", temperature=0.7).bind_tools(tools)
 
 
+# 每次调用模型的耗时和上下文里工具结果的字符数，用来观察结果裁剪的效果
+llm_calls: list[dict] = []
+
 def model_call(state: AgentState) -> AgentState:
     
     system_message = SystemMessage(
         content="You are a helpful assistant that MUST use the search tool to answer ALL questions. Always search for current information before responding, even for general knowledge questions."
     )
     final_messages = [system_message] + list(state["messages"])
+    tool_chars = sum(len(str(m.content)) for m in state["messages"] if isinstance(m, ToolMessage))
+    started = time.perf_counter()
     response = model.invoke(final_messages)
+    llm_calls.append({"latency_ms": round((time.perf_counter() - started) * 1000, 1), "tool_chars": tool_chars})
     return AgentState(
         messages= [response]
     )
@@ -123,6 +160,9 @@ def print_stream(stream):
 
 inputs = AgentState(messages=[HumanMessage(content="What is the latest version of LangGraph and what new features does it have?")])
 print_stream(agent.stream(inputs, stream_mode="values"))
+print(f"🔎 search: {search_service.stats()}")
+print(f"✂️ results: {result_shaper.stats()}")
+print(f"⏱️ llm calls: {llm_calls}")
 
 #  AgentState a= new AgentState()
 # List<BaseMessages> message = new ArrarList();
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# src 下的脚本目录互相按文件名导入（python RAG_Agent.py 的方式），测试时把这些目录加到 sys.path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for script_dir in ("src", "src/langgraph/agents", "src/langsmith", "src/langchain", "src/mini-deepseek"):
+    path = os.path.join(ROOT, script_dir)
+    if path not in sys.path:
+        sys.path.insert(0, path)
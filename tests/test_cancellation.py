@@ -0,0 +1,29 @@
+import os
+
+import pytest
+
+# agents 在导入时检查 OPENAI_API_KEY，这些测试不会调用模型
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from agents.cancellation import Cancelled, CancellationMetrics, CancellationToken
+
+
+def test_token_keeps_first_reason():
+    token = CancellationToken()
+    token.raise_if_cancelled()
+    token.cancel("client disconnected")
+    token.cancel("later")
+    with pytest.raises(Cancelled, match="client disconnected"):
+        token.raise_if_cancelled()
+
+
+def test_metrics_estimate_savings_from_completed_average():
+    metrics = CancellationMetrics()
+    assert metrics.snapshot()["estimated_tokens_saved"] == 0
+    metrics.record_completed(tokens=100, seconds=4.0)
+    metrics.record_completed(tokens=300, seconds=8.0)
+    metrics.record_cancelled(tokens=50, seconds=1.0, aborted_llm_call=True)
+    snapshot = metrics.snapshot()
+    assert snapshot["estimated_tokens_saved"] == 150
+    assert snapshot["estimated_seconds_saved"] == 5.0
+    assert (snapshot["cancelled_runs"], snapshot["aborted_llm_calls"]) == (1, 1)
@@ -0,0 +1,21 @@
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from chat_session import StreamingChatSession
+
+
+def test_stream_joins_chunks_and_records_stats():
+    session = StreamingChatSession(FakeListChatModel(responses=["hello there"]))
+    assert "".join(session.stream("hi")) == "hello there"
+    assert session.messages[-1] == AIMessage(content="hello there")
+    assert session.last_stats.output_tokens > 0
+
+
+def test_history_is_trimmed_to_budget_keeping_system_prompt():
+    session = StreamingChatSession(FakeListChatModel(responses=["ok " * 20]), max_history_tokens=80)
+    for i in range(10):
+        session.send(f"question number {i} " * 5)
+    assert isinstance(session.messages[0], SystemMessage)
+    assert isinstance(session.messages[1], HumanMessage)
+    assert session.messages[-2].content.startswith("question number 9")
+    assert session.last_stats.dropped_messages > 0
@@ -0,0 +1,61 @@
+import pytest
+
+from document_edits import EditError, apply_unified_diff, delete_section, insert_after, replace_range
+
+DOC = "a\nb\nc"
+
+
+def test_diff_pure_insertion_goes_after_the_given_line():
+    assert apply_unified_diff(DOC, "@@ -1,0 +2,1 @@\n+X\n") == ("a\nX\nb\nc", 2)
+
+
+def test_diff_insertion_at_start_and_end():
+    assert apply_unified_diff(DOC, "@@ -0,0 +1,1 @@\n+X\n")[0] == "X\na\nb\nc"
+    assert apply_unified_diff(DOC, "@@ -3,0 +4,1 @@\n+X\n")[0] == "a\nb\nc\nX"
+
+
+def test_diff_deletion():
+    assert apply_unified_diff(DOC, "@@ -2,1 +1,0 @@\n-b\n") == ("a\nc", 2)
+
+
+def test_diff_replacement_with_context_and_file_headers():
+    diff = "--- a/doc\n+++ b/doc\n@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n"
+    assert apply_unified_diff(DOC, diff) == ("a\nB\nc", 1)
+
+
+def test_diff_later_hunks_shift_by_earlier_line_changes():
+    text = "\n".join(f"l{i}" for i in range(1, 11))
+    diff = "@@ -2,0 +3,2 @@\n+x\n+y\n@@ -8,1 +10,1 @@\n-l8\n+L8\n"
+    lines = apply_unified_diff(text, diff)[0].split("\n")
+    assert lines[:4] == ["l1", "l2", "x", "y"]
+    assert lines[9] == "L8"
+
+
+def test_diff_tolerates_stale_line_numbers_within_fuzz():
+    text = "\n".join(f"l{i}" for i in range(1, 11))
+    assert apply_unified_diff(text, "@@ -7,1 +7,1 @@\n-l5\n+L5\n")[0].split("\n")[4] == "L5"
+
+
+def test_diff_that_does_not_match_is_rejected():
+    with pytest.raises(EditError):
+        apply_unified_diff(DOC, "@@ -1,1 +1,1 @@\n-zzz\n+y\n")
+    with pytest.raises(EditError):
+        apply_unified_diff(DOC, "not a diff")
+
+
+def test_replace_range_and_bounds():
+    assert replace_range(DOC, 2, 3, "X") == ("a\nX", 2)
+    with pytest.raises(EditError):
+        replace_range(DOC, 2, 4, "X")
+
+
+def test_insert_after_requires_a_unique_anchor():
+    assert insert_after(DOC, "b", "X") == ("a\nb\nX\nc", 3)
+    with pytest.raises(EditError):
+        insert_after("x1\nx2", "x", "y")
+
+
+def test_delete_section_stops_at_same_level_heading():
+    text = "# Intro\nhello\n## Details\nmore\n# Usage\nrest"
+    assert delete_section(text, "# Intro") == ("# Usage\nrest", 1)
+    assert delete_section(text, "## Details") == ("# Intro\nhello\n# Usage\nrest", 3)
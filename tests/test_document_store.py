@@ -0,0 +1,130 @@
+import json
+import os
+import threading
+
+import pytest
+
+from document_store import DocumentStore, VersionConflict
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocumentStore(root=str(tmp_path), max_history=4)
+    yield store
+    store.close()
+
+
+def history_lines(store, session_id):
+    with open(store._history_path(session_id), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_reload_after_evict(store):
+    for i in range(3):
+        store.commit("s", f"line {i}\nshared")
+    store.flush()
+    store.evict("s")
+    doc = store.get("s")
+    assert (doc.version, doc.content) == (3, "line 2\nshared")
+    assert store.history("s").reconstruct(1) == "line 0\nshared"
+
+
+def test_commits_append_history_instead_of_rewriting_it(store):
+    store.commit("s", "a")
+    store.flush()
+    first = history_lines(store, "s")
+    store.commit("s", "a\nb")
+    store.flush()
+    assert history_lines(store, "s")[:1] == first
+    assert len(history_lines(store, "s")) == 2
+    with open(store._path("s"), encoding="utf-8") as f:
+        assert "history" not in json.load(f)
+
+
+def test_history_trim_is_batched_and_rewrites_the_file(store):
+    for i in range(5):
+        store.commit("s", f"v{i}")
+    store.flush()
+    assert len(history_lines(store, "s")) == 5  # 超过上限但还在余量内，不重写
+    store.commit("s", "v5")
+    store.flush()
+    assert len(history_lines(store, "s")) == 4
+    store.evict("s")
+    assert [v for v, _, _ in store.history("s").versions()] == [3, 4, 5, 6]
+    assert store.history("s").reconstruct(3) == "v2"
+
+
+def test_torn_last_history_line_is_ignored(store):
+    store.commit("s", "a")
+    store.commit("s", "b")
+    store.flush()
+    store.evict("s")
+    with open(store._history_path("s"), "a", encoding="utf-8") as f:
+        f.write('{"v": 3, "t"')
+    assert store.get("s").content == "b"
+    assert len(store.history("s").entries) == 2
+
+
+def test_legacy_snapshot_with_embedded_history(store, tmp_path):
+    legacy = {"session_id": "old", "version": 1, "content": "x", "updated_at": 1.0,
+              "history": [{"v": 1, "t": 1.0, "s": ["x"]}]}
+    with open(tmp_path / "old.json", "w", encoding="utf-8") as f:
+        json.dump(legacy, f)
+    assert store.get("old").content == "x"
+    store.commit("old", "y")
+    store.flush()
+    store.evict("old")
+    assert store.history("old").reconstruct(1) == "x"
+    assert store.get("old").content == "y"
+
+
+def test_version_conflict(store):
+    store.commit("s", "a")
+    with pytest.raises(VersionConflict):
+        store.commit("s", "b", base_version=0)
+
+
+def test_slow_write_of_one_session_does_not_block_others(store):
+    store.commit("slow", "a")
+    store.flush()
+    write_lock = store._write_locks["slow"]
+    write_lock.acquire()
+    try:
+        store.commit("slow", "b")
+        store.evict("slow")
+        loaded = []
+        loader = threading.Thread(target=lambda: loaded.append(store.get("slow")))
+        loader.start()
+        loader.join(0.2)
+        assert loader.is_alive()  # 还在等 slow 的写盘
+
+        done = threading.Event()
+        threading.Thread(target=lambda: (store.commit("other", "x"), done.set())).start()
+        assert done.wait(2)
+    finally:
+        write_lock.release()
+    loader.join(2)
+    assert loaded[0].content == "b"
+
+
+def test_evict_skips_session_in_use(store):
+    store.commit("s", "a")
+    with store._session_lock("s"):
+        holder = threading.Thread(target=lambda: result.append(store.evict("s")))
+        result = []
+        holder.start()
+        holder.join()
+    assert result == [False]
+    assert store.resident_count == 1
+
+
+def test_repeated_undo_walks_back_through_versions(store):
+    for content in ("a", "b", "c"):
+        store.commit("s", content)
+    undone = []
+    while (result := store.undo("s")) is not None:
+        undone.append((result[1], result[0].content))
+    assert undone == [(2, "b"), (1, "a")]
+    store.flush()
+    store.evict("s")
+    assert store.undo("s") is None
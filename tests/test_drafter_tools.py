@@ -0,0 +1,67 @@
+import sys
+
+import pytest
+
+pytest.importorskip("langgraph.checkpoint.sqlite")
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langgraph.graph import END, START, StateGraph
+from langgraph.prebuilt import ToolNode
+
+# Drafter 和 checkpointing 在导入时读取这些环境变量并打开文档目录和 SQLite 文件
+_MODULES = ("Drafter", "checkpointing")
+
+
+@pytest.fixture(scope="module")
+def Drafter(tmp_path_factory):
+    root = tmp_path_factory.mktemp("drafter")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("OPENAI_API_KEY", "test")
+        mp.setenv("DRAFTER_DOCUMENT_DIR", str(root / "documents"))
+        mp.setenv("CHECKPOINT_DB", str(root / "checkpoints.sqlite"))
+        for name in _MODULES:
+            mp.delitem(sys.modules, name, raising=False)
+        import Drafter
+        yield Drafter
+        Drafter.checkpointer.conn.close()
+        for name in _MODULES:
+            sys.modules.pop(name, None)
+
+
+def run_tools(Drafter, thread_id, *calls):
+    graph = StateGraph(Drafter.DrafterState)
+    graph.add_node("tools", ToolNode(Drafter.tools))
+    graph.add_edge(START, "tools")
+    graph.add_edge("tools", END)
+    tool_calls = [{"name": name, "args": args, "id": f"call_{i}"} for i, (name, args) in enumerate(calls)]
+    return graph.compile().invoke(
+        {"messages": [AIMessage(content="", tool_calls=tool_calls)]},
+        {"configurable": {"thread_id": thread_id}},
+    )
+
+
+def test_two_edits_in_one_message_both_apply(Drafter):
+    Drafter.document_store.commit("parallel", "a\nb\nc")
+    result = run_tools(
+        Drafter,
+        "parallel",
+        ("replace_lines", {"start_line": 1, "end_line": 1, "text": "A"}),
+        ("insert_text_after", {"anchor": "c", "text": "d"}),
+    )
+    tool_messages = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    assert len(tool_messages) == 2
+    assert not any("failed" in str(m.content) for m in tool_messages)
+    document = Drafter.document_store.get("parallel")
+    assert document.content == "A\nb\nc\nd"
+    assert result["document_version"] == document.version == 3
+
+
+def test_repeated_undo_tool_walks_back(Drafter):
+    for content in ("one", "two", "three"):
+        Drafter.document_store.commit("undo", content)
+    run_tools(Drafter, "undo", ("undo", {}))
+    assert Drafter.document_store.get("undo").content == "two"
+    run_tools(Drafter, "undo", ("undo", {}))
+    assert Drafter.document_store.get("undo").content == "one"
+    result = run_tools(Drafter, "undo", ("undo", {}))
+    assert result["messages"][-1].content == "Nothing to undo."
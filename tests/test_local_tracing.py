@@ -0,0 +1,45 @@
+import json
+import threading
+
+from local_tracing import LocalTraceExporter
+
+
+def span(i):
+    return {"trace_id": "t", "span_id": str(i), "parent_id": None, "name": "n", "kind": "tool",
+            "start": 0.0, "duration_ms": 1.0, "error": None}
+
+
+def run_threads(target, count=8):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_counters_are_not_lost_under_concurrent_callers(tmp_path):
+    exporter = LocalTraceExporter(str(tmp_path / "traces.jsonl"), sample_rate=0.0, max_queue=0)
+
+    def submit():
+        for i in range(5000):
+            exporter.sampled()
+            exporter.export(span(i))
+
+    try:
+        run_threads(submit)
+        stats = exporter.stats()
+        assert (stats["sampled_out"], stats["dropped_full"]) == (40000, 40000)
+    finally:
+        exporter.close()
+
+
+def test_exported_spans_are_written_in_batches(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = LocalTraceExporter(str(path), batch_size=10)
+    for i in range(25):
+        exporter.export(span(i))
+    exporter.flush()
+    exporter.close()
+    assert [json.loads(line)["span_id"] for line in path.read_text().splitlines()] == [str(i) for i in range(25)]
+    stats = exporter.stats()
+    assert (stats["exported"], stats["write_errors"], stats["queued"]) == (25, 0, 0)
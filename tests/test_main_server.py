@@ -0,0 +1,68 @@
+import asyncio
+import os
+import threading
+
+import pytest
+
+# agents 在导入时检查 OPENAI_API_KEY，这些测试不会调用模型
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from main import HttpError, ServerStats, StreamFormat, parse_event_id, read_request
+
+
+def read(raw: bytes):
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await read_request(reader)
+    return asyncio.run(run())
+
+
+def test_read_request_parses_query_headers_and_body():
+    request = read(b'POST /ask?q=a&q=b HTTP/1.1\r\nContent-Length: 2\r\nAccept: text/event-stream\r\n\r\n{}')
+    assert (request.method, request.path, request.query, request.body) == ("POST", "/ask", {"q": "b"}, b"{}")
+    assert request.headers["accept"] == "text/event-stream"
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-1", b"1.5"])
+def test_read_request_rejects_invalid_content_length(length):
+    with pytest.raises(HttpError) as error:
+        read(b"POST /ask HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n")
+    assert error.value.status == 400
+
+
+def test_read_request_rejects_large_body():
+    with pytest.raises(HttpError) as error:
+        read(b"POST /ask HTTP/1.1\r\nContent-Length: 99999999\r\n\r\n")
+    assert error.value.status == 413
+
+
+def test_parse_event_id():
+    assert parse_event_id("s1/m2") == ("s1", "m2")
+    assert parse_event_id("s1") == ("s1", None)
+    assert parse_event_id(None) == (None, None)
+
+
+def test_stream_format_encodes_sse_and_ndjson():
+    assert StreamFormat(sse=True).event({"a": 1}, event_id="s/m", name="x") == b'id: s/m\nevent: x\ndata: {"a": 1}\n\n'
+    assert StreamFormat(sse=False).event({"a": 1}, event_id="s/m") == b'{"a": 1, "id": "s/m"}\n'
+
+
+def test_server_stats_updates_from_threads_do_not_drift():
+    stats = ServerStats()
+
+    def run():
+        for _ in range(5000):
+            stats.add(runs_waiting=1)
+            stats.add(runs_waiting=-1, runs_active=1)
+            stats.add(runs_active=-1, runs_finished=1)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    snapshot = stats.snapshot()
+    assert (snapshot["runs_waiting"], snapshot["runs_active"], snapshot["runs_finished"]) == (0, 0, 40000)
+    assert "_lock" not in snapshot
@@ -0,0 +1,40 @@
+"""The script directories cannot import each other, so a few helpers are copied verbatim.
+
+These tests keep the copies in step with the canonical versions in src/langgraph/agents.
+"""
+import os
+
+import pytest
+
+# agents 在导入时检查 OPENAI_API_KEY，这些测试不会调用模型
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import chat_session
+import rag_context
+import result_shaping
+import search_service
+import token_count
+from agents import cancellation
+
+SAMPLES = [
+    "",
+    "hello world",
+    "张家豪的工作经历 and skills",
+    "What's   Zhang's   e-mail address?!",
+    "ｆｕｌｌｗｉｄｔｈ　ＡＢＣ，１２３",
+    "snake_case_identifier = 42; x+y",
+    "テスト 한국어 mixed 文本",
+]
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_estimate_tokens_copies_match(text):
+    assert result_shaping.estimate_tokens(text) == token_count.estimate_tokens(text)
+    assert chat_session.estimate_tokens(text) == token_count.estimate_tokens(text)
+    assert cancellation.estimate_tokens(text) == token_count.estimate_tokens(text)
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_text_matching_copies_match(text):
+    assert search_service.normalize_query(text) == rag_context.normalize_query(text)
+    assert result_shaping.shingle(text) == rag_context.shingle(text)
@@ -0,0 +1,33 @@
+import json
+import math
+
+from numeric_eval import evaluate_numeric, extract_number, numeric_correctness, outputs_from_messages
+
+
+def test_extract_number_prefers_the_value_after_equals():
+    assert extract_number("25 + 37 = 62") == 62
+    assert extract_number("结果等于 1,250.5") == 1250.5
+    assert extract_number("The answer is 3/4") == 0.75
+    assert extract_number("about 12%") == 0.12
+    assert math.isnan(extract_number("no numbers here"))
+
+
+def test_is_inside_a_word_does_not_mark_the_answer():
+    # "this 5" / "axis 2" 里的 is 不是 "is"
+    assert extract_number("The answer is 40, and this 5 is a footnote 7") == 40
+    assert extract_number("Along the axis 2 we get 9") == 9
+
+
+def test_evaluate_numeric_report_is_json_serializable():
+    report = evaluate_numeric(["= 4", "is 5", "none"], [4, 6, 1], tool_calls=[1, 2, 0], steps=[2, 3, 1])
+    assert report["correct"] == [True, False, False]
+    assert report["extraction_failures"] == 1
+    json.dumps(report)
+
+
+def test_numeric_correctness_feedback():
+    outputs = outputs_from_messages([{"type": "tool_call"}, {"type": "final_answer", "content": "sum = 62"}])
+    feedback = numeric_correctness({}, outputs, {"answer": 62})
+    assert feedback[0]["score"] is True
+    assert {f["key"]: f["score"] for f in feedback[1:]} == {"tool_calls": 1, "steps": 0}
+    json.dumps(feedback)
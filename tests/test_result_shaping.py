@@ -0,0 +1,34 @@
+from result_shaping import ResultShaper, clip_to_tokens, estimate_tokens, normalize_url, shown_results
+
+
+def test_normalize_url_ignores_scheme_case_www_and_trailing_slash():
+    assert normalize_url("HTTPS://www.Example.com/a/") == normalize_url("https://example.com/a")
+    assert normalize_url("https://example.com/a#frag") == "https://example.com/a"
+
+
+def test_clip_to_tokens_stays_within_budget():
+    text = "First sentence here. " * 50
+    clipped = clip_to_tokens(text, 20)
+    assert clipped.endswith(" …")
+    assert estimate_tokens(clipped[:-2]) <= 20
+    assert clip_to_tokens("short", 20) == "short"
+
+
+def test_shaper_drops_seen_urls_and_near_duplicates_case_insensitively():
+    shaper = ResultShaper(per_result_tokens=50, max_results=5)
+    body = "LangGraph lets you build stateful agents with cycles and persistence."
+    results = [
+        {"url": "https://a.example/x", "title": "A", "content": body, "score": 0.9},
+        {"url": "https://b.example/y", "title": "B", "content": body.upper(), "score": 0.8},
+        {"url": "https://seen.example/", "title": "C", "content": "something else entirely", "score": 0.7},
+    ]
+    seen_urls, seen_texts = {normalize_url("https://seen.example")}, []
+    kept = shaper.shape(results, seen_urls, seen_texts)
+    assert [r["title"] for r in kept] == ["A"]
+    assert shaper.dropped_duplicates == 2
+
+
+def test_shown_results_reads_previous_tool_output():
+    urls, texts = shown_results(["URL: https://www.example.com/\nContent: hello"])
+    assert urls == {"https://example.com/"}
+    assert texts == ["hello"]
@@ -0,0 +1,42 @@
+import os
+from datetime import datetime
+
+# agents 在导入时检查 OPENAI_API_KEY，这些测试不会调用模型
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from agents.models import ConversationSession, MessageType, StreamMessage
+from agents.storage import SimpleFileStorage
+
+
+def test_message_content_with_separators_round_trips(tmp_path):
+    storage = SimpleFileStorage(str(tmp_path))
+    message = StreamMessage(id="m1", type=MessageType.FINAL_ANSWER, content='a | b\nc "d"',
+                            metadata={"k": "v|w"}, timestamp=datetime(2024, 1, 2, 3, 4, 5))
+    storage.save_message(message, "s1")
+    [loaded] = storage.get_messages_by_session("s1")
+    assert (loaded.content, loaded.metadata, loaded.timestamp) == (message.content, {"k": "v|w"}, message.timestamp)
+    assert storage.get_messages_by_session("other") == []
+
+
+def test_legacy_message_line_is_still_parsed():
+    line = 'm1|s1|final_answer|plain | text|{"k": 1}|2024-01-02T03:04:05\n'
+    message = SimpleFileStorage._parse_message_line(line, "s1")
+    assert (message.content, message.metadata, message.type) == ("plain | text", {"k": 1}, MessageType.FINAL_ANSWER)
+    assert SimpleFileStorage._parse_message_line(line, "s2") is None
+
+
+def test_session_question_may_contain_separator(tmp_path):
+    storage = SimpleFileStorage(str(tmp_path))
+    storage.save_session(ConversationSession(session_id="s1", user_question="a|b|c"))
+    storage.update_session_status("s1", "completed")
+    session = storage.get_session("s1")
+    assert (session.user_question, session.status) == ("a|b|c", "completed")
+    assert storage.get_session("missing") is None
+
+
+def test_legacy_content_starting_with_a_quote_is_not_decoded_as_json():
+    unterminated = 'm1|s1|final_answer|"unterminated|{}|2024-01-02T03:04:05\n'
+    quoted = 'm2|s1|final_answer|"quoted" he said|{"k": 1}|2024-01-02T03:04:06\n'
+    assert SimpleFileStorage._parse_message_line(unterminated, "s1").content == '"unterminated'
+    message = SimpleFileStorage._parse_message_line(quoted, "s1")
+    assert (message.content, message.metadata) == ('"quoted" he said', {"k": 1})
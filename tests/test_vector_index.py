@@ -0,0 +1,52 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("langchain_chroma")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vector_index import MANIFEST_FILE, VersionedIndex
+
+
+def make_version(index, version):
+    path = index.version_path(version)
+    os.makedirs(path)
+    with open(os.path.join(path, MANIFEST_FILE), "w") as f:
+        json.dump({"version": version}, f)
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = VersionedIndex(str(tmp_path), "test", DeterministicFakeEmbedding(size=8), keep_versions=1)
+    for version in ("v1", "v2", "v3"):
+        make_version(index, version)
+    return index
+
+
+def test_gc_keeps_current_and_newest(index):
+    index.publish("v2")
+    assert index.list_versions() == ["v2", "v3"]
+
+
+def test_gc_keeps_versions_still_acquired(index):
+    index.acquire("v1")
+    index.publish("v3")
+    assert index.list_versions() == ["v1", "v3"]
+
+
+def test_release_collects_retired_version(index):
+    index.acquire("v1")
+    index.publish("v3")
+    index.release("v1")
+    index._builder.submit(lambda: None).result()
+    assert index.list_versions() == ["v3"]
+
+
+def test_release_keeps_current_version(index):
+    index.publish("v3")
+    index.acquire("v3")
+    index.release("v3")
+    index._builder.submit(lambda: None).result()
+    assert index.list_versions() == ["v3"]
@@ -0,0 +1,92 @@
+import json
+import random
+
+from version_history import VersionHistory
+
+
+def random_versions(seed, count=60):
+    rng = random.Random(seed)
+    # 文档要足够长，delta 才会比快照小
+    document = [f"line {i} of a reasonably long document" for i in range(40)]
+    versions = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4 or not document:
+            at = rng.randint(0, len(document))
+            document[at:at] = [rng.choice(["a", "b", "", "c d", "中文"])] * rng.randint(1, 3)
+        elif roll < 0.7:
+            document[rng.randrange(len(document))] = rng.choice(["x", "y", ""])
+        elif roll < 0.95:
+            del document[rng.randrange(len(document))]
+        else:
+            document = []
+        versions.append("\n".join(document))
+    return versions
+
+
+def test_reconstructs_every_version_across_snapshots_and_deltas():
+    kinds = set()
+    for seed in range(20):
+        versions = random_versions(seed)
+        history = VersionHistory(snapshot_interval=5)
+        for version, content in enumerate(versions, 1):
+            history.append(version, content, float(version))
+        kinds.update(kind for _, _, kind in history.versions())
+        for version, content in enumerate(versions, 1):
+            assert history.reconstruct(version) == content
+    assert kinds == {"snapshot", "delta"}
+
+
+def test_round_trips_through_json_and_keeps_appending():
+    versions = random_versions(1)
+    history = VersionHistory(snapshot_interval=4)
+    for version, content in enumerate(versions[:30], 1):
+        history.append(version, content, float(version))
+    loaded = VersionHistory.from_list(json.loads(json.dumps(history.to_list())), snapshot_interval=4)
+    for version, content in enumerate(versions[30:], 31):
+        loaded.append(version, content, float(version))
+    for version, content in enumerate(versions, 1):
+        assert loaded.reconstruct(version) == content
+
+
+def test_gc_turns_the_new_first_version_into_a_snapshot():
+    versions = random_versions(2, count=30)
+    history = VersionHistory(snapshot_interval=10)
+    for version, content in enumerate(versions, 1):
+        history.append(version, content, float(version))
+    assert history.gc(keep_last=7) == 23
+    assert history.versions()[0][2] == "snapshot"
+    assert [v for v, _, _ in history.versions()] == list(range(24, 31))
+    for version in range(24, 31):
+        assert history.reconstruct(version) == versions[version - 1]
+
+
+def test_repeated_undo_walks_back():
+    history = VersionHistory()
+    for version, content in enumerate(["a", "b", "c"], 1):
+        history.append(version, content)
+    assert history.undo_target() == 2
+    history.append(4, "b", undo_to=2)
+    assert history.undo_target() == 1
+    history.append(5, "a", undo_to=1)
+    assert history.undo_target() is None
+
+
+def test_undo_after_an_edit_that_followed_an_undo():
+    history = VersionHistory()
+    for version, content in enumerate(["a", "b", "c"], 1):
+        history.append(version, content)
+    history.append(4, "b", undo_to=2)
+    history.append(5, "b!")
+    assert history.undo_target() == 4
+    history.append(6, "b", undo_to=4)
+    assert history.undo_target() == 1
+
+
+def test_undo_marker_survives_serialization():
+    history = VersionHistory()
+    history.append(1, "a")
+    history.append(2, "b")
+    history.append(3, "a", undo_to=1)
+    loaded = VersionHistory.from_list(history.to_list())
+    assert loaded.undo_target() is None